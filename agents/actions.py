@@ -0,0 +1,7 @@
+"""Action handlers referenced by agent definitions as "agents.actions:<name>"."""
+
+def save_lead(name, email):
+    print(f"Lead saved: {name} ({email})")
+
+def schedule_demo(date, time):
+    print(f"Demo scheduled for {date} at {time}")
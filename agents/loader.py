@@ -0,0 +1,121 @@
+from typing import Any, Callable, Dict, List, Optional
+from dataclasses import dataclass, field
+import importlib
+import json
+import os
+from core.agent import Agent
+from core.knowledge_base import KnowledgeBase
+from core.action_registry import ActionRegistry
+from core.prompt_engine import PromptEngine, PromptTemplate
+from core.state_machine import StateMachine, StateMachineError
+
+class AgentDefinitionError(Exception):
+    pass
+
+def resolve_handler(reference: str) -> Callable:
+    """Import a "package.module:function" reference"""
+    module_name, _, attribute = reference.partition(":")
+    if not module_name or not attribute:
+        raise AgentDefinitionError(f"Handler must look like 'module:function', got '{reference}'")
+    try:
+        return getattr(importlib.import_module(module_name), attribute)
+    except (ImportError, AttributeError) as e:
+        raise AgentDefinitionError(f"Cannot load handler '{reference}': {str(e)}")
+
+@dataclass
+class AgentDefinition:
+    """Everything that distinguishes one agent type, as plain data.
+
+    state_prompts maps a state to a template string, or to
+    {"template", "required_variables"}; templates may use {collected_info},
+    {missing_info} and {current_state}. Each action is
+    {"name", "handler": "module:function", "description", "timeout", "critical"}.
+
+    states, when given, declares the conversation as a state machine
+    starting at initial_state: each maps a state to {"prompt",
+    "transitions", "knowledge_categories", "required_info", "extract",
+    "on_complete", "response", "actions"} (see core.state_machine.State).
+    The model can then only move along declared transitions, and a state
+    whose required_info is collected moves on without a model call.
+    """
+    agent_type: str
+    system_prompt: str
+    state_prompts: Dict[str, Any] = field(default_factory=dict)
+    actions: List[Dict[str, Any]] = field(default_factory=list)
+    knowledge_categories: List[str] = field(default_factory=list)
+    token_budget: Optional[int] = None
+    states: Dict[str, Any] = field(default_factory=dict)
+    initial_state: str = "initial"
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AgentDefinition":
+        try:
+            definition = cls(**data)
+        except TypeError as e:
+            raise AgentDefinitionError(f"Invalid agent definition: {str(e)}")
+        for action in definition.actions:
+            if "name" not in action or "handler" not in action:
+                raise AgentDefinitionError(f"Action needs a name and a handler: {action}")
+        return definition
+
+    @classmethod
+    def load(cls, path: str) -> "AgentDefinition":
+        try:
+            with open(path, encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError) as e:
+            raise AgentDefinitionError(f"Cannot read agent definition {path}: {str(e)}")
+        data.setdefault("agent_type", os.path.splitext(os.path.basename(path))[0])
+        return cls.from_dict(data)
+
+    def build(self, knowledge: KnowledgeBase) -> Agent:
+        actions = ActionRegistry()
+        for action in self.actions:
+            actions.register(
+                action["name"],
+                resolve_handler(action["handler"]),
+                action.get("description"),
+                timeout=action.get("timeout"),
+                critical=action.get("critical", True)
+            )
+
+        prompt_engine = PromptEngine()
+        prompt_engine.register_system_prompt(self.agent_type, self.system_prompt)
+        for state, prompt in self.state_prompts.items():
+            if isinstance(prompt, str):
+                prompt = {"template": prompt}
+            prompt_engine.register_state_prompt(
+                self.agent_type,
+                state,
+                PromptTemplate(prompt["template"], prompt.get("required_variables", []))
+            )
+        if self.token_budget is not None:
+            prompt_engine.register_token_budget(self.agent_type, self.token_budget)
+
+        state_machine = None
+        if self.states:
+            try:
+                state_machine = StateMachine.from_dict(self.states, self.initial_state)
+                for state in state_machine.states.values():
+                    if state.prompt is not None:
+                        prompt_engine.register_state_prompt(self.agent_type, state.name, state.prompt)
+                    prompt_engine.register_state_transitions(
+                        self.agent_type, state.name, sorted(state.transitions or state_machine.states)
+                    )
+            except (StateMachineError, ValueError) as e:
+                raise AgentDefinitionError(f"Invalid states for '{self.agent_type}': {str(e)}")
+            for state in state_machine.states.values():
+                for action in state.actions:
+                    if action.get("name") not in actions.actions:
+                        raise AgentDefinitionError(
+                            f"State '{state.name}' uses unregistered action '{action.get('name')}'"
+                        )
+
+        return Agent(
+            knowledge=knowledge,
+            action_registry=actions,
+            prompt_engine=prompt_engine,
+            agent_type=self.agent_type,
+            knowledge_categories=self.knowledge_categories or None,
+            state_machine=state_machine
+        )
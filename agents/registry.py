@@ -0,0 +1,215 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import logging
+import os
+import re
+import threading
+import time
+from core.agent import Agent
+from core.knowledge_base import KnowledgeBase, content_hash
+from core.job_queue import JobQueue
+from core.session_store import SessionStore
+from agents.loader import AgentDefinition
+from config.settings import (
+    JOB_QUEUE_ACTIONS, AGENT_DEFINITIONS_DIR, AGENT_CACHE_SIZE, AGENT_RELOAD_INTERVAL_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+AgentFactory = Callable[[KnowledgeBase], Agent]
+
+# Agent types built in code; most are declared as JSON in AGENT_DEFINITIONS_DIR instead.
+AGENT_FACTORIES: Dict[str, AgentFactory] = {}
+
+_AGENT_TYPE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+class AgentRegistry:
+    """Hosts every agent type in one process, building each on first use.
+
+    Agent types come from Python factories and from <agent_type>.json
+    definitions in `definitions_dir`, which are only read when that type
+    is first requested. Built agents live in an LRU of at most
+    `max_agents`; evicted ones are rebuilt on demand. A definition whose
+    file has changed is rebuilt on its next use (checked at most every
+    `reload_interval` seconds), so edits apply without a restart.
+
+    Request handlers take agents with lease(): an agent that is replaced
+    or evicted while leased is closed only when its last lease ends, so
+    turns already running on it finish normally.
+    """
+
+    def __init__(self, knowledge: Optional[KnowledgeBase] = None,
+                 factories: Optional[Dict[str, AgentFactory]] = None,
+                 definitions_dir: Optional[str] = AGENT_DEFINITIONS_DIR,
+                 max_agents: int = AGENT_CACHE_SIZE,
+                 reload_interval: float = AGENT_RELOAD_INTERVAL_SECONDS):
+        self.knowledge = knowledge or KnowledgeBase()
+        self.factories: Dict[str, AgentFactory] = dict(AGENT_FACTORIES if factories is None else factories)
+        self.definitions_dir = definitions_dir
+        self.max_agents = max_agents
+        self.reload_interval = reload_interval
+        self.agents: "OrderedDict[str, Agent]" = OrderedDict()
+        self.job_queue: Optional[JobQueue] = None
+        self.sessions: Optional[SessionStore] = None
+        self._sources: Dict[str, Tuple[str, float]] = {}  # agent_type -> (definition path, mtime at build)
+        self._checked_at: Dict[str, float] = {}
+        self._leases: Dict[int, int] = {}  # id(agent) -> active leases
+        self._retired: Dict[int, Agent] = {}  # replaced agents waiting for their leases to end
+        self._lock = threading.RLock()
+
+    def register(self, agent_type: str, factory: AgentFactory):
+        with self._lock:
+            self.factories[agent_type] = factory
+            self._discard(agent_type)
+
+    def has_agent(self, agent_type: str) -> bool:
+        return agent_type in self.factories or self._definition_path(agent_type) is not None
+
+    def list_agent_types(self) -> List[str]:
+        types = list(self.factories)
+        if self.definitions_dir and os.path.isdir(self.definitions_dir):
+            for filename in sorted(os.listdir(self.definitions_dir)):
+                agent_type, extension = os.path.splitext(filename)
+                if extension == ".json" and agent_type not in self.factories and _AGENT_TYPE.match(agent_type):
+                    types.append(agent_type)
+        return types
+
+    def get(self, agent_type: str) -> Agent:
+        with self._lock:
+            current = self.agents.get(agent_type)
+            if current is not None and not self._is_stale(agent_type):
+                self.agents.move_to_end(agent_type)
+                return current
+
+            try:
+                agent = self._build(agent_type)
+            except Exception as e:
+                if current is None:
+                    raise
+                # A broken edit must not take a working agent down; retry once the file changes again.
+                logger.error(f"Reloading agent type '{agent_type}' failed, keeping the loaded one: {str(e)}")
+                path = self._sources[agent_type][0]
+                self._sources[agent_type] = (path, os.path.getmtime(path))
+                return current
+            if current is not None:
+                del self.agents[agent_type]
+                self._retire(current)
+            self.agents[agent_type] = agent
+            while len(self.agents) > self.max_agents:
+                self._discard(next(iter(self.agents)))
+            return agent
+
+    @contextmanager
+    def lease(self, agent_type: str) -> Iterator[Agent]:
+        """get(), keeping the agent open until the block exits"""
+        with self._lock:
+            agent = self.get(agent_type)
+            self._leases[id(agent)] = self._leases.get(id(agent), 0) + 1
+        try:
+            yield agent
+        finally:
+            with self._lock:
+                remaining = self._leases.pop(id(agent)) - 1
+                if remaining:
+                    self._leases[id(agent)] = remaining
+                elif self._retired.pop(id(agent), None) is not None:
+                    agent.close()
+
+    def reload(self, agent_type: Optional[str] = None):
+        """Drop built agents (one type, or all) so the next request rebuilds them"""
+        with self._lock:
+            for name in [agent_type] if agent_type else list(self.agents):
+                self._discard(name)
+
+    def build_all(self):
+        for agent_type in self.list_agent_types():
+            self.get(agent_type)
+
+    def _definition_path(self, agent_type: str) -> Optional[str]:
+        # agent_type arrives from API requests, so never let it name a path.
+        if not self.definitions_dir or not _AGENT_TYPE.match(agent_type or ""):
+            return None
+        path = os.path.join(self.definitions_dir, f"{agent_type}.json")
+        return path if os.path.isfile(path) else None
+
+    def _build(self, agent_type: str) -> Agent:
+        if agent_type in self.factories:
+            agent = self.factories[agent_type](self.knowledge)
+        else:
+            path = self._definition_path(agent_type)
+            if path is None:
+                raise KeyError(f"Agent type '{agent_type}' not found in registry")
+            mtime = os.path.getmtime(path)
+            agent = AgentDefinition.load(path).build(self.knowledge)
+            self._sources[agent_type] = (path, mtime)
+            self._checked_at[agent_type] = time.monotonic()
+            logger.info(f"Loaded agent definition {path}")
+        if self.job_queue is not None:
+            self._defer_actions_to_queue(agent_type, agent)
+        if self.sessions is not None and agent.summarizer is not None:
+            agent.summarizer.sessions = self.sessions
+        return agent
+
+    def _is_stale(self, agent_type: str) -> bool:
+        source = self._sources.get(agent_type)
+        if source is None or self.reload_interval < 0:
+            return False
+        now = time.monotonic()
+        if now - self._checked_at.get(agent_type, 0.0) < self.reload_interval:
+            return False
+        self._checked_at[agent_type] = now
+        try:
+            return os.path.getmtime(source[0]) != source[1]
+        except OSError:
+            return False  # definition removed: keep serving what we have
+
+    def _discard(self, agent_type: str):
+        agent = self.agents.pop(agent_type, None)
+        self._sources.pop(agent_type, None)
+        self._checked_at.pop(agent_type, None)
+        if agent is not None:
+            self._retire(agent)
+
+    def _retire(self, agent: Agent):
+        if self._leases.get(id(agent)):
+            self._retired[id(agent)] = agent
+        else:
+            agent.close()
+
+    def attach_job_queue(self, job_queue: JobQueue):
+        """Send deferred actions, collected data and analytics through a durable queue"""
+        with self._lock:
+            self.job_queue = job_queue
+            self.knowledge.attach_job_queue(job_queue)
+            job_queue.register_handler("action", self._run_queued_action, batched=False)
+            for agent_type, agent in self.agents.items():
+                self._defer_actions_to_queue(agent_type, agent)
+
+    def attach_session_store(self, sessions: SessionStore):
+        """Save conversation summaries with the sessions they belong to"""
+        with self._lock:
+            self.sessions = sessions
+            for agent in self.agents.values():
+                if agent.summarizer is not None:
+                    agent.summarizer.sessions = sessions
+
+    def _defer_actions_to_queue(self, agent_type: str, agent: Agent):
+        def defer(name: str, parameters: Dict[str, Any], origin: Optional[Dict[str, Any]] = None):
+            payload = {"agent_type": agent_type, "name": name, "parameters": parameters}
+            key = None
+            if origin is not None:
+                # A turn that is replayed carries its action out once; other
+                # sessions and turns asking for the same thing are their own jobs.
+                payload["origin"] = origin
+                key = content_hash(json.dumps(payload, sort_keys=True))
+            self.job_queue.enqueue("action", payload, idempotency_key=key)
+
+        agent.action_registry.defer = defer
+        agent.action_registry.defer_all = JOB_QUEUE_ACTIONS == "all"
+
+    def _run_queued_action(self, payloads: List[Dict[str, Any]]):
+        # Registered unbatched: actions have side effects outside our database.
+        for payload in payloads:
+            self.get(payload["agent_type"]).action_registry.execute(payload["name"], **payload["parameters"])
@@ -1,40 +1,11 @@
+from typing import Optional
+import os
 from core.agent import Agent
 from core.knowledge_base import KnowledgeBase
-from core.action_registry import ActionRegistry
-from core.prompt_engine import PromptEngine
+from agents.loader import AgentDefinition
+from config.settings import AGENT_DEFINITIONS_DIR
 
-def setup_sales_agent() -> Agent:
-    knowledge = KnowledgeBase()
-    
-    actions = ActionRegistry()
-    
-    actions.register(
-        "save_lead",
-        lambda name, email: print(f"Lead saved: {name} ({email})"),
-        "Save lead information to the database"
-    )
-    
-    actions.register(
-        "schedule_demo",
-        lambda date, time: print(f"Demo scheduled for {date} at {time}"),
-        "Schedule a product demonstration"
-    )
-    
-    prompt_engine = PromptEngine()
-    
-    prompt_engine.register_system_prompt(
-        "sales",
-        """You are an AI sales assistant. Your goals are to:
-        1. Collect relevant information about potential customers
-        2. Answer questions about our product
-        3. Schedule demos when appropriate
-        4. Follow up with leads
-        Always be professional and helpful."""
-    )
-    
-    return Agent(
-        knowledge=knowledge,
-        action_registry=actions,
-        prompt_engine=prompt_engine,
-        agent_type="sales"
-    )
\ No newline at end of file
+def setup_sales_agent(knowledge: Optional[KnowledgeBase] = None) -> Agent:
+    # The sales agent is declared in agents/definitions/sales.json.
+    definition = AgentDefinition.load(os.path.join(AGENT_DEFINITIONS_DIR, "sales.json"))
+    return definition.build(knowledge or KnowledgeBase())
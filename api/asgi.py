@@ -0,0 +1,230 @@
+"""Asyncio serving path for the conversation API.
+
+Exposes the same /api/v1 endpoints as the Flask app, but each request is a
+coroutine, so a single process keeps many conversations in flight while
+they wait on the embedding and chat APIs. Run with:
+
+    uvicorn --factory api.asgi:create_asgi_app --port 6000
+"""
+from typing import Iterator, Optional
+import asyncio
+import json
+import uuid
+import logging
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from api.schemas import (
+    ConversationStart, MessageRequest, KnowledgeAddRequest, KnowledgeBatchRequest, ConversationEnd
+)
+from agents.registry import AgentRegistry
+from core.context import ConversationContext
+from core.session_store import SessionStore, create_session_store
+from core.job_queue import create_job_queue
+from core.ingestion import iter_jsonl, DocumentIngestor
+from core.metrics import REGISTRY, start_trace, end_trace, current_trace, observe_request
+from config.settings import (
+    SESSION_STORE, SESSION_DB_PATH, SESSION_IDLE_TTL_SECONDS, SESSION_MAX_ENTRIES, JOB_QUEUE_ENABLED,
+    TRACE_HEADER
+)
+
+logger = logging.getLogger(__name__)
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _is_jsonl(request: Request) -> bool:
+    return request.headers.get("content-type", "").split(";")[0] in ("application/x-ndjson", "application/jsonl")
+
+def _stream_lines(request: Request, loop: asyncio.AbstractEventLoop) -> Iterator[bytes]:
+    """Iterate the body's lines from a worker thread, receiving each chunk on the loop as it is needed"""
+    chunks = request.stream().__aiter__()
+
+    async def next_chunk() -> Optional[bytes]:
+        try:
+            return await chunks.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    buffer = b""
+    while True:
+        chunk = asyncio.run_coroutine_threadsafe(next_chunk(), loop).result()
+        if chunk is None:
+            break
+        lines = (buffer + chunk).split(b"\n")
+        buffer = lines.pop()
+        yield from lines
+    if buffer:
+        yield buffer
+
+def create_asgi_app(agents: Optional[AgentRegistry] = None,
+                    sessions: Optional[SessionStore] = None) -> FastAPI:
+    if agents is None:
+        agents = AgentRegistry()
+        if JOB_QUEUE_ENABLED:
+            agents.attach_job_queue(create_job_queue())
+    sessions = sessions or create_session_store(
+        SESSION_STORE,
+        db_path=SESSION_DB_PATH,
+        idle_ttl_seconds=SESSION_IDLE_TTL_SECONDS,
+        max_sessions=SESSION_MAX_ENTRIES
+    )
+    agents.attach_session_store(sessions)
+
+    app = FastAPI(title="AI Agent", version="1.0.0")
+
+    @app.middleware("http")
+    async def trace_request(request: Request, call_next):
+        token = start_trace(request.headers.get(TRACE_HEADER))
+        try:
+            trace = current_trace()
+            response = await call_next(request)
+            response.headers[TRACE_HEADER] = trace.trace_id
+            if trace.stages:
+                response.headers["Server-Timing"] = trace.server_timing()
+            route = request.scope.get("route")
+            observe_request(trace, getattr(route, "name", None) or "unknown", response.status_code)
+            return response
+        finally:
+            end_trace(token)
+
+    @app.get('/metrics')
+    async def metrics():
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+    @app.get('/api/v1/health')
+    async def health_check():
+        return {"status": "healthy", "version": "1.0.0"}
+
+    @app.post('/api/v1/conversation/start')
+    async def start_conversation(data: ConversationStart):
+        if not agents.has_agent(data.agent_type):
+            return JSONResponse({"error": f"Unknown agent_type: {data.agent_type}"}, status_code=400)
+
+        user_id = data.user_id or str(uuid.uuid4())
+        session_id = str(uuid.uuid4())
+        context = ConversationContext(
+            user_id=user_id,
+            session_id=session_id,
+            agent_id=data.agent_type
+        )
+        await asyncio.to_thread(sessions.save, context)
+        return {
+            "session_id": session_id,
+            "user_id": user_id,
+            "message": "Conversation started successfully"
+        }
+
+    @app.post('/api/v1/conversation/message')
+    async def send_message(data: MessageRequest):
+        context = await asyncio.to_thread(sessions.get, data.session_id)
+        if not context:
+            return JSONResponse({"error": "Invalid session_id"}, status_code=404)
+
+        try:
+            with agents.lease(context.agent_id) as agent:
+                response = await agent.aprocess_message(data.message, context)
+            await asyncio.to_thread(sessions.save, context)
+        except Exception as e:
+            logger.error(f"Error processing message: {str(e)}")
+            return JSONResponse({"error": str(e)}, status_code=500)
+
+        return {
+            "session_id": data.session_id,
+            "response": response,
+            "current_state": context.current_state,
+            "collected_info": context.collected_info,
+            "required_info": context.required_info
+        }
+
+    @app.post('/api/v1/conversation/message/stream')
+    async def stream_message(data: MessageRequest):
+        context = await asyncio.to_thread(sessions.get, data.session_id)
+        if not context:
+            return JSONResponse({"error": "Invalid session_id"}, status_code=404)
+
+        # The agent's stream path blocks; Starlette iterates it in its thread pool.
+        def generate():
+            try:
+                with agents.lease(context.agent_id) as agent:
+                    for event in agent.stream_message(data.message, context):
+                        if event["type"] == "delta":
+                            yield _sse("delta", {"text": event["text"]})
+                        else:
+                            sessions.save(context)
+                            yield _sse("done", {
+                                "session_id": data.session_id,
+                                "response": event["response"],
+                                "current_state": context.current_state,
+                                "collected_info": context.collected_info,
+                                "required_info": context.required_info
+                            })
+            except Exception as e:
+                logger.error(f"Error streaming message: {str(e)}")
+                yield _sse("error", {"error": str(e)})
+
+        return StreamingResponse(
+            generate(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    @app.post('/api/v1/conversation/end')
+    async def end_conversation(data: ConversationEnd):
+        await asyncio.to_thread(sessions.delete, data.session_id)
+        return {
+            "message": "Conversation ended successfully",
+            "session_id": data.session_id
+        }
+
+    @app.post('/api/v1/knowledge')
+    async def add_knowledge(data: KnowledgeAddRequest):
+        try:
+            knowledge_id = await agents.knowledge.aadd_knowledge(data.category, data.content, data.metadata or {})
+        except Exception as e:
+            logger.error(f"Error adding knowledge: {str(e)}")
+            return JSONResponse({"error": str(e)}, status_code=500)
+
+        return {
+            "message": "Knowledge added successfully",
+            "knowledge_id": knowledge_id
+        }
+
+    @app.post('/api/v1/knowledge/batch')
+    async def add_knowledge_batch(request: Request, chunk_size: int = 256):
+        """Bulk ingest: a JSON body {"entries": [...]} or a streamed JSON Lines body"""
+        try:
+            if _is_jsonl(request):
+                entries = iter_jsonl(_stream_lines(request, asyncio.get_running_loop()), source="request")
+            else:
+                data = KnowledgeBatchRequest.model_validate_json(await request.body() or b"{}")
+                entries = [entry.model_dump() for entry in data.entries]
+
+            stats = await run_in_threadpool(agents.knowledge.add_knowledge_batch, entries, chunk_size)
+        except (ValueError, KeyError) as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        except Exception as e:
+            logger.error(f"Error ingesting knowledge batch: {str(e)}")
+            return JSONResponse({"error": str(e)}, status_code=500)
+
+        return {"message": "Knowledge batch ingested successfully", **stats}
+
+    @app.post('/api/v1/knowledge/documents')
+    async def ingest_documents(request: Request):
+        """(Re-)index documents: one JSON document, or a streamed JSON Lines body of them"""
+        try:
+            if _is_jsonl(request):
+                documents = iter_jsonl(_stream_lines(request, asyncio.get_running_loop()), source="request")
+            else:
+                documents = [json.loads(await request.body() or b"{}")]
+
+            stats = await run_in_threadpool(DocumentIngestor(agents.knowledge).ingest, documents)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        except Exception as e:
+            logger.error(f"Error ingesting documents: {str(e)}")
+            return JSONResponse({"error": str(e)}, status_code=500)
+
+        return {"message": "Documents ingested successfully", **stats}
+
+    return app
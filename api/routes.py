@@ -1,16 +1,20 @@
-from flask import Blueprint, request, jsonify
-from core.agent import Agent
+from flask import Blueprint, Response, g, request, jsonify, stream_with_context
 from core.context import ConversationContext
-from agents.sales_agent import setup_sales_agent
-from typing import Dict
+from agents.registry import AgentRegistry
+from core.session_store import SessionStore
+from core.ingestion import iter_jsonl, DocumentIngestor
+from core.metrics import REGISTRY, start_trace, end_trace, current_trace, observe_request
+from config.settings import TRACE_HEADER
 import uuid
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
-active_conversations: Dict[str, ConversationContext] = {}
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-def setup_routes(app):
+def setup_routes(app, agents: AgentRegistry, sessions: SessionStore):
     api = Blueprint('api', __name__)
 
     @api.route('/health', methods=['GET'])
@@ -23,6 +27,9 @@ def setup_routes(app):
             data = request.json
             user_id = data.get('user_id', str(uuid.uuid4()))
             agent_type = data.get('agent_type', 'sales') 
+
+            if not agents.has_agent(agent_type):
+                return jsonify({"error": f"Unknown agent_type: {agent_type}"}), 400
             
             session_id = str(uuid.uuid4())
             context = ConversationContext(
@@ -31,7 +38,7 @@ def setup_routes(app):
                 agent_id=agent_type
             )
             
-            active_conversations[session_id] = context
+            sessions.save(context)
             
             return jsonify({
                 "session_id": session_id,
@@ -52,13 +59,13 @@ def setup_routes(app):
             if not session_id or not message:
                 return jsonify({"error": "Missing session_id or message"}), 400
             
-            context = active_conversations.get(session_id)
+            context = sessions.get(session_id)
             if not context:
                 return jsonify({"error": "Invalid session_id"}), 404
             
-            agent = setup_sales_agent()  
-            
-            response = agent.process_message(message, context)
+            with agents.lease(context.agent_id) as agent:
+                response = agent.process_message(message, context)
+            sessions.save(context)
             
             return jsonify({
                 "session_id": session_id,
@@ -71,6 +78,44 @@ def setup_routes(app):
             logger.error(f"Error processing message: {str(e)}")
             return jsonify({"error": str(e)}), 500
 
+    @api.route('/conversation/message/stream', methods=['POST'])
+    def stream_message():
+        data = request.json or {}
+        session_id = data.get('session_id')
+        message = data.get('message')
+
+        if not session_id or not message:
+            return jsonify({"error": "Missing session_id or message"}), 400
+
+        context = sessions.get(session_id)
+        if not context:
+            return jsonify({"error": "Invalid session_id"}), 404
+
+        def generate():
+            try:
+                with agents.lease(context.agent_id) as agent:
+                    for event in agent.stream_message(message, context):
+                        if event["type"] == "delta":
+                            yield _sse("delta", {"text": event["text"]})
+                        else:
+                            sessions.save(context)
+                            yield _sse("done", {
+                                "session_id": session_id,
+                                "response": event["response"],
+                                "current_state": context.current_state,
+                                "collected_info": context.collected_info,
+                                "required_info": context.required_info
+                            })
+            except Exception as e:
+                logger.error(f"Error streaming message: {str(e)}")
+                yield _sse("error", {"error": str(e)})
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
     @api.route('/conversation/end', methods=['POST'])
     def end_conversation():
         try:
@@ -78,8 +123,7 @@ def setup_routes(app):
             if not session_id:
                 return jsonify({"error": "Missing session_id"}), 400
                 
-            if session_id in active_conversations:
-                del active_conversations[session_id]
+            sessions.delete(session_id)
                 
             return jsonify({
                 "message": "Conversation ended successfully",
@@ -100,8 +144,7 @@ def setup_routes(app):
             if not category or not content:
                 return jsonify({"error": "Missing category or content"}), 400
             
-            agent = setup_sales_agent()
-            knowledge_id = agent.knowledge.add_knowledge(category, content, metadata)
+            knowledge_id = agents.knowledge.add_knowledge(category, content, metadata)
             
             return jsonify({
                 "message": "Knowledge added successfully",
@@ -111,4 +154,71 @@ def setup_routes(app):
             logger.error(f"Error adding knowledge: {str(e)}")
             return jsonify({"error": str(e)}), 500
 
-    app.register_blueprint(api, url_prefix='/api/v1')
\ No newline at end of file
+    @api.route('/knowledge/batch', methods=['POST'])
+    def add_knowledge_batch():
+        """Bulk ingest: a JSON body {"entries": [...]} or a streamed JSON Lines body"""
+        try:
+            chunk_size = request.args.get('chunk_size', 256, type=int)
+            if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+                entries = iter_jsonl(request.stream, source="request")
+            else:
+                entries = (request.json or {}).get('entries', [])
+
+            stats = agents.knowledge.add_knowledge_batch(entries, chunk_size=chunk_size)
+
+            return jsonify({
+                "message": "Knowledge batch ingested successfully",
+                **stats
+            })
+        except (ValueError, KeyError) as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            logger.error(f"Error ingesting knowledge batch: {str(e)}")
+            return jsonify({"error": str(e)}), 500
+
+    @api.route('/knowledge/documents', methods=['POST'])
+    def ingest_documents():
+        """(Re-)index documents: one JSON document, or a streamed JSON Lines body of them"""
+        try:
+            if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+                documents = iter_jsonl(request.stream, source="request")
+            else:
+                documents = [request.json or {}]
+
+            stats = DocumentIngestor(agents.knowledge).ingest(documents)
+
+            return jsonify({
+                "message": "Documents ingested successfully",
+                **stats
+            })
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            logger.error(f"Error ingesting documents: {str(e)}")
+            return jsonify({"error": str(e)}), 500
+
+    app.register_blueprint(api, url_prefix='/api/v1')
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+    @app.before_request
+    def begin_trace():
+        g.trace_token = start_trace(request.headers.get(TRACE_HEADER))
+
+    @app.after_request
+    def finish_trace(response):
+        trace = current_trace()
+        if trace is not None:
+            response.headers[TRACE_HEADER] = trace.trace_id
+            if trace.stages:
+                response.headers["Server-Timing"] = trace.server_timing()
+            observe_request(trace, request.endpoint or "unknown", response.status_code)
+        return response
+
+    @app.teardown_request
+    def close_trace(exc):
+        token = g.pop("trace_token", None)
+        if token is not None:
+            end_trace(token)
\ No newline at end of file
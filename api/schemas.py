@@ -24,5 +24,8 @@ class KnowledgeAddRequest(BaseModel):
     content: str
     metadata: Optional[Dict[str, Any]] = None
 
+class KnowledgeBatchRequest(BaseModel):
+    entries: List[KnowledgeAddRequest]
+
 class ConversationEnd(BaseModel):
     session_id: str
\ No newline at end of file
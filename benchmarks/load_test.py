@@ -0,0 +1,301 @@
+"""Load-test the conversation API end to end against the fake LLM backend.
+
+Seeds a synthetic knowledge corpus through POST /knowledge, then has
+`--users` concurrent virtual users each start a conversation and send
+`--turns` messages. Alongside the HTTP stages it times query_knowledge,
+build_prompt and response parsing in-process, so a regression in any one
+of them is visible on its own. Every stage reports p50/p95/p99 latency,
+throughput and RSS; results are saved as JSON and can be checked against
+an earlier run. Run from the repository root:
+
+    python -m benchmarks.load_test --corpus-size 2000 --users 16 --output before.json
+    python -m benchmarks.load_test --corpus-size 2000 --users 16 --compare before.json
+
+Chat and embedding calls go to FakeProvider (latency set with --llm-latency
+and --embedding-latency), and the database lives in a temporary directory.
+With --url the HTTP stages target a running server instead, e.g. one started
+with LLM_PROVIDER=fake; the in-process stages are skipped.
+"""
+from typing import Any, Callable, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+TOPICS = ["pricing", "onboarding", "security", "integrations", "billing", "support", "reporting", "mobile"]
+WORDS = (
+    "plan seat annual monthly discount trial invoice export dashboard api webhook sso audit "
+    "encryption backup region latency uptime sla migration import csv team admin role permission "
+    "alert schedule report chart filter search sync offline device browser plugin token quota"
+).split()
+QUESTIONS = [
+    "How much does the {topic} {word} cost?",
+    "Can you tell me about {topic} and {word}?",
+    "Do you support {word} for {topic}?",
+    "What is your policy on {topic} {word}?",
+]
+
+def synthetic_corpus(size: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """`size` deterministic knowledge entries spread across TOPICS"""
+    rng = random.Random(seed)
+    entries = []
+    for number in range(size):
+        topic = TOPICS[number % len(TOPICS)]
+        words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 60)))
+        entries.append({
+            "category": "sales",
+            "content": f"{topic.capitalize()} note {number}: {words}.",
+            "metadata": {"topic": topic, "synthetic": True}
+        })
+    return entries
+
+def synthetic_questions(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed + 1)
+    return [rng.choice(QUESTIONS).format(topic=rng.choice(TOPICS), word=rng.choice(WORDS))
+            for _ in range(count)]
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[rank]
+
+def rss_mib() -> float:
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux, bytes on macOS
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+class Stage:
+    """Latency samples and errors for one stage of the run"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._started = 0.0
+        self._elapsed = 0.0
+
+    def __enter__(self) -> "Stage":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._elapsed = time.perf_counter() - self._started
+
+    def timed(self, call: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        try:
+            result = call()
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            return None
+        with self._lock:
+            self.latencies.append(time.perf_counter() - start)
+        return result
+
+    def summary(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+        return {
+            "requests": len(ordered) + self.errors,
+            "errors": self.errors,
+            "p50_ms": percentile(ordered, 0.50) * 1000,
+            "p95_ms": percentile(ordered, 0.95) * 1000,
+            "p99_ms": percentile(ordered, 0.99) * 1000,
+            "mean_ms": sum(ordered) / len(ordered) * 1000 if ordered else 0.0,
+            "throughput_rps": len(ordered) / self._elapsed if self._elapsed else 0.0,
+            "rss_mib": rss_mib()
+        }
+
+class InProcessClient:
+    """Drives the Flask app directly; one test client per thread"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.post(f"/api/v1{path}", json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"POST {path} returned {response.status_code}: {response.get_data(as_text=True)}")
+        return response.get_json()
+
+class HTTPClient:
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+
+    def post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        request = urllib.request.Request(
+            f"{self.base_url}/api/v1{path}",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=120) as response:
+            return json.loads(response.read())
+
+def build_app(workdir: str, llm_latency: float, embedding_latency: float, seed: int):
+    """The app as main.create_app builds it, over a scratch database and the fake provider"""
+    from flask import Flask
+    from api.routes import setup_routes
+    from agents.registry import AgentRegistry
+    from core.knowledge_base import KnowledgeBase
+    from core.llm import FakeProvider, set_provider
+    from core.session_store import create_session_store
+
+    set_provider(FakeProvider(latency=llm_latency, token_delay=0.0, embedding_latency=embedding_latency,
+                              seed=seed))
+    agents = AgentRegistry(KnowledgeBase(os.path.join(workdir, "knowledge.db")))
+    app = Flask(__name__)
+    setup_routes(app, agents, create_session_store("memory"))
+    return app, agents
+
+def run_concurrently(stage: Stage, calls: List[Callable[[], Any]], users: int) -> List[Any]:
+    with stage, ThreadPoolExecutor(max_workers=users) as pool:
+        return list(pool.map(stage.timed, calls))
+
+def run_conversations(client, users: int, turns: int, questions: List[str]) -> Dict[str, Stage]:
+    start, message = Stage("conversation_start"), Stage("conversation_message")
+    sessions = run_concurrently(
+        start, [lambda user=user: client.post("/conversation/start", {"user_id": f"bench-{user}",
+                                                                       "agent_type": "sales"})
+                for user in range(users)], users
+    )
+
+    def converse(user: int):
+        session = sessions[user]
+        if session is None:
+            return
+        for turn in range(turns):
+            question = questions[(user * turns + turn) % len(questions)]
+            message.timed(lambda: client.post("/conversation/message",
+                                              {"session_id": session["session_id"], "message": question}))
+
+    with message, ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(converse, range(users)))
+    return {"conversation_start": start, "conversation_message": message}
+
+def run_components(agents, questions: List[str], iterations: int) -> Dict[str, Stage]:
+    """Time the pipeline's CPU-side steps in isolation"""
+    from core.context import ConversationContext
+    from core.response_parser import JSONResponseParser
+    from core.llm import fake_completion
+
+    agent = agents.get("sales")
+    knowledge = agents.knowledge
+    context = ConversationContext(user_id="bench", session_id="bench", agent_id="sales")
+    parser = JSONResponseParser()
+    stages = {name: Stage(name) for name in ("query_knowledge", "build_prompt", "parse_response")}
+
+    samples = [questions[number % len(questions)] for number in range(iterations)]
+    with stages["query_knowledge"]:
+        results = [stages["query_knowledge"].timed(lambda q=q: knowledge.query_knowledge(q, "sales"))
+                   for q in samples]
+    with stages["build_prompt"]:
+        prompts = [stages["build_prompt"].timed(
+            lambda q=q, found=found: agent.prompt_engine.build_prompt("sales", q, context, found or [])
+        ) for q, found in zip(samples, results)]
+    outputs = [fake_completion(prompt or "") for prompt in prompts]
+    with stages["parse_response"]:
+        for output in outputs:
+            stages["parse_response"].timed(lambda output=output: parser.parse(output))
+    return stages
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args) -> Dict[str, Any]:
+    corpus = synthetic_corpus(args.corpus_size, args.seed)
+    questions = synthetic_questions(max(args.users * args.turns, args.iterations), args.seed)
+    stages: Dict[str, Stage] = {}
+
+    with tempfile.TemporaryDirectory(prefix="agent-bench-") as workdir:
+        agents = None
+        if args.url:
+            client = HTTPClient(args.url)
+        else:
+            app, agents = build_app(workdir, args.llm_latency, args.embedding_latency, args.seed)
+            client = InProcessClient(app)
+
+        stages["knowledge_add"] = Stage("knowledge_add")
+        run_concurrently(stages["knowledge_add"],
+                         [lambda entry=entry: client.post("/knowledge", entry) for entry in corpus], args.users)
+        stages.update(run_conversations(client, args.users, args.turns, questions))
+        if agents is not None:
+            stages.update(run_components(agents, questions, args.iterations))
+            agents.knowledge.close()
+
+    return {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "stages": {name: stage.summary() for name, stage in stages.items()}
+    }
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Stages whose p95 grew by more than `tolerance` (a fraction) over the baseline"""
+    regressions = []
+    for name, current in results["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if not before or not before["p95_ms"]:
+            continue
+        change = current["p95_ms"] / before["p95_ms"] - 1
+        print(f"{name:<22} p95 {before['p95_ms']:>9.2f} -> {current['p95_ms']:>9.2f} ms ({change:+.0%})")
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus-size", type=int, default=500, help="Synthetic knowledge entries to seed")
+    parser.add_argument("--users", type=int, default=8, help="Concurrent virtual users")
+    parser.add_argument("--turns", type=int, default=5, help="Messages each user sends")
+    parser.add_argument("--iterations", type=int, default=200, help="Samples for the in-process stages")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake chat completion latency (s)")
+    parser.add_argument("--embedding-latency", type=float, default=0.005, help="Fake embedding latency (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="Base URL of a running server, e.g. http://127.0.0.1:6000")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    parser.add_argument("--compare", help="Earlier results JSON to check for p95 regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 growth with --compare")
+    args = parser.parse_args()
+
+    results = run(args)
+    print(f"{'stage':<22}{'requests':>9}{'errors':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'req/s':>10}{'RSS MiB':>9}")
+    for name, summary in results["stages"].items():
+        print(f"{name:<22}{summary['requests']:>9}{summary['errors']:>7}{summary['p50_ms']:>10.2f}"
+              f"{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}{summary['throughput_rps']:>10.1f}"
+              f"{summary['rss_mib']:>9.1f}")
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(results, handle, indent=2)
+    if args.compare:
+        with open(args.compare) as handle:
+            regressed = compare(results, json.load(handle), args.tolerance)
+        if regressed:
+            print(f"p95 regressed by more than {args.tolerance:.0%}: {', '.join(regressed)}")
+            sys.exit(1)
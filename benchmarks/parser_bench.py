@@ -0,0 +1,96 @@
+"""Benchmark the response parser against a corpus of malformed model outputs.
+
+Each corpus line is {"kind", "name", "raw", "recoverable"}. For the strict
+parser (the old behaviour, where any failure means the client retries the
+whole turn) and the tolerant one, reports parse latency per kind and how
+many of the strict parser's failures the tolerant one turns into a usable
+reply, i.e. retries avoided. Run from the repository root:
+
+    python -m benchmarks.parser_bench --iterations 2000 --output parser.json
+"""
+from typing import Any, Dict, List
+import argparse
+import json
+import os
+import statistics
+import time
+from core.response_parser import JSONResponseParser, ResponseParseError, orjson
+
+CORPUS = os.path.join(os.path.dirname(__file__), "parser_corpus.jsonl")
+
+def load_corpus(path: str = CORPUS) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as handle:
+        return [json.loads(line) for line in handle if line.strip()]
+
+def try_parse(parser: JSONResponseParser, raw: str) -> bool:
+    try:
+        parser.parse(raw)
+        return True
+    except ResponseParseError:
+        return False
+
+def time_case(parser: JSONResponseParser, raw: str, iterations: int) -> float:
+    """Mean microseconds per parse call, failures included"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        try:
+            parser.parse(raw)
+        except ResponseParseError:
+            pass
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def run(corpus: List[Dict[str, Any]], iterations: int) -> Dict[str, Any]:
+    parsers = {"strict": JSONResponseParser(repair=False, loads=json.loads),
+               "tolerant": JSONResponseParser(loads=json.loads)}
+    if orjson is not None:
+        parsers["tolerant_orjson"] = JSONResponseParser(loads=orjson.loads)
+
+    cases = []
+    for case in corpus:
+        row = {"kind": case["kind"], "name": case["name"], "recoverable": case["recoverable"]}
+        for label, parser in parsers.items():
+            row[f"{label}_ok"] = try_parse(parser, case["raw"])
+            row[f"{label}_us"] = time_case(parser, case["raw"], iterations)
+        cases.append(row)
+
+    strict_failures = [row for row in cases if not row["strict_ok"]]
+    avoided = [row for row in strict_failures if row["tolerant_ok"]]
+    unexpected = [row["name"] for row in cases if row["tolerant_ok"] != row["recoverable"]]
+
+    kinds = {}
+    for kind in dict.fromkeys(row["kind"] for row in cases):
+        rows = [row for row in cases if row["kind"] == kind]
+        kinds[kind] = {
+            f"{label}_us": statistics.median(row[f"{label}_us"] for row in rows) for label in parsers
+        }
+
+    return {
+        "iterations": iterations,
+        "cases": cases,
+        "by_kind": kinds,
+        "strict_failures": len(strict_failures),
+        "retries_avoided": len(avoided),
+        "avoided_retry_rate": len(avoided) / len(strict_failures) if strict_failures else 0.0,
+        "unexpected": unexpected
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--output", help="Write the full results as JSON to this path")
+    args = parser.parse_args()
+
+    results = run(load_corpus(args.corpus), args.iterations)
+    labels = [key[:-3] for key in next(iter(results["by_kind"].values()))]
+    print(f"{'kind':<16}" + "".join(f"{label + ' us':>22}" for label in labels))
+    for kind, timings in results["by_kind"].items():
+        print(f"{kind:<16}" + "".join(f"{timings[label + '_us']:>22.1f}" for label in labels))
+    print(f"Strict parser failed {results['strict_failures']} of {len(results['cases'])} outputs; "
+          f"tolerant parser recovered {results['retries_avoided']} "
+          f"({results['avoided_retry_rate']:.0%} of retries avoided)")
+    if results["unexpected"]:
+        print(f"Cases not matching their 'recoverable' label: {', '.join(results['unexpected'])}")
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(results, handle, indent=2)
@@ -16,10 +16,108 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 MODEL_NAME = os.getenv("MODEL_NAME", "gpt-3.5-turbo")
 MAX_TOKENS = int(os.getenv("MAX_TOKENS", "150"))
 TEMPERATURE = float(os.getenv("TEMPERATURE", "0.7"))
+# Input-side budget for build_prompt; agents can override it per agent_type
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+
+# LLM Provider Settings
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")  # "openai" or "fake" (deterministic, offline)
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_SECONDS = float(os.getenv("LLM_BACKOFF_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8"))
+LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "0"))  # 0 disables hedged requests
+FAKE_LLM_LATENCY_SECONDS = float(os.getenv("FAKE_LLM_LATENCY_SECONDS", "0.2"))
+FAKE_LLM_TOKEN_DELAY_SECONDS = float(os.getenv("FAKE_LLM_TOKEN_DELAY_SECONDS", "0.01"))
+FAKE_EMBEDDING_LATENCY_SECONDS = float(os.getenv("FAKE_EMBEDDING_LATENCY_SECONDS", "0.05"))
+FAKE_EMBEDDING_DIMENSIONS = int(os.getenv("FAKE_EMBEDDING_DIMENSIONS", "1536"))
 
 # RAG Settings
 EMBEDDING_MODEL = "text-embedding-ada-002"
 VECTOR_SIMILARITY_THRESHOLD = 0.8
+# One of: float32, float16, int8
+EMBEDDING_STORAGE_FORMAT = os.getenv("EMBEDDING_STORAGE_FORMAT", "float32")
+# "exact" scans every row; "ivf" probes the closest k-means buckets only
+RETRIEVAL_ENGINE = os.getenv("RETRIEVAL_ENGINE", "exact")
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # 0 picks ~4*sqrt(rows) at train time
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+IVF_MIN_TRAIN_SIZE = int(os.getenv("IVF_MIN_TRAIN_SIZE", "10000"))
+# "vector", "hybrid" (vector + FTS5 fused by reciprocal rank) or "lexical" (FTS5 only)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))  # per ranker, before fusion
+HYBRID_TOP_K = int(os.getenv("HYBRID_TOP_K", "5"))
+HYBRID_MIN_SIMILARITY = float(os.getenv("HYBRID_MIN_SIMILARITY", "0.7"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Retrieval falls back to lexical-only when embedding takes longer than this or fails
+EMBEDDING_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_TIMEOUT_SECONDS", "2.0"))
+EMBEDDING_RETRY_AFTER_SECONDS = float(os.getenv("EMBEDDING_RETRY_AFTER_SECONDS", "30"))
+# Concurrent query embeddings are coalesced into batched calls
+EMBEDDING_BATCHING_ENABLED = os.getenv("EMBEDDING_BATCHING_ENABLED", "true").lower() == "true"
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "2"))  # wait for company after the first text
+EMBEDDING_BATCH_CONCURRENCY = int(os.getenv("EMBEDDING_BATCH_CONCURRENCY", "4"))  # batches in flight at once
+
+# SQLite Settings
+SQLITE_READERS = int(os.getenv("SQLITE_READERS", "8"))  # pooled read connections per database
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KIB = int(os.getenv("SQLITE_CACHE_SIZE_KIB", str(64 * 1024)))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # NORMAL is durable across app crashes in WAL mode
+SQLITE_BUSY_TIMEOUT_SECONDS = float(os.getenv("SQLITE_BUSY_TIMEOUT_SECONDS", "30"))
+
+# Embedding Cache Settings
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_MEMORY_SIZE = int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "2048"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# Response Cache Settings
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_MAX_BUCKETS = int(os.getenv("RESPONSE_CACHE_MAX_BUCKETS", "10000"))
+
+# Session Settings
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")  # "memory" or "sqlite"
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_IDLE_TTL_SECONDS = int(os.getenv("SESSION_IDLE_TTL_SECONDS", "3600"))
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "20"))  # messages kept in memory per session
+
+# Conversation Summary Settings (an extra model call every few turns per conversation)
+SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "false").lower() == "true"
+SUMMARY_EVERY_MESSAGES = int(os.getenv("SUMMARY_EVERY_MESSAGES", "6"))  # fold once this many have aged out
+SUMMARY_KEEP_RECENT = int(os.getenv("SUMMARY_KEEP_RECENT", "5"))  # newest messages always sent verbatim
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "200"))
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "2"))
+
+# Action Settings
+ACTION_MAX_WORKERS = int(os.getenv("ACTION_MAX_WORKERS", "8"))
+ACTION_TIMEOUT_SECONDS = float(os.getenv("ACTION_TIMEOUT_SECONDS", "10"))
+ACTION_BACKGROUND_WORKERS = int(os.getenv("ACTION_BACKGROUND_WORKERS", "2"))
+
+# Agent Registry Settings
+AGENT_DEFINITIONS_DIR = os.getenv(
+    "AGENT_DEFINITIONS_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agents", "definitions")
+)
+AGENT_CACHE_SIZE = int(os.getenv("AGENT_CACHE_SIZE", "64"))  # built agents kept in memory
+AGENT_RELOAD_INTERVAL_SECONDS = float(os.getenv("AGENT_RELOAD_INTERVAL_SECONDS", "2"))
+
+# Job Queue Settings
+JOB_QUEUE_ENABLED = os.getenv("JOB_QUEUE_ENABLED", "false").lower() == "true"
+JOB_QUEUE_DB_PATH = os.getenv("JOB_QUEUE_DB_PATH", "jobs.db")
+JOB_QUEUE_WORKERS = int(os.getenv("JOB_QUEUE_WORKERS", "2"))
+JOB_QUEUE_BATCH_SIZE = int(os.getenv("JOB_QUEUE_BATCH_SIZE", "200"))
+JOB_QUEUE_MAX_ATTEMPTS = int(os.getenv("JOB_QUEUE_MAX_ATTEMPTS", "5"))
+JOB_QUEUE_ACTIONS = os.getenv("JOB_QUEUE_ACTIONS", "deferred")  # "deferred" (critical=False only) or "all"
+ANALYTICS_ENABLED = os.getenv("ANALYTICS_ENABLED", "false").lower() == "true"
+
+# Metrics Settings
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+TRACE_HEADER = os.getenv("TRACE_HEADER", "X-Trace-Id")  # a caller-supplied trace id is echoed back
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "0"))  # log stage timings above this; 0 disables
 
 # Logging Settings
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
\ No newline at end of file
@@ -1,51 +1,101 @@
-from typing import Dict, List, Callable, Any, Optional
+from typing import Dict, List, Callable, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import asyncio
 import inspect
 import logging
-from functools import wraps
+import threading
+import time
+from config.settings import ACTION_MAX_WORKERS, ACTION_TIMEOUT_SECONDS, ACTION_BACKGROUND_WORKERS
 
 logger = logging.getLogger(__name__)
 
 class ActionValidationError(Exception):
     pass
 
-def validate_parameters(func: Callable) -> Callable:
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        sig = inspect.signature(func)
+class RegisteredAction:
+    """An action's callable plus everything worked out once at register time"""
+
+    __slots__ = ("name", "func", "signature", "bind", "is_coroutine", "timeout", "critical")
+
+    def __init__(self, name: str, func: Callable, timeout: Optional[float], critical: bool):
+        self.name = name
+        self.func = func
+        self.signature = inspect.signature(func)
+        self.bind = self.signature.bind
+        self.is_coroutine = inspect.iscoroutinefunction(func)
+        self.timeout = timeout
+        self.critical = critical
+
+    def validate(self, kwargs: Dict[str, Any]):
         try:
-            sig.bind(*args, **kwargs)
+            self.bind(**kwargs)
         except TypeError as e:
             raise ActionValidationError(f"Invalid parameters for action: {str(e)}")
-        return func(*args, **kwargs)
-    return wrapper
+
+    def run(self, kwargs: Dict[str, Any]) -> Any:
+        if self.is_coroutine:
+            return asyncio.run(self.func(**kwargs))
+        return self.func(**kwargs)
 
 class ActionRegistry:
-    def __init__(self):
+    """Registry of the actions a model reply may request.
+
+    execute() runs one action inline. execute_many() / aexecute_many()
+    run a reply's actions concurrently on a shared thread pool, each bounded
+    by its own timeout (a timed-out action keeps running in its thread, but
+    the reply no longer waits for it). Actions registered with
+    critical=False (or every action, with defer_all) are handed to `defer`
+    instead and never add latency; by default that is a small background
+    pool, and AgentRegistry points it at the durable job queue when one is
+    configured. `origin` identifies the turn that requested the calls
+    (e.g. {"session_id", "turn"}) and is passed on to `defer`.
+    """
+
+    def __init__(self,
+                 max_workers: int = ACTION_MAX_WORKERS,
+                 default_timeout: Optional[float] = ACTION_TIMEOUT_SECONDS,
+                 background_workers: int = ACTION_BACKGROUND_WORKERS):
         self.actions: Dict[str, Callable] = {}
         self.descriptions: Dict[str, str] = {}
         self.required_params: Dict[str, Dict[str, type]] = {}
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+        self.background_workers = background_workers
+        self.defer: Callable[[str, Dict[str, Any], Optional[Dict[str, Any]]], None] = self._run_in_background
+        self.defer_all = False
+        self._registered: Dict[str, RegisteredAction] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._background: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
 
-    def register(self, name: str, func: Callable, description: Optional[str] = None):
+    def register(self,
+                 name: str,
+                 func: Callable,
+                 description: Optional[str] = None,
+                 timeout: Optional[float] = None,
+                 critical: bool = True):
         """Register an action with the registry"""
-        validated_func = validate_parameters(func)
-        self.actions[name] = validated_func
+        action = RegisteredAction(name, func, timeout if timeout is not None else self.default_timeout, critical)
+        self._registered[name] = action
+        self.actions[name] = func
         self.descriptions[name] = description or func.__doc__ or "No description provided"
-        
+
         # Extract parameter information
-        sig = inspect.signature(func)
         self.required_params[name] = {
             param.name: param.annotation
-            for param in sig.parameters.values()
+            for param in action.signature.parameters.values()
             if param.default == inspect.Parameter.empty
         }
 
-    def execute(self, name: str, **kwargs) -> Any:
+    def execute(self, name: str, /, **kwargs) -> Any:
         """Execute a registered action"""
         if name not in self.actions:
             raise KeyError(f"Action '{name}' not found in registry")
-        
+
         try:
-            return self.actions[name](**kwargs)
+            action = self._registered[name]
+            action.validate(kwargs)
+            return action.run(kwargs)
         except ActionValidationError as e:
             logger.error(f"Action validation failed: {str(e)}")
             raise
@@ -53,11 +103,64 @@ class ActionRegistry:
             logger.error(f"Action execution failed: {str(e)}")
             raise
 
+    def execute_many(self, calls: List[Tuple[str, Dict[str, Any]]],
+                     origin: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Run independent actions concurrently and report how each one went.
+
+        Returns one {"name", "status", ...} dict per call, in order, with
+        status "ok" (plus "result"), "deferred", "timeout", "invalid",
+        "unknown" or "error" (plus "error"). Never raises for a failing action.
+        """
+        results, pending = self._dispatch(calls, origin)
+        if len(pending) == 1 and pending[0][1].timeout is None:
+            index, action, kwargs = pending[0]
+            results[index] = self._run_inline(action, kwargs)
+            return results
+
+        submitted = [(index, action, self._get_pool().submit(action.run, kwargs), time.monotonic())
+                     for index, action, kwargs in pending]
+        for index, action, future, started in submitted:
+            remaining = None if action.timeout is None else max(0.0, started + action.timeout - time.monotonic())
+            try:
+                results[index] = {"name": action.name, "status": "ok", "result": future.result(timeout=remaining)}
+            except FutureTimeoutError:
+                results[index] = self._timed_out(action)
+            except Exception as e:
+                results[index] = self._failed(action, e)
+        return results
+
+    async def aexecute_many(self, calls: List[Tuple[str, Dict[str, Any]]],
+                            origin: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """execute_many for the event loop: coroutine actions are awaited directly"""
+        if not calls:
+            return []
+        # Deferring enqueues into the job queue, a blocking write.
+        results, pending = await asyncio.to_thread(self._dispatch, calls, origin)
+        loop = asyncio.get_running_loop()
+
+        async def run(action: RegisteredAction, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+            if action.is_coroutine:
+                awaitable = action.func(**kwargs)
+            else:
+                awaitable = loop.run_in_executor(self._get_pool(), action.run, kwargs)
+            try:
+                return {"name": action.name, "status": "ok",
+                        "result": await asyncio.wait_for(awaitable, action.timeout)}
+            except asyncio.TimeoutError:
+                return self._timed_out(action)
+            except Exception as e:
+                return self._failed(action, e)
+
+        outcomes = await asyncio.gather(*(run(action, kwargs) for _, action, kwargs in pending))
+        for (index, _, _), outcome in zip(pending, outcomes):
+            results[index] = outcome
+        return results
+
     def get_action_schema(self, name: str) -> Dict[str, Any]:
         """Get the schema for a registered action"""
         if name not in self.actions:
             raise KeyError(f"Action '{name}' not found in registry")
-        
+
         return {
             "name": name,
             "description": self.descriptions[name],
@@ -70,4 +173,64 @@ class ActionRegistry:
 
     def has_action(self, name: str) -> bool:
         """Check if an action exists"""
-        return name in self.actions
\ No newline at end of file
+        return name in self.actions
+
+    def shutdown(self, wait: bool = True):
+        with self._pool_lock:
+            for pool in (self._pool, self._background):
+                if pool is not None:
+                    pool.shutdown(wait=wait)
+            self._pool = self._background = None
+
+    def _dispatch(self, calls: List[Tuple[str, Dict[str, Any]]], origin: Optional[Dict[str, Any]] = None):
+        """Resolve and validate calls; defer non-critical ones, return the rest to run"""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(calls)
+        pending = []
+        for index, (name, kwargs) in enumerate(calls):
+            action = self._registered.get(name)
+            if action is None:
+                logger.warning(f"Unknown action requested: {name}")
+                results[index] = {"name": name, "status": "unknown"}
+                continue
+            try:
+                action.validate(kwargs)
+            except ActionValidationError as e:
+                logger.error(f"Action validation failed: {str(e)}")
+                results[index] = {"name": name, "status": "invalid", "error": str(e)}
+                continue
+            if self.defer_all or not action.critical:
+                self.defer(name, kwargs, origin)
+                results[index] = {"name": name, "status": "deferred"}
+                continue
+            pending.append((index, action, kwargs))
+        return results, pending
+
+    def _run_inline(self, action: RegisteredAction, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return {"name": action.name, "status": "ok", "result": action.run(kwargs)}
+        except Exception as e:
+            return self._failed(action, e)
+
+    def _run_in_background(self, name: str, kwargs: Dict[str, Any], origin: Optional[Dict[str, Any]] = None):
+        action = self._registered[name]
+        with self._pool_lock:
+            if self._background is None:
+                self._background = ThreadPoolExecutor(
+                    max_workers=self.background_workers, thread_name_prefix="deferred-action"
+                )
+            background = self._background
+        background.submit(self._run_inline, action, kwargs)
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="action")
+            return self._pool
+
+    def _timed_out(self, action: RegisteredAction) -> Dict[str, Any]:
+        logger.error(f"Action {action.name} timed out after {action.timeout}s")
+        return {"name": action.name, "status": "timeout"}
+
+    def _failed(self, action: RegisteredAction, error: Exception) -> Dict[str, Any]:
+        logger.error(f"Action execution failed: {action.name}: {str(error)}")
+        return {"name": action.name, "status": "error", "error": str(error)}
@@ -1,14 +1,20 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterator, Optional, Tuple
+import asyncio
 import logging
 from core.context import ConversationContext
 from core.knowledge_base import KnowledgeBase
 from core.action_registry import ActionRegistry
 from core.prompt_engine import PromptEngine
-from core.response_parser import JSONResponseParser
-from openai import OpenAI
-
-client = OpenAI()
-from config.settings import MODEL_NAME, MAX_TOKENS, TEMPERATURE
+from core.response_parser import JSONResponseParser, IncrementalResponseExtractor
+from core.response_cache import ResponseCache, knowledge_fingerprint
+from core.llm import LLMProvider, get_provider
+from core.summarizer import ConversationSummarizer
+from core.state_machine import StateMachine
+from core.metrics import MESSAGE_SECONDS, CACHE_REQUESTS, timed, stage, current_trace
+from config.settings import (
+    MODEL_NAME, MAX_TOKENS, TEMPERATURE, RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_THRESHOLD,
+    RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_MAX_BUCKETS, ANALYTICS_ENABLED, SUMMARY_ENABLED
+)
 
 logger = logging.getLogger(__name__)
 
@@ -17,74 +23,352 @@ class Agent:
                  knowledge: KnowledgeBase,
                  action_registry: ActionRegistry,
                  prompt_engine: PromptEngine,
-                 agent_type: str = "sales"):
+                 agent_type: str = "sales",
+                 response_cache: Optional[ResponseCache] = None,
+                 knowledge_categories: Optional[List[str]] = None,
+                 llm: Optional[LLMProvider] = None,
+                 summarizer: Optional[ConversationSummarizer] = None,
+                 state_machine: Optional[StateMachine] = None):
         self.knowledge = knowledge
         self.action_registry = action_registry
         self.prompt_engine = prompt_engine
         self.agent_type = agent_type
+        self.knowledge_categories = list(knowledge_categories or [agent_type])
+        self.state_machine = state_machine
         self.response_parser = JSONResponseParser()
+        self.llm = llm or get_provider()
+        if summarizer is None and SUMMARY_ENABLED:
+            summarizer = ConversationSummarizer(self.llm)
+        self.summarizer = summarizer
+
+        if response_cache is None and RESPONSE_CACHE_ENABLED:
+            response_cache = ResponseCache(
+                threshold=RESPONSE_CACHE_THRESHOLD,
+                max_buckets=RESPONSE_CACHE_MAX_BUCKETS,
+                ttl_seconds=RESPONSE_CACHE_TTL_SECONDS
+            )
+        self.response_cache = response_cache
+        if response_cache is not None:
+            knowledge.add_change_listener(response_cache.invalidate_category)
 
     def process_message(self, message: str, context: ConversationContext) -> Dict[str, Any]:
         try:
-            # 1. Retrieve relevant knowledge
-            relevant_info = self.knowledge.query_knowledge(message, category=self.agent_type)
-
-            # 2. Build dynamic prompt
-            prompt = self.prompt_engine.build_prompt(
-                self.agent_type,
-                message,
-                context,
-                relevant_info
+            with timed(MESSAGE_SECONDS, agent_type=self.agent_type):
+                self._apply_summary(context)
+
+                # 0. Transitions the state machine can decide need no model call
+                local = self._local_turn(message, context)
+                if local is not None:
+                    self._apply_response(message, local, context)
+                    return local
+
+                # 1. Retrieve relevant knowledge
+                with stage(self.agent_type, "embed"):
+                    query_embedding = self.knowledge.embed_query(message)
+                relevant_info = self._retrieve(query_embedding, message, context)
+
+                # 2. Reuse a cached answer to an equivalent question, if any
+                cache_key = self._cache_key(context, relevant_info)
+                cached = self._lookup_cached_response(cache_key, query_embedding, context)
+                if cached is not None:
+                    self._update_context(message, cached, context)
+                    return cached
+
+                # 3. Build dynamic prompt
+                with stage(self.agent_type, "build_prompt"):
+                    prompt = self.prompt_engine.build_prompt(
+                        self.agent_type,
+                        message,
+                        context,
+                        relevant_info
+                    )
+
+                # 4. Get AI response
+                response = self._get_ai_response(prompt)
+
+                # 5. Parse response
+                parsed_response = self._parse(response)
+                self._store_cached_response(cache_key, query_embedding, parsed_response, context)
+
+                # 6-8. Execute actions and update context
+                self._apply_response(message, parsed_response, context)
+
+                return parsed_response
+
+        except Exception as e:
+            logger.error(f"Error processing message{self._trace_suffix()}: {str(e)}")
+            raise
+
+    def stream_message(self, message: str, context: ConversationContext) -> Iterator[Dict[str, Any]]:
+        """Like process_message, but yields the response text as it is generated.
+
+        Yields {"type": "delta", "text": ...} events while the model streams,
+        then a single {"type": "done", "response": parsed_response} once the
+        full object has been parsed and its actions applied.
+        """
+        try:
+            # Includes the time the client takes to read each delta.
+            with timed(MESSAGE_SECONDS, agent_type=self.agent_type):
+                self._apply_summary(context)
+                local = self._local_turn(message, context)
+                if local is not None:
+                    self._apply_response(message, local, context)
+                    yield {"type": "delta", "text": local["response"]}
+                    yield {"type": "done", "response": local}
+                    return
+
+                with stage(self.agent_type, "embed"):
+                    query_embedding = self.knowledge.embed_query(message)
+                relevant_info = self._retrieve(query_embedding, message, context)
+
+                cache_key = self._cache_key(context, relevant_info)
+                cached = self._lookup_cached_response(cache_key, query_embedding, context)
+                if cached is not None:
+                    self._update_context(message, cached, context)
+                    yield {"type": "delta", "text": cached["response"]}
+                    yield {"type": "done", "response": cached}
+                    return
+
+                with stage(self.agent_type, "build_prompt"):
+                    prompt = self.prompt_engine.build_prompt(
+                        self.agent_type,
+                        message,
+                        context,
+                        relevant_info
+                    )
+
+                extractor = IncrementalResponseExtractor()
+                # Includes the time the client takes to read each delta.
+                with stage(self.agent_type, "llm"):
+                    for chunk in self._stream_ai_response(prompt):
+                        text = extractor.feed(chunk)
+                        if text:
+                            yield {"type": "delta", "text": text}
+
+                parsed_response = self._parse(extractor.buffer)
+                self._store_cached_response(cache_key, query_embedding, parsed_response, context)
+                self._apply_response(message, parsed_response, context)
+                yield {"type": "done", "response": parsed_response}
+
+        except Exception as e:
+            logger.error(f"Error streaming message{self._trace_suffix()}: {str(e)}")
+            raise
+
+    async def aprocess_message(self, message: str, context: ConversationContext) -> Dict[str, Any]:
+        """Async variant of process_message for the ASGI app.
+
+        Blocking storage writes run in worker threads, and independent
+        actions run concurrently.
+        """
+        try:
+            with timed(MESSAGE_SECONDS, agent_type=self.agent_type):
+                self._apply_summary(context)
+                local = await asyncio.to_thread(self._local_turn, message, context)
+                if local is not None:
+                    await self.action_registry.aexecute_many(self._action_calls(local), self._origin(context))
+                    await asyncio.to_thread(self._update_context, message, local, context)
+                    return local
+
+                with stage(self.agent_type, "embed"):
+                    query_embedding = await self.knowledge.aembed_query(message)
+                relevant_info = await asyncio.to_thread(self._retrieve, query_embedding, message, context)
+
+                cache_key = self._cache_key(context, relevant_info)
+                cached = self._lookup_cached_response(cache_key, query_embedding, context)
+                if cached is not None:
+                    await asyncio.to_thread(self._update_context, message, cached, context)
+                    return cached
+
+                with stage(self.agent_type, "build_prompt"):
+                    prompt = self.prompt_engine.build_prompt(
+                        self.agent_type,
+                        message,
+                        context,
+                        relevant_info
+                    )
+                response = await self._aget_ai_response(prompt)
+                parsed_response = self._parse(response)
+                self._store_cached_response(cache_key, query_embedding, parsed_response, context)
+
+                with stage(self.agent_type, "actions"):
+                    await self.action_registry.aexecute_many(
+                        self._action_calls(parsed_response), self._origin(context)
+                    )
+                await asyncio.to_thread(self._update_context, message, parsed_response, context)
+
+                return parsed_response
+
+        except Exception as e:
+            logger.error(f"Error processing message{self._trace_suffix()}: {str(e)}")
+            raise
+
+    def close(self):
+        """Detach from the shared knowledge base and stop action workers"""
+        if self.response_cache is not None:
+            self.knowledge.remove_change_listener(self.response_cache.invalidate_category)
+        self.action_registry.shutdown(wait=False)
+        if self.summarizer is not None:
+            self.summarizer.close()
+
+    def _categories(self, context: ConversationContext) -> List[str]:
+        """Knowledge categories to search: the current state's, else the agent's"""
+        if self.state_machine is not None:
+            categories = self.state_machine.get(context.current_state).knowledge_categories
+            if categories:
+                return categories
+        return self.knowledge_categories
+
+    def _retrieve(self, query_embedding, message: str, context: ConversationContext) -> List[Dict[str, Any]]:
+        with stage(self.agent_type, "retrieve"):
+            return self._search(query_embedding, message, self._categories(context))
+
+    def _search(self, query_embedding, message: str, categories: List[str]) -> List[Dict[str, Any]]:
+        if len(categories) == 1:
+            return self.knowledge.search_knowledge(
+                query_embedding, category=categories[0], query_text=message
             )
+        results = []
+        for category in categories:
+            results.extend(self.knowledge.search_knowledge(query_embedding, category=category, query_text=message))
+        results.sort(key=lambda item: item["relevance"], reverse=True)
+        return results
+
+    def _cache_key(self, context: ConversationContext,
+                   relevant_info: List[Dict[str, Any]]) -> Optional[Tuple[str, str, str, str]]:
+        if self.response_cache is None:
+            return None
+        categories = self._categories(context)
+        version = sum(self.knowledge.category_versions.get(category, 0) for category in categories)
+        fingerprint = knowledge_fingerprint(relevant_info, version)
+        return (self.agent_type, context.current_state, ",".join(categories), fingerprint)
+
+    def _lookup_cached_response(self, cache_key, query_embedding,
+                                context: ConversationContext) -> Optional[Dict[str, Any]]:
+        if cache_key is None or query_embedding is None:
+            return None
+        with stage(self.agent_type, "cache_lookup"):
+            cached = self.response_cache.lookup(*cache_key, query_embedding, context.collected_info)
+        CACHE_REQUESTS.inc(cache="response", result="miss" if cached is None else "hit")
+        return cached
+
+    def _store_cached_response(self, cache_key, query_embedding, parsed_response: Dict[str, Any],
+                               context: ConversationContext):
+        if cache_key is not None and query_embedding is not None:
+            self.response_cache.store(*cache_key, query_embedding, parsed_response, context.collected_info)
 
-            # 3. Get AI response
-            response = self._get_ai_response(prompt)
+    def _apply_response(self, message: str, parsed_response: Dict[str, Any], context: ConversationContext):
+        self._handle_actions(parsed_response, context)
+        self._update_context(message, parsed_response, context)
 
-            # 4. Parse response
-            parsed_response = self.response_parser.parse(response)
-            
-            # 5. Execute actions and update context
-            self._handle_actions(parsed_response, context)
+    def _parse(self, response: str) -> Dict[str, Any]:
+        with stage(self.agent_type, "parse"):
+            return self.response_parser.parse(response)
 
-            # 6. Update conversation context
+    @staticmethod
+    def _trace_suffix() -> str:
+        trace = current_trace()
+        return f" [trace {trace.trace_id}]" if trace is not None else ""
+
+    def _update_context(self, message: str, parsed_response: Dict[str, Any], context: ConversationContext):
+        with stage(self.agent_type, "context_update"):
             context.add_message("user", message)
             context.add_message("assistant", parsed_response["response"])
-           
-            context.current_state = parsed_response.get("next_state", context.current_state)
 
-            # 7. Update required information
-            context.required_info = parsed_response.get("required_information", [])
-            
-            return parsed_response
+            previous_state = context.current_state
+            next_state = parsed_response.get("next_state", context.current_state)
+            required_info = parsed_response.get("required_information", [])
+            if self.state_machine is not None:
+                next_state = self.state_machine.accept(context.current_state, next_state)
+                # What a state collects is declared; the model's list only fills in otherwise.
+                required_info = list(self.state_machine.get(next_state).required_info) or required_info
+            context.current_state = next_state
+            context.required_info = required_info
+
+            if ANALYTICS_ENABLED:
+                self.knowledge.record_event("turn", context.user_id, context.session_id, context.agent_id, {
+                    "state": previous_state,
+                    "next_state": context.current_state,
+                    "actions": [action.get("name") for action in parsed_response.get("actions", [])
+                                if isinstance(action, dict)],
+                    "confidence": parsed_response.get("confidence")
+                })
+
+        if self.summarizer is not None:
+            self.summarizer.schedule(context)
 
+    def _local_turn(self, message: str, context: ConversationContext) -> Optional[Dict[str, Any]]:
+        """Collect fields the message supplies and take any transition they complete.
+
+        Returns a full response when the state entered has a fixed reply;
+        otherwise the model answers, already from the new state.
+        """
+        if self.state_machine is None:
+            return None
+        with stage(self.agent_type, "state_machine"):
+            for key, value in self.state_machine.extract(context, message).items():
+                context.update_collected_info(key, value)
+                self.knowledge.save_collected_data(
+                    context.user_id, key, value, context.agent_id, self._origin(context)
+                )
+
+            next_state = self.state_machine.completed(context)
+            if next_state is None:
+                return None
+            local = self.state_machine.local_response(context, next_state)
+            if local is None:
+                context.current_state = next_state
+                context.required_info = list(self.state_machine.get(next_state).required_info)
+            return local
+
+    def _apply_summary(self, context: ConversationContext):
+        if self.summarizer is not None:
+            self.summarizer.apply(context)
+
+    def _chat_messages(self, prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": "You are an AI assistant following strict response format."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _get_ai_response(self, prompt: str) -> str:
+        try:
+            with stage(self.agent_type, "llm"):
+                return self.llm.chat(self._chat_messages(prompt), MODEL_NAME, MAX_TOKENS, TEMPERATURE)
         except Exception as e:
-            logger.error(f"Error processing message: {str(e)}")
+            logger.error(f"Error getting AI response: {str(e)}")
             raise
 
-    def _get_ai_response(self, prompt: str) -> str:
+    async def _aget_ai_response(self, prompt: str) -> str:
         try:
-            response = client.chat.completions.create(model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": "You are an AI assistant following strict response format."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=MAX_TOKENS,
-            temperature=TEMPERATURE)
-            return response.choices[0].message.content
+            with stage(self.agent_type, "llm"):
+                return await self.llm.achat(self._chat_messages(prompt), MODEL_NAME, MAX_TOKENS, TEMPERATURE)
         except Exception as e:
             logger.error(f"Error getting AI response: {str(e)}")
             raise
 
+    def _stream_ai_response(self, prompt: str) -> Iterator[str]:
+        try:
+            yield from self.llm.stream_chat(self._chat_messages(prompt), MODEL_NAME, MAX_TOKENS, TEMPERATURE)
+        except Exception as e:
+            logger.error(f"Error streaming AI response: {str(e)}")
+            raise
+
     def _handle_actions(self, parsed_response: Dict[str, Any], context: ConversationContext):
-        for action in parsed_response.get("actions", []):
-            try:
-                action_name = action.get("name")
-                parameters = action.get("parameters", {})
+        calls = self._action_calls(parsed_response)
+        if calls:
+            with stage(self.agent_type, "actions"):
+                self.action_registry.execute_many(calls, self._origin(context))
 
-                if self.action_registry.has_action(action_name):
-                    self.action_registry.execute(action_name, **parameters)
-                else:
-                    logger.warning(f"Unknown action requested: {action_name}")
+    @staticmethod
+    def _origin(context: ConversationContext) -> Dict[str, Any]:
+        # Called before the turn's messages are added, so the count numbers the turn.
+        return {"session_id": context.session_id, "turn": context.message_count}
 
-            except Exception as e:
-                logger.error(f"Error executing action {action.get('name')}: {str(e)}")
\ No newline at end of file
+    def _action_calls(self, parsed_response: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        calls = []
+        for action in parsed_response.get("actions", []):
+            if isinstance(action, dict):
+                calls.append((action.get("name"), action.get("parameters") or {}))
+            else:
+                logger.warning(f"Ignoring malformed action: {action!r}")
+        return calls
@@ -0,0 +1,217 @@
+from typing import Dict, List, Optional, Tuple
+import logging
+import os
+import threading
+import time
+import numpy as np
+from core.vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+class IVFIndex:
+    """Inverted-file approximate search on top of a VectorIndex.
+
+    Vectors are bucketed under their nearest k-means centroid; a query only
+    scores the rows in its `nprobe` closest buckets. Raising nprobe trades
+    latency for recall. Until the index holds `min_train_size` rows there
+    are no centroids and every search falls back to the exact scan.
+    """
+
+    def __init__(self,
+                 index: VectorIndex,
+                 path: Optional[str] = None,
+                 nlist: int = 0,
+                 nprobe: int = 8,
+                 min_train_size: int = 10000,
+                 kmeans_iterations: int = 20,
+                 save_every: int = 1000):
+        self.index = index
+        self.path = path
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.kmeans_iterations = kmeans_iterations
+        self.save_every = save_every
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        self._list_arrays: Dict[int, np.ndarray] = {}
+        self._assigned = 0
+        self._unsaved = 0
+        self._lock = threading.RLock()
+        self.load()
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def search(self,
+               query_embedding,
+               category: Optional[str] = None,
+               threshold: float = -1.0,
+               top_k: Optional[int] = None,
+               nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        self.sync()
+        if not self.is_trained:
+            return self.index.search(query_embedding, category, threshold, top_k)
+
+        with self._lock:
+            query = VectorIndex.normalize(query_embedding)
+            probe = min(nprobe or self.nprobe, len(self.centroids))
+            nearest = np.argpartition(-(self.centroids @ query), probe - 1)[:probe]
+            buckets = [self._bucket(int(b)) for b in nearest]
+        candidates = np.sort(np.concatenate(buckets)) if buckets else np.empty(0, dtype=np.int64)
+        return self.index.search_positions(query, candidates, category, threshold, top_k)
+
+    def sync(self):
+        """Assign rows added to the vector index since the last call; train once large enough"""
+        if self._assigned == len(self.index):
+            return
+        with self._lock:
+            if not self.is_trained:
+                if len(self.index) < self.min_train_size:
+                    return
+                self.train()
+                return
+            end = len(self.index)
+            if end == self._assigned:
+                return
+            assignments = self._assign(self.index.vectors(np.arange(self._assigned, end)), self.centroids)
+            for offset, bucket in enumerate(assignments):
+                self._lists[bucket].append(self._assigned + offset)
+                self._list_arrays.pop(int(bucket), None)
+            self._unsaved += end - self._assigned
+            self._assigned = end
+            if self._unsaved >= self.save_every:
+                self.save()
+
+    def train(self, sample_size: Optional[int] = None, seed: int = 0):
+        """Fit centroids with spherical k-means and rebuild every bucket"""
+        with self._lock:
+            size = len(self.index)
+            if size == 0:
+                return
+            nlist = self.nlist or max(1, int(4 * np.sqrt(size)))
+            nlist = min(nlist, size)
+            rng = np.random.default_rng(seed)
+            sample_size = min(size, sample_size or 64 * nlist)
+            sample = self.index.vectors(np.sort(rng.choice(size, sample_size, replace=False)))
+
+            started = time.perf_counter()
+            self.centroids = self._kmeans(sample, nlist, rng)
+            assignments = self._assign(self.index.vectors(), self.centroids)
+            self._lists = [[] for _ in range(nlist)]
+            for position, bucket in enumerate(assignments):
+                self._lists[bucket].append(position)
+            self._list_arrays = {}
+            self._assigned = size
+            logger.info(
+                f"Trained IVF index: {nlist} lists over {size} rows in {time.perf_counter() - started:.2f}s"
+            )
+            self.save()
+
+    def save(self):
+        if not self.path or not self.is_trained:
+            return
+        with self._lock:
+            ids = self.index.ids()
+            assignments = np.full(self._assigned, -1, dtype=np.int32)
+            for bucket, positions in enumerate(self._lists):
+                assignments[positions] = bucket
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as handle:
+                np.savez(handle, centroids=self.centroids, ids=ids[:self._assigned], assignments=assignments)
+            os.replace(tmp_path, self.path)
+            self._unsaved = 0
+
+    def load(self):
+        """Restore centroids and bucket membership; rows missing from the file are assigned on sync"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        with self._lock, np.load(self.path) as data:
+            centroids = data["centroids"]
+            if self.index.dimension is not None and centroids.shape[1] != self.index.dimension:
+                logger.warning(f"Ignoring IVF index at {self.path}: dimension mismatch")
+                return
+            self.centroids = centroids
+            self._lists = [[] for _ in range(len(centroids))]
+            self._list_arrays = {}
+            saved = dict(zip(data["ids"].tolist(), data["assignments"].tolist()))
+
+        # Rows stay in file order only while the saved prefix still matches the index.
+        ids = self.index.ids().tolist()
+        assigned = 0
+        for position, entry_id in enumerate(ids):
+            bucket = saved.get(entry_id)
+            if bucket is None:
+                break
+            self._lists[bucket].append(position)
+            assigned = position + 1
+        self._assigned = assigned
+
+    def _bucket(self, bucket: int) -> np.ndarray:
+        array = self._list_arrays.get(bucket)
+        if array is None:
+            array = np.asarray(self._lists[bucket], dtype=np.int64)
+            self._list_arrays[bucket] = array
+        return array
+
+    def _kmeans(self, vectors: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+        centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            assignments = self._assign(vectors, centroids)
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=k)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            filled = counts > 0
+            sums = np.add.reduceat(vectors[order], starts[filled], axis=0)
+            centroids[filled] = VectorIndex.normalize(sums)
+            # Re-seed empty clusters from random points so every list stays useful.
+            empty = np.flatnonzero(~filled)
+            if len(empty):
+                centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        return centroids
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 4096) -> np.ndarray:
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk_size):
+            chunk = vectors[start:start + chunk_size]
+            assignments[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+        return assignments
+
+def recall_at_k(ann: IVFIndex,
+                k: int = 10,
+                num_queries: int = 200,
+                nprobes: Optional[List[int]] = None,
+                noise: float = 0.05,
+                seed: int = 0) -> List[Dict[str, float]]:
+    """Compare IVF results with the exact scan on perturbed copies of stored vectors"""
+    size = len(ann.index)
+    if size == 0:
+        return []
+    rng = np.random.default_rng(seed)
+    base = ann.index.vectors(rng.choice(size, min(num_queries, size), replace=False))
+    queries = base + rng.normal(0, noise, base.shape).astype(np.float32)
+
+    exact_ids, exact_time = [], 0.0
+    for query in queries:
+        started = time.perf_counter()
+        exact_ids.append({entry_id for entry_id, _ in ann.index.search(query, top_k=k)})
+        exact_time += time.perf_counter() - started
+
+    report = []
+    for nprobe in nprobes or [1, 4, ann.nprobe, 32]:
+        hits, total, ann_time = 0, 0, 0.0
+        for query, expected in zip(queries, exact_ids):
+            started = time.perf_counter()
+            found = ann.search(query, top_k=k, nprobe=nprobe)
+            ann_time += time.perf_counter() - started
+            hits += len(expected.intersection(entry_id for entry_id, _ in found))
+            total += len(expected)
+        report.append({
+            "nprobe": nprobe,
+            "recall_at_k": hits / total if total else 1.0,
+            "ann_ms": 1000 * ann_time / len(queries),
+            "exact_ms": 1000 * exact_time / len(queries)
+        })
+    return report
@@ -1,6 +1,90 @@
 from dataclasses import dataclass, field
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterator, Optional
+from collections import deque
 from datetime import datetime
+from itertools import islice
+import time
+from config.settings import HISTORY_WINDOW
+
+class Message:
+    __slots__ = ("role", "content", "timestamp")
+
+    def __init__(self, role: str, content: str, timestamp: Optional[float] = None):
+        self.role = role
+        self.content = content
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "role": self.role,
+            "content": self.content,
+            "timestamp": datetime.fromtimestamp(self.timestamp).isoformat()
+        }
+
+    def to_record(self) -> list:
+        return [self.role, self.content, self.timestamp]
+
+    @classmethod
+    def from_record(cls, record) -> "Message":
+        if isinstance(record, dict):
+            timestamp = record.get("timestamp")
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp).timestamp()
+            return cls(record["role"], record["content"], timestamp)
+        return cls(*record)
+
+class ConversationHistory:
+    """Ring buffer holding the last `window` messages of a conversation.
+
+    Messages pushed out of the window wait in `evicted` until a session
+    store drains them (to archive them) on the next save, so memory per
+    session stays bounded however long the conversation runs.
+    """
+
+    def __init__(self, window: int = HISTORY_WINDOW, messages=()):
+        self.window = window
+        self._messages: deque = deque(maxlen=window)
+        self.evicted: List[Message] = []
+        self.archived_count = 0
+        for message in messages:
+            self._messages.append(message)
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __iter__(self) -> Iterator[Message]:
+        return iter(self._messages)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [message.to_dict() for message in list(self._messages)[index]]
+        return self._messages[index].to_dict()
+
+    def append(self, message: Message):
+        if len(self._messages) == self.window:
+            self.evicted.append(self._messages[0])
+            # Nobody draining: keep at most one window's worth of spill.
+            if len(self.evicted) > self.window:
+                del self.evicted[0]
+            self.archived_count += 1
+        self._messages.append(message)
+
+    def recent(self, count: int) -> List[Dict[str, Any]]:
+        start = max(0, len(self._messages) - count)
+        return [message.to_dict() for message in islice(self._messages, start, None)]
+
+    def drain_evicted(self) -> List[Message]:
+        evicted, self.evicted = self.evicted, []
+        return evicted
+
+    def to_records(self) -> List[list]:
+        return [message.to_record() for message in self._messages]
+
+    @classmethod
+    def from_records(cls, records, window: int = HISTORY_WINDOW, archived_count: int = 0) -> "ConversationHistory":
+        history = cls(window, (Message.from_record(record) for record in records))
+        history.archived_count = archived_count
+        return history
 
 @dataclass
 class ConversationContext:
@@ -10,16 +94,20 @@ class ConversationContext:
     current_state: str = "initial"
     collected_info: Dict[str, Any] = field(default_factory=dict)
     required_info: List[str] = field(default_factory=list)
-    conversation_history: List[Dict[str, Any]] = field(default_factory=list)
+    conversation_history: ConversationHistory = field(default_factory=ConversationHistory)
     last_interaction: datetime = field(default_factory=datetime.now)
     metadata: Dict[str, Any] = field(default_factory=dict)
+    # Running summary of the first `summarized_count` messages (see ConversationSummarizer)
+    summary: str = ""
+    summarized_count: int = 0
+
+    @property
+    def message_count(self) -> int:
+        """Messages in the whole conversation, including those archived out of the window"""
+        return self.conversation_history.archived_count + len(self.conversation_history)
 
     def add_message(self, role: str, content: str):
-        self.conversation_history.append({
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat()
-        })
+        self.conversation_history.append(Message(role, content))
         self.last_interaction = datetime.now()
 
     def update_collected_info(self, key: str, value: Any):
@@ -29,4 +117,30 @@ class ConversationContext:
         return all(info in self.collected_info for info in self.required_info)
 
     def get_missing_info(self) -> List[str]:
-        return [info for info in self.required_info if info not in self.collected_info]
\ No newline at end of file
+        return [info for info in self.required_info if info not in self.collected_info]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "user_id": self.user_id,
+            "session_id": self.session_id,
+            "agent_id": self.agent_id,
+            "current_state": self.current_state,
+            "collected_info": self.collected_info,
+            "required_info": self.required_info,
+            "conversation_history": self.conversation_history.to_records(),
+            "archived_count": self.conversation_history.archived_count,
+            "last_interaction": self.last_interaction.timestamp(),
+            "metadata": self.metadata,
+            "summary": self.summary,
+            "summarized_count": self.summarized_count
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConversationContext":
+        data = dict(data)
+        data["last_interaction"] = datetime.fromtimestamp(data["last_interaction"])
+        data["conversation_history"] = ConversationHistory.from_records(
+            data.get("conversation_history", []),
+            archived_count=data.pop("archived_count", 0)
+        )
+        return cls(**data)
@@ -0,0 +1,131 @@
+from typing import Dict, List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+import asyncio
+import threading
+import time
+import logging
+from core.llm import LLMProvider
+from core.metrics import EMBEDDING_BATCH_SIZE, EMBEDDING_COALESCED
+from config.settings import (
+    EMBEDDING_MODEL, EMBEDDING_TIMEOUT_SECONDS, EMBEDDING_BATCH_MAX_SIZE, EMBEDDING_BATCH_WINDOW_MS,
+    EMBEDDING_BATCH_CONCURRENCY
+)
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingBatcher:
+    """Coalesces single-text embedding requests into batched API calls.
+
+    A dispatcher thread collects texts that arrive within `window_ms` of
+    the first one (or until `max_batch_size` are waiting) and sends them
+    as one embeddings call; each caller gets its own vector back. A text
+    that is already queued or in flight is not sent again, its callers
+    share the pending result. Up to `concurrency` batches are in flight at
+    once, and texts keep collecting while all of them are busy.
+
+    Every batch is one attempt bounded by `timeout`, like a query
+    embedding; a failure is raised to each caller in that batch.
+    """
+
+    def __init__(self,
+                 llm: LLMProvider,
+                 model: str = EMBEDDING_MODEL,
+                 max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE,
+                 window_ms: float = EMBEDDING_BATCH_WINDOW_MS,
+                 concurrency: int = EMBEDDING_BATCH_CONCURRENCY,
+                 timeout: Optional[float] = EMBEDDING_TIMEOUT_SECONDS,
+                 retries: int = 0):
+        self.llm = llm
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.window = window_ms / 1000.0
+        self.timeout = timeout
+        self.retries = retries
+        self.stats: Dict[str, int] = {"requests": 0, "coalesced": 0, "batches": 0, "sent": 0}
+        self._pending: List[str] = []
+        self._inflight: Dict[str, Future] = {}  # queued or being embedded
+        self._cond = threading.Condition()
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed-batch")
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def submit(self, text: str) -> Future:
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("EmbeddingBatcher is closed")
+            self.stats["requests"] += 1
+            future = self._inflight.get(text)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                EMBEDDING_COALESCED.inc()
+                return future
+
+            future = Future()
+            self._inflight[text] = future
+            self._pending.append(text)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name="embed-dispatcher", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            return future
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        return self.submit(text).result(timeout)
+
+    async def aembed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        # shield: one caller giving up must not cancel the result others share.
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(self.submit(text))), timeout)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        self._pool.shutdown(wait=True)
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+            # Waiting for a free slot lets the next batch keep growing.
+            self._slots.acquire()
+            with self._cond:
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:len(batch)]
+            self._pool.submit(self._send, batch)
+
+    def _send(self, batch: List[str]):
+        vectors, error = None, None
+        try:
+            vectors = self.llm.embed(batch, self.model, timeout=self.timeout, retries=self.retries)
+        except Exception as e:
+            error = e
+            logger.warning(f"Batched embedding of {len(batch)} texts failed: {str(e)}")
+        finally:
+            self._slots.release()
+
+        with self._cond:
+            futures = [self._inflight.pop(text) for text in batch]
+            self.stats["batches"] += 1
+            self.stats["sent"] += len(batch)
+        EMBEDDING_BATCH_SIZE.observe(len(batch))
+
+        for position, future in enumerate(futures):
+            if future.cancelled():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(vectors[position])
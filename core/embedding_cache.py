@@ -0,0 +1,169 @@
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+import hashlib
+import re
+import threading
+import time
+import logging
+from core.embedding_codec import encode_embedding, decode_embedding
+from core.storage import SQLiteStorage
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip().casefold()
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """Two-tier embedding cache: an in-process LRU over a SQLite table.
+
+    Keys hash the model name with case- and whitespace-normalized text, so
+    trivially different spellings of the same message share one entry.
+    The table lives in the knowledge base's database and goes through its
+    SQLiteStorage, so disk lookups use the reader pool. Disk hits only
+    note their last use; the notes are written with the next put, or once
+    `touch_batch` have piled up, so reads don't contend for the writer.
+    """
+
+    def __init__(self,
+                 storage: SQLiteStorage,
+                 memory_size: int = 2048,
+                 max_entries: int = 100000,
+                 ttl_seconds: float = 30 * 24 * 3600,
+                 touch_batch: int = 256):
+        self.storage = storage
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.touch_batch = touch_batch
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._touched: Dict[str, float] = {}  # key -> last use not yet written
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self.stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        with storage.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache(last_used)")
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        key = cache_key(model, text)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                embedding, created_at = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return embedding
+                del self._memory[key]
+
+        with self.storage.reader() as conn:
+            row = conn.execute(
+                "SELECT embedding, created_at FROM embedding_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or now - row[1] > self.ttl_seconds:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        embedding = decode_embedding(row[0]).tolist()
+        with self._lock:
+            self._remember(key, embedding, row[1])
+            self._touched[key] = now
+            self.stats["disk_hits"] += 1
+            flush = len(self._touched) >= self.touch_batch
+        if flush:
+            with self.storage.transaction() as conn:
+                self._write_touched(conn)
+        return embedding
+
+    def put(self, model: str, text: str, embedding: List[float]):
+        key = cache_key(model, text)
+        now = time.time()
+        with self._lock:
+            self._remember(key, embedding, now)
+        self._write([(key, model, encode_embedding(embedding), now, now)], now)
+
+    def put_many(self, model: str, items: List[Tuple[str, List[float]]]):
+        """Cache several embeddings in a single transaction"""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, embedding in items:
+                key = cache_key(model, text)
+                self._remember(key, embedding, now)
+                rows.append((key, model, encode_embedding(embedding), now, now))
+        self._write(rows, now)
+
+    def evict(self):
+        """Drop expired rows and trim the table to max_entries by last use"""
+        with self.storage.transaction() as conn:
+            self._write_touched(conn)
+            self._evict(conn, time.time())
+
+    def hit_rate(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def close(self):
+        """Write pending last-use notes; the storage belongs to the knowledge base"""
+        with self.storage.transaction() as conn:
+            self._write_touched(conn)
+
+    def _remember(self, key: str, embedding: List[float], created_at: float):
+        self._memory[key] = (embedding, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _write(self, rows: List[tuple], now: float):
+        with self.storage.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (key, model, embedding, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._write_touched(conn)
+            with self._lock:
+                self._writes_since_evict += len(rows)
+                evict = self._writes_since_evict >= 1000
+            if evict:
+                self._evict(conn, now)
+
+    def _write_touched(self, conn):
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if touched:
+            conn.executemany(
+                "UPDATE embedding_cache SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in touched.items()]
+            )
+
+    def _evict(self, conn, now: float):
+        expired = conn.execute(
+            "DELETE FROM embedding_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        overflow = conn.execute(
+            """DELETE FROM embedding_cache WHERE key IN (
+                SELECT key FROM embedding_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )""",
+            (self.max_entries,)
+        ).rowcount
+        self._writes_since_evict = 0
+        self.stats["evictions"] += expired + overflow
+        if expired or overflow:
+            logger.info(f"Evicted {expired} expired and {overflow} overflow cached embeddings")
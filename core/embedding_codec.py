@@ -0,0 +1,59 @@
+from typing import Union
+import json
+import struct
+import numpy as np
+
+# Blob layout: 3-byte magic, 1-byte format code, optional float32 scale
+# (int8 only), then little-endian vector data.
+MAGIC = b"EMB"
+FORMATS = {
+    "float32": b"f",
+    "float16": b"h",
+    "int8": b"b",
+}
+_CODES = {code: name for name, code in FORMATS.items()}
+_DTYPES = {"float32": "<f4", "float16": "<f2", "int8": "i1"}
+_SCALE = struct.Struct("<f")
+
+class EmbeddingCodecError(Exception):
+    pass
+
+def encode_embedding(embedding, storage_format: str = "float32") -> bytes:
+    if storage_format not in FORMATS:
+        raise EmbeddingCodecError(f"Unknown embedding storage format: {storage_format}")
+    vector = np.asarray(embedding, dtype=np.float32)
+    header = MAGIC + FORMATS[storage_format]
+
+    if storage_format == "int8":
+        peak = float(np.max(np.abs(vector))) if vector.size else 0.0
+        scale = peak / 127.0 if peak > 0 else 1.0
+        quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        return header + _SCALE.pack(scale) + quantized.tobytes()
+
+    return header + vector.astype(_DTYPES[storage_format]).tobytes()
+
+def decode_embedding(stored: Union[bytes, str]) -> np.ndarray:
+    """Decode a stored embedding into float32, accepting legacy JSON text"""
+    if isinstance(stored, str):
+        return np.asarray(json.loads(stored), dtype=np.float32)
+
+    blob = memoryview(stored)
+    if bytes(blob[:3]) != MAGIC:
+        raise EmbeddingCodecError("Unrecognized embedding blob")
+    storage_format = _CODES.get(bytes(blob[3:4]))
+    if storage_format is None:
+        raise EmbeddingCodecError(f"Unknown embedding format code: {bytes(blob[3:4])!r}")
+
+    if storage_format == "int8":
+        (scale,) = _SCALE.unpack_from(blob, 4)
+        quantized = np.frombuffer(blob, dtype=np.int8, offset=4 + _SCALE.size)
+        return quantized.astype(np.float32) * np.float32(scale)
+
+    return np.frombuffer(blob, dtype=_DTYPES[storage_format], offset=4).astype(np.float32)
+
+def storage_format_of(stored: Union[bytes, str, None]) -> str:
+    if stored is None:
+        return "none"
+    if isinstance(stored, str):
+        return "json"
+    return _CODES.get(bytes(stored[3:4]), "unknown")
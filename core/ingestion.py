@@ -0,0 +1,151 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+import json
+import re
+import time
+from core.knowledge_base import content_hash
+
+def iter_jsonl(lines: Iterable, source: str = "input") -> Iterator[Dict[str, Any]]:
+    """Parse JSON Lines lazily, skipping blank lines; accepts str or bytes lines"""
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{source} line {number}: invalid JSON ({e})")
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 150) -> List[str]:
+    """Split text into chunks of at most ~chunk_size characters.
+
+    Paragraphs are hard boundaries, so editing one paragraph only changes
+    the chunks cut from it; long paragraphs are packed sentence by sentence
+    and consecutive chunks share up to `overlap` characters of trailing
+    sentences.
+    """
+    chunks = []
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if len(paragraph) <= chunk_size:
+            chunks.append(paragraph)
+            continue
+
+        sentences = []
+        for sentence in _SENTENCE_END.split(paragraph):
+            # A single run-on sentence still has to fit: hard-wrap it.
+            sentences.extend(sentence[start:start + chunk_size] for start in range(0, len(sentence), chunk_size))
+
+        current: List[str] = []
+        length = 0
+        for sentence in sentences:
+            if current and length + len(sentence) + 1 > chunk_size:
+                chunks.append(" ".join(current))
+                carried: List[str] = []
+                carried_length = 0
+                for previous in reversed(current):
+                    if carried_length + len(previous) + 1 > overlap:
+                        break
+                    carried.insert(0, previous)
+                    carried_length += len(previous) + 1
+                current, length = carried, carried_length
+            current.append(sentence)
+            length += len(sentence) + 1
+        if current:
+            chunks.append(" ".join(current))
+    return chunks
+
+class DocumentIngestor:
+    """Incrementally (re-)indexes whole documents as overlapping chunks.
+
+    Each chunk is stored with its document_id, position and content hash.
+    Re-ingesting a document re-embeds only chunks whose text is new, keeps
+    unchanged ones (re-numbering them if they moved) and deletes the rest.
+    Chunks from several documents are embedded and written together once
+    `batch_size` new chunks are pending.
+    """
+
+    def __init__(self, knowledge, chunk_size: int = 1000, overlap: int = 150, batch_size: int = 256):
+        self.knowledge = knowledge
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.batch_size = batch_size
+
+    def ingest(self,
+               documents: Iterable[Dict[str, Any]],
+               progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        stats = {"documents": 0, "chunks": 0, "embedded": 0, "unchanged": 0, "deleted": 0, "seconds": 0.0}
+        started = time.perf_counter()
+        inserts: List[Dict[str, Any]] = []
+        updates: List[Dict[str, Any]] = []
+        deletes: List[int] = []
+        pending_documents = set()
+
+        def flush():
+            embeddings = self.knowledge._generate_embeddings([chunk["content"] for chunk in inserts])
+            for chunk, embedding in zip(inserts, embeddings):
+                chunk["embedding"] = embedding
+            self.knowledge.apply_chunk_changes(inserts, updates, deletes)
+            stats["embedded"] += len(inserts)
+            stats["deleted"] += len(deletes)
+            stats["seconds"] = time.perf_counter() - started
+            inserts.clear()
+            updates.clear()
+            deletes.clear()
+            pending_documents.clear()
+            if progress is not None:
+                progress(dict(stats))
+
+        for document in documents:
+            if document.get("document_id") in pending_documents:
+                # Plan against the stored state, not the unflushed one.
+                flush()
+            pending_documents.add(document.get("document_id"))
+            new, kept, removed = self._plan(document)
+            inserts.extend(new)
+            updates.extend(kept)
+            deletes.extend(removed)
+            stats["documents"] += 1
+            stats["chunks"] += len(new) + len(kept)
+            stats["unchanged"] += len(kept)
+            if len(inserts) >= self.batch_size:
+                flush()
+        if inserts or updates or deletes:
+            flush()
+        return stats
+
+    def _plan(self, document: Dict[str, Any]):
+        document_id = document.get("document_id")
+        category = document.get("category")
+        text = document.get("content") or document.get("text")
+        if not document_id or not category or text is None:
+            raise ValueError("Documents need document_id, category and content")
+
+        existing: Dict[tuple, List[Dict[str, Any]]] = {}
+        for chunk in self.knowledge.get_document_chunks(document_id):
+            existing.setdefault((chunk["category"], chunk["content_hash"]), []).append(chunk)
+
+        new, kept = [], []
+        for chunk_index, content in enumerate(chunk_text(text, self.chunk_size, self.overlap)):
+            digest = content_hash(content)
+            metadata = {**(document.get("metadata") or {}), "document_id": document_id, "chunk_index": chunk_index}
+            matches = existing.get((category, digest))
+            if matches:
+                kept.append({"id": matches.pop(0)["id"], "chunk_index": chunk_index, "metadata": metadata})
+            else:
+                new.append({
+                    "category": category,
+                    "content": content,
+                    "metadata": metadata,
+                    "content_hash": digest,
+                    "document_id": document_id,
+                    "chunk_index": chunk_index
+                })
+        removed = [chunk["id"] for chunks in existing.values() for chunk in chunks]
+        return new, kept, removed
@@ -0,0 +1,294 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import defaultdict
+import json
+import random
+import threading
+import time
+import logging
+from core.storage import SQLiteStorage
+from config.settings import JOB_QUEUE_DB_PATH, JOB_QUEUE_WORKERS, JOB_QUEUE_BATCH_SIZE, JOB_QUEUE_MAX_ATTEMPTS
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[List[Dict[str, Any]]], None]
+
+class JobQueue:
+    """Durable SQLite-backed queue for work that must not slow down a request.
+
+    enqueue() is one INSERT in a WAL database, so it is all the request
+    path pays for. Worker threads claim due jobs in batches and hand every
+    job of one kind to its handler in a single call, so a handler that
+    writes with executemany commits once per batch rather than once per
+    job. A failed batch is retried with jittered exponential backoff and a
+    job that keeps failing is parked as 'failed' after max_attempts.
+    A job still 'running' `lease_seconds` after it was claimed is assumed
+    lost with its worker and is handed out again. Optional idempotency
+    keys make a repeated enqueue a no-op for as long as finished jobs are
+    retained.
+    """
+
+    def __init__(self,
+                 db_path: str = "jobs.db",
+                 workers: int = 2,
+                 batch_size: int = 200,
+                 max_attempts: int = 5,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 300.0,
+                 poll_interval: float = 1.0,
+                 lease_seconds: float = 300.0,
+                 retention_seconds: float = 24 * 3600):
+        self.db_path = db_path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+        self.handlers: Dict[str, Handler] = {}
+        self._batched: Dict[str, bool] = {}
+        self.stats: Dict[str, int] = {"enqueued": 0, "duplicates": 0, "completed": 0, "retried": 0, "failed": 0}
+        # Every thread shares one writer and a small reader pool, however
+        # many request threads come and go.
+        self.storage = SQLiteStorage(db_path, readers=2)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._busy = 0
+        self._setup()
+
+    def _setup(self):
+        with self.storage.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    idempotency_key TEXT UNIQUE,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    run_after REAL NOT NULL,
+                    locked_at REAL,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    finished_at REAL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs(status, run_after)")
+
+    def register_handler(self, kind: str, handler: Handler, batched: bool = True):
+        """`handler` receives a list of payloads and must process all of them or raise.
+
+        A batch that raises is retried job by job, so batched handlers
+        should apply a batch atomically (one transaction). Handlers with
+        side effects that cannot be rolled back should pass batched=False
+        to be called with one payload at a time.
+        """
+        self.handlers[kind] = handler
+        self._batched[kind] = batched
+
+    def enqueue(self, kind: str, payload: Dict[str, Any],
+                idempotency_key: Optional[str] = None, delay: float = 0.0) -> Optional[int]:
+        """Persist a job; returns its id, or None if the idempotency key was already used"""
+        now = time.time()
+        with self.storage.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (kind, payload, idempotency_key, run_after, created_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload), idempotency_key, now + delay, now)
+            )
+        if cursor.rowcount == 0:
+            self.stats["duplicates"] += 1
+            return None
+        self.stats["enqueued"] += 1
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def enqueue_many(self, kind: str, items: List[Tuple[Dict[str, Any], Optional[str]]]) -> int:
+        """Enqueue (payload, idempotency_key) pairs in one transaction; returns how many were new"""
+        now = time.time()
+        with self.storage.transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (kind, payload, idempotency_key, run_after, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(kind, json.dumps(payload), key, now, now) for payload, key in items]
+            )
+            inserted = conn.total_changes - before
+        self.stats["enqueued"] += inserted
+        self.stats["duplicates"] += len(items) - inserted
+        self._wakeup.set()
+        return inserted
+
+    def start(self):
+        """Requeue jobs abandoned by a previous process and start the workers"""
+        if self._threads:
+            return
+        self.requeue_expired()
+        self._stopping.clear()
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """Wait until no job is due or running; True if the queue went idle in time"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self.storage.reader() as conn:
+                row = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'pending' AND run_after <= ?", (time.time(),)
+                ).fetchone()
+            if row[0] == 0 and self._busy == 0:
+                return True
+            self._wakeup.set()
+            time.sleep(0.01)
+        return False
+
+    def counts(self) -> Dict[str, int]:
+        with self.storage.reader() as conn:
+            cursor = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+            return {status: count for status, count in cursor.fetchall()}
+
+    def purge(self) -> int:
+        """Delete finished jobs past the retention window (their keys become reusable)"""
+        with self.storage.transaction() as conn:
+            return conn.execute(
+                "DELETE FROM jobs WHERE status = 'done' AND finished_at < ?",
+                (time.time() - self.retention_seconds,)
+            ).rowcount
+
+    def requeue_expired(self) -> int:
+        """Hand out again jobs whose lease ran out; returns how many.
+
+        A job that was already claimed max_attempts times is parked as
+        'failed' instead, so one that kills its worker cannot loop forever.
+        """
+        with self.storage.transaction() as conn:
+            return conn.execute(
+                """
+                UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    last_error = 'lease expired', finished_at = CASE WHEN attempts >= ? THEN ? END
+                WHERE status = 'running' AND locked_at < ?
+                """,
+                (self.max_attempts, self.max_attempts, time.time(), time.time() - self.lease_seconds)
+            ).rowcount
+
+    def close(self):
+        self.stop()
+        self.storage.close()
+
+    def _work(self):
+        last_purge = last_requeue = time.monotonic()
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            if time.monotonic() - last_requeue > self.lease_seconds / 2:
+                try:
+                    if self.requeue_expired():
+                        logger.warning("Requeued jobs whose worker stopped responding")
+                except Exception as e:
+                    logger.error(f"Requeueing expired jobs failed: {str(e)}")
+                last_requeue = time.monotonic()
+            try:
+                processed = self.run_once()
+            except Exception as e:
+                logger.error(f"Job worker error: {str(e)}")
+                processed = 0
+            if time.monotonic() - last_purge > 3600:
+                self.purge()
+                last_purge = time.monotonic()
+            if not processed:
+                self._wakeup.wait(self.poll_interval)
+
+    def run_once(self) -> int:
+        """Claim one batch of due jobs and process it; returns how many were claimed"""
+        with self._lock:
+            self._busy += 1
+        try:
+            jobs = self._claim()
+            by_kind = defaultdict(list)
+            for job in jobs:
+                by_kind[job[1]].append(job)
+            for kind, batch in by_kind.items():
+                if self._batched.get(kind, True):
+                    self._process(kind, batch)
+                else:
+                    for job in batch:
+                        self._process(kind, [job])
+            return len(jobs)
+        finally:
+            with self._lock:
+                self._busy -= 1
+
+    def _claim(self) -> List[tuple]:
+        now = time.time()
+        with self.storage.transaction() as conn:
+            return conn.execute(
+                """
+                UPDATE jobs SET status = 'running', locked_at = ?, attempts = attempts + 1
+                WHERE id IN (
+                    SELECT id FROM jobs WHERE status = 'pending' AND run_after <= ? ORDER BY id LIMIT ?
+                )
+                RETURNING id, kind, payload, attempts
+                """,
+                (now, now, self.batch_size)
+            ).fetchall()
+
+    def _process(self, kind: str, batch: List[tuple]):
+        handler = self.handlers.get(kind)
+        try:
+            if handler is None:
+                raise KeyError(f"No handler registered for job kind '{kind}'")
+            handler([json.loads(job[2]) for job in batch])
+        except Exception as e:
+            if len(batch) > 1 and handler is not None:
+                # Retry one by one so a single bad payload doesn't hold back the rest.
+                for job in batch:
+                    self._process(kind, [job])
+                return
+            logger.error(f"{len(batch)} '{kind}' jobs failed: {str(e)}")
+            self._reschedule(batch, str(e))
+            return
+        with self.storage.transaction() as conn:
+            conn.executemany(
+                "UPDATE jobs SET status = 'done', finished_at = ?, last_error = NULL WHERE id = ?",
+                [(time.time(), job[0]) for job in batch]
+            )
+        self.stats["completed"] += len(batch)
+
+    def _reschedule(self, batch: List[tuple], error: str):
+        now = time.time()
+        retry, failed = [], []
+        for job_id, _, _, attempts in batch:
+            if attempts >= self.max_attempts:
+                failed.append((error, now, job_id))
+            else:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+                retry.append((now + delay * random.uniform(0.5, 1.0), error, job_id))
+        with self.storage.transaction() as conn:
+            conn.executemany(
+                "UPDATE jobs SET status = 'pending', run_after = ?, last_error = ? WHERE id = ?", retry
+            )
+            conn.executemany(
+                "UPDATE jobs SET status = 'failed', last_error = ?, finished_at = ? WHERE id = ?", failed
+            )
+        self.stats["retried"] += len(retry)
+        self.stats["failed"] += len(failed)
+
+def create_job_queue(start: bool = True) -> JobQueue:
+    job_queue = JobQueue(
+        JOB_QUEUE_DB_PATH,
+        workers=JOB_QUEUE_WORKERS,
+        batch_size=JOB_QUEUE_BATCH_SIZE,
+        max_attempts=JOB_QUEUE_MAX_ATTEMPTS
+    )
+    if start:
+        job_queue.start()
+    return job_queue
@@ -1,18 +1,94 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Iterable
 import sqlite3
 import json
-from openai import OpenAI
+import hashlib
+import re
+import time
+import threading
+import logging
+import asyncio
+from core.vector_index import VectorIndex
+from core.ann_index import IVFIndex
+from core.embedding_codec import encode_embedding, decode_embedding, storage_format_of
+from core.embedding_cache import EmbeddingCache
+from core.embedding_batcher import EmbeddingBatcher
+from core.job_queue import JobQueue
+from core.storage import SQLiteStorage
+from core.llm import LLMProvider, get_provider
+from core.metrics import CACHE_REQUESTS
+from config.settings import (
+    EMBEDDING_MODEL, VECTOR_SIMILARITY_THRESHOLD, EMBEDDING_STORAGE_FORMAT,
+    RETRIEVAL_ENGINE, IVF_NLIST, IVF_NPROBE, IVF_MIN_TRAIN_SIZE,
+    EMBEDDING_CACHE_ENABLED, EMBEDDING_CACHE_MEMORY_SIZE, EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_TTL_SECONDS, RETRIEVAL_MODE, HYBRID_CANDIDATES, HYBRID_TOP_K,
+    HYBRID_MIN_SIMILARITY, RRF_K, EMBEDDING_TIMEOUT_SECONDS, EMBEDDING_RETRY_AFTER_SECONDS,
+    EMBEDDING_BATCHING_ENABLED
+)
 
-client = OpenAI()
-from config.settings import EMBEDDING_MODEL, VECTOR_SIMILARITY_THRESHOLD
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+")
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 MATCH expression: any of the words, each quoted"""
+    return " OR ".join(f'"{word}"' for word in _WORD.findall(text.lower()))
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[tuple]:
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, entry_id in enumerate(ranking):
+            scores[entry_id] = scores.get(entry_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
 
 class KnowledgeBase:
-    def __init__(self, db_path: str = 'knowledge.db'):
-        self.conn = sqlite3.connect(db_path)
+    def __init__(self, db_path: str = 'knowledge.db', retrieval_engine: str = RETRIEVAL_ENGINE,
+                 retrieval_mode: str = RETRIEVAL_MODE, llm: Optional[LLMProvider] = None,
+                 ivf_nlist: int = IVF_NLIST):
+        self.db_path = db_path
+        self.llm = llm or get_provider()
+        self.storage = SQLiteStorage(db_path)
+        self.lexical_enabled = False
         self.setup_database()
+        self.retrieval_mode = retrieval_mode
+        self._embedding_retry_at = 0.0
+        self.retrieval_engine = retrieval_engine
+        self.ivf_nlist = ivf_nlist
+        self.index = VectorIndex()
+        self.ann: Optional[IVFIndex] = None
+        self.category_versions: Dict[str, int] = {}
+        self._change_listeners: List[Callable[[str], None]] = []
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        if EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = EmbeddingCache(
+                self.storage,
+                memory_size=EMBEDDING_CACHE_MEMORY_SIZE,
+                max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+                ttl_seconds=EMBEDDING_CACHE_TTL_SECONDS
+            )
+        # Query embeddings from concurrent requests share batched API calls;
+        # ingestion already batches and keeps its retries.
+        self.embedding_batcher: Optional[EmbeddingBatcher] = None
+        if EMBEDDING_BATCHING_ENABLED:
+            self.embedding_batcher = EmbeddingBatcher(self.llm, EMBEDDING_MODEL, timeout=EMBEDDING_TIMEOUT_SECONDS)
+        self._index_loaded = False
+        self._indexed_id = 0  # highest knowledge_entries id in the index
+        self._data_version: Optional[int] = None  # storage.data_version() the index last caught up with
+        self._index_lock = threading.Lock()
+        # When set, collected data and analytics events are enqueued and
+        # written in batches by the queue's workers (see attach_job_queue).
+        self.job_queue: Optional[JobQueue] = None
 
     def setup_database(self):
-        self.conn.execute('''
+        with self.storage.transaction() as conn:
+            self._create_schema(conn)
+        self._backfill_content_hashes()
+        self._setup_fts()
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.execute('''
             CREATE TABLE IF NOT EXISTS knowledge_entries (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 category TEXT NOT NULL,
@@ -23,7 +99,7 @@ class KnowledgeBase:
             )
         ''')
 
-        self.conn.execute('''
+        conn.execute('''
             CREATE TABLE IF NOT EXISTS collected_data (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id TEXT NOT NULL,
@@ -34,65 +110,620 @@ class KnowledgeBase:
             )
         ''')
 
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS analytics_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                event TEXT NOT NULL,
+                user_id TEXT,
+                session_id TEXT,
+                agent_id TEXT,
+                data TEXT,
+                created_at REAL NOT NULL
+            )
+        ''')
+
+        self._ensure_column(conn, "knowledge_entries", "content_hash", "TEXT")
+        self._ensure_column(conn, "knowledge_entries", "document_id", "TEXT")
+        self._ensure_column(conn, "knowledge_entries", "chunk_index", "INTEGER")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_knowledge_entries_hash ON knowledge_entries(content_hash, category)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_knowledge_entries_document ON knowledge_entries(document_id)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_knowledge_entries_category ON knowledge_entries(category)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_collected_data_user_agent ON collected_data(user_id, agent_id)"
+        )
+
+    def _setup_fts(self):
+        """Mirror knowledge_entries.content into an FTS5 table kept in sync by triggers"""
+        with self.storage.writer() as conn:
+            self._create_fts(conn)
+
+    def _create_fts(self, conn: sqlite3.Connection):
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'knowledge_fts'"
+        ).fetchone()
+        try:
+            conn.executescript('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS knowledge_fts USING fts5(
+                    content, content='knowledge_entries', content_rowid='id'
+                );
+                CREATE TRIGGER IF NOT EXISTS knowledge_fts_insert AFTER INSERT ON knowledge_entries BEGIN
+                    INSERT INTO knowledge_fts(rowid, content) VALUES (new.id, new.content);
+                END;
+                CREATE TRIGGER IF NOT EXISTS knowledge_fts_delete AFTER DELETE ON knowledge_entries BEGIN
+                    INSERT INTO knowledge_fts(knowledge_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                END;
+                CREATE TRIGGER IF NOT EXISTS knowledge_fts_update AFTER UPDATE OF content ON knowledge_entries BEGIN
+                    INSERT INTO knowledge_fts(knowledge_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                    INSERT INTO knowledge_fts(rowid, content) VALUES (new.id, new.content);
+                END;
+            ''')
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 unavailable, lexical retrieval disabled: {str(e)}")
+            return
+        if not exists:
+            conn.execute("INSERT INTO knowledge_fts(knowledge_fts) VALUES ('rebuild')")
+            conn.commit()
+        self.lexical_enabled = True
+
+    def _ensure_column(self, conn: sqlite3.Connection, table: str, column: str, declaration: str):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+    def _backfill_content_hashes(self, batch_size: int = 1000):
+        while True:
+            with self.storage.transaction() as conn:
+                rows = conn.execute(
+                    "SELECT id, content FROM knowledge_entries WHERE content_hash IS NULL LIMIT ?", (batch_size,)
+                ).fetchall()
+                if not rows:
+                    return
+                conn.executemany(
+                    "UPDATE knowledge_entries SET content_hash = ? WHERE id = ?",
+                    [(content_hash(content), entry_id) for entry_id, content in rows]
+                )
+
     def add_knowledge(self, category: str, content: str, metadata: Optional[Dict] = None) -> int:
         embedding = self._generate_embedding(content)
-        cursor = self.conn.execute(
-            "INSERT INTO knowledge_entries (category, content, embedding, metadata) VALUES (?, ?, ?, ?)",
-            (category, content, json.dumps(embedding), json.dumps(metadata or {}))
-        )
-        self.conn.commit()
+        return self._insert_knowledge(category, content, embedding, metadata)
+
+    async def aadd_knowledge(self, category: str, content: str, metadata: Optional[Dict] = None) -> int:
+        embedding = await self._agenerate_embedding(content)
+        return await asyncio.to_thread(self._insert_knowledge, category, content, embedding, metadata)
+
+    def _insert_knowledge(self, category: str, content: str, embedding: List[float],
+                          metadata: Optional[Dict] = None) -> int:
+        stored = encode_embedding(embedding, EMBEDDING_STORAGE_FORMAT)
+        with self._index_lock:
+            with self.storage.transaction() as conn:
+                cursor = conn.execute(
+                    "INSERT INTO knowledge_entries (category, content, embedding, metadata, content_hash) VALUES (?, ?, ?, ?, ?)",
+                    (category, content, stored, json.dumps(metadata or {}), content_hash(content))
+                )
+            if self._index_loaded:
+                self._index_new_rows()
+        self._notify_change(category)
         return cursor.lastrowid
 
-    def query_knowledge(self, query: str, category: Optional[str] = None) -> List[Dict[str, Any]]:
-        query_embedding = self._generate_embedding(query)
+    def add_knowledge_batch(self,
+                            entries: Iterable[Dict[str, Any]],
+                            chunk_size: int = 256,
+                            progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Ingest {"category", "content", "metadata"} dicts in chunks.
 
-        sql = """
-            SELECT category, content, metadata 
-            FROM knowledge_entries 
-            WHERE category = COALESCE(?, category)
+        Each chunk costs one batched embeddings call and one transaction.
+        Entries whose (category, content) is already stored are skipped.
         """
+        stats = {"received": 0, "inserted": 0, "skipped": 0, "seconds": 0.0, "rate": 0.0}
+        started = time.perf_counter()
+        chunk: List[Dict[str, Any]] = []
 
-        cursor = self.conn.execute(sql, (category,))
-        results = []
+        def flush():
+            stats["inserted"] += self._insert_chunk(chunk)
+            stats["skipped"] = stats["received"] - stats["inserted"]
+            stats["seconds"] = time.perf_counter() - started
+            stats["rate"] = stats["received"] / stats["seconds"] if stats["seconds"] else 0.0
+            chunk.clear()
+            if progress is not None:
+                progress(dict(stats))
+
+        for entry in entries:
+            if not entry.get("category") or not entry.get("content"):
+                raise ValueError(f"Entry {stats['received']} is missing category or content")
+            chunk.append(entry)
+            stats["received"] += 1
+            if len(chunk) >= chunk_size:
+                flush()
+        if chunk:
+            flush()
+        return stats
+
+    def _insert_chunk(self, entries: List[Dict[str, Any]]) -> int:
+        hashes = [content_hash(entry["content"]) for entry in entries]
+        seen = set()
+        with self.storage.reader() as conn:
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                seen.update(conn.execute(
+                    f"SELECT category, content_hash FROM knowledge_entries WHERE content_hash IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall())
+
+        pending = []
+        for entry, digest in zip(entries, hashes):
+            key = (entry["category"], digest)
+            if key not in seen:
+                seen.add(key)
+                pending.append((entry, digest))
+        if not pending:
+            return 0
+
+        embeddings = self._generate_embeddings([entry["content"] for entry, _ in pending])
+        rows = [
+            (
+                entry["category"],
+                entry["content"],
+                encode_embedding(embedding, EMBEDDING_STORAGE_FORMAT),
+                json.dumps(entry.get("metadata") or {}),
+                digest
+            )
+            for (entry, digest), embedding in zip(pending, embeddings)
+        ]
+
+        with self._index_lock:
+            with self.storage.transaction() as conn:
+                conn.executemany(
+                    "INSERT INTO knowledge_entries (category, content, embedding, metadata, content_hash) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+            if self._index_loaded:
+                self._index_new_rows()
+
+        for category in {row[0] for row in rows}:
+            self._notify_change(category)
+        return len(rows)
+
+    def get_document_chunks(self, document_id: str) -> List[Dict[str, Any]]:
+        with self.storage.reader() as conn:
+            rows = conn.execute(
+                "SELECT id, category, chunk_index, content_hash FROM knowledge_entries WHERE document_id = ? ORDER BY chunk_index",
+                (document_id,)
+            ).fetchall()
+        return [
+            {"id": row[0], "category": row[1], "chunk_index": row[2], "content_hash": row[3]}
+            for row in rows
+        ]
+
+    def apply_chunk_changes(self,
+                            inserts: List[Dict[str, Any]],
+                            updates: List[Dict[str, Any]],
+                            deletes: List[int]):
+        """Write one ingestion batch of document chunks in a single transaction.
+
+        inserts carry category/content/embedding/metadata/document_id/
+        chunk_index/content_hash; updates re-number or re-label chunks that
+        kept their content (and so their embedding); deletes are entry ids.
+        """
+        rows = [
+            (
+                chunk["category"],
+                chunk["content"],
+                encode_embedding(chunk["embedding"], EMBEDDING_STORAGE_FORMAT),
+                json.dumps(chunk.get("metadata") or {}),
+                chunk["content_hash"],
+                chunk["document_id"],
+                chunk["chunk_index"]
+            )
+            for chunk in inserts
+        ]
+        changed = {chunk["category"] for chunk in inserts}
+
+        with self._index_lock:
+            with self.storage.transaction() as conn:
+                if deletes:
+                    for start in range(0, len(deletes), 500):
+                        batch = deletes[start:start + 500]
+                        placeholders = ",".join("?" * len(batch))
+                        changed.update(row[0] for row in conn.execute(
+                            f"SELECT DISTINCT category FROM knowledge_entries WHERE id IN ({placeholders})", batch
+                        ))
+                        conn.execute(f"DELETE FROM knowledge_entries WHERE id IN ({placeholders})", batch)
+                if updates:
+                    conn.executemany(
+                        "UPDATE knowledge_entries SET chunk_index = ?, metadata = ? WHERE id = ?",
+                        [(chunk["chunk_index"], json.dumps(chunk.get("metadata") or {}), chunk["id"]) for chunk in updates]
+                    )
+                if rows:
+                    conn.executemany(
+                        "INSERT INTO knowledge_entries (category, content, embedding, metadata, content_hash, document_id, chunk_index) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        rows
+                    )
+
+            if self._index_loaded:
+                self.index.remove(deletes)
+                self._index_new_rows()
+
+        for category in changed:
+            self._notify_change(category)
+
+    def query_knowledge(self,
+                        query: str,
+                        category: Optional[str] = None,
+                        top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        query_embedding = self.embed_query(query)
+        return self.search_knowledge(query_embedding, category, top_k, query_text=query)
+
+    def embed_query(self, query: str) -> Optional[List[float]]:
+        """Embed a query for retrieval; None means "use the lexical path".
 
-        for row in cursor.fetchall():
-            stored_embedding = json.loads(row[2])
-            similarity = self._calculate_similarity(query_embedding, stored_embedding)
+        Returns None in lexical mode, and — when FTS5 is available to fall
+        back on — if the embeddings call fails or exceeds
+        EMBEDDING_TIMEOUT_SECONDS, after which the service is left alone
+        for EMBEDDING_RETRY_AFTER_SECONDS. Without FTS5 there is nothing to
+        fall back on, so the call gets the provider's usual retries instead.
+        """
+        if not self._should_embed():
+            return None
+        try:
+            return self._generate_embedding(query, timeout=self._query_timeout())
+        except Exception as e:
+            return self._embedding_failed(e)
+
+    async def aembed_query(self, query: str) -> Optional[List[float]]:
+        if not self._should_embed():
+            return None
+        try:
+            return await self._agenerate_embedding(query, timeout=self._query_timeout())
+        except Exception as e:
+            return self._embedding_failed(e)
+
+    async def aquery_knowledge(self,
+                               query: str,
+                               category: Optional[str] = None,
+                               top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        query_embedding = await self.aembed_query(query)
+        return await asyncio.to_thread(self.search_knowledge, query_embedding, category, top_k, query)
 
-            if similarity >= VECTOR_SIMILARITY_THRESHOLD:
-                results.append({
-                    "category": row[0],
-                    "content": row[1],
-                    "metadata": json.loads(row[3]),
-                    "relevance": similarity
-                })
+    def search_knowledge(self,
+                         query_embedding: Optional[List[float]],
+                         category: Optional[str] = None,
+                         top_k: Optional[int] = None,
+                         query_text: Optional[str] = None) -> List[Dict[str, Any]]:
+        if query_embedding is None:
+            if not query_text:
+                return []
+            matches = self.lexical_search(query_text, category, top_k or HYBRID_TOP_K)
+        elif self.retrieval_mode == "hybrid" and self.lexical_enabled and query_text:
+            matches = self.hybrid_search(query_embedding, query_text, category, top_k or HYBRID_TOP_K)
+        else:
+            matches = self.vector_search(query_embedding, category, VECTOR_SIMILARITY_THRESHOLD, top_k)
+        return self._fetch_entries(matches)
 
-        return sorted(results, key=lambda x: x["relevance"], reverse=True)
+    def vector_search(self,
+                      query_embedding: List[float],
+                      category: Optional[str] = None,
+                      threshold: float = VECTOR_SIMILARITY_THRESHOLD,
+                      top_k: Optional[int] = None) -> List[tuple]:
+        self._ensure_index()
+        self._refresh_index()
+        engine = self.ann if self.ann is not None else self.index
+        return engine.search(query_embedding, category=category, threshold=threshold, top_k=top_k)
 
-    def save_collected_data(self, user_id: str, field_name: str, value: str, agent_id: str):
-        self.conn.execute(
-            "INSERT INTO collected_data (user_id, field_name, value, agent_id) VALUES (?, ?, ?, ?)",
-            (user_id, field_name, value, agent_id)
+    def lexical_search(self, query: str, category: Optional[str] = None, limit: int = 20) -> List[tuple]:
+        """BM25-ranked (id, score) pairs from the FTS5 mirror; higher scores are better"""
+        match = fts_query(query)
+        if not self.lexical_enabled or not match:
+            return []
+        with self.storage.reader() as conn:
+            return conn.execute(
+                """
+                SELECT knowledge_fts.rowid, -bm25(knowledge_fts)
+                FROM knowledge_fts JOIN knowledge_entries ON knowledge_entries.id = knowledge_fts.rowid
+                WHERE knowledge_fts MATCH ? AND knowledge_entries.category = COALESCE(?, knowledge_entries.category)
+                ORDER BY bm25(knowledge_fts)
+                LIMIT ?
+                """,
+                (match, category, limit)
+            ).fetchall()
+
+    def hybrid_search(self,
+                      query_embedding: List[float],
+                      query_text: str,
+                      category: Optional[str] = None,
+                      top_k: int = HYBRID_TOP_K) -> List[tuple]:
+        vector = self.vector_search(query_embedding, category, HYBRID_MIN_SIMILARITY, HYBRID_CANDIDATES)
+        lexical = self.lexical_search(query_text, category, HYBRID_CANDIDATES)
+        fused = reciprocal_rank_fusion(
+            [[entry_id for entry_id, _ in vector], [entry_id for entry_id, _ in lexical]], k=RRF_K
         )
-        self.conn.commit()
+        return fused[:top_k]
+
+    def _should_embed(self) -> bool:
+        if self.retrieval_mode == "lexical" and self.lexical_enabled:
+            return False
+        return not self.lexical_enabled or time.monotonic() >= self._embedding_retry_at
+
+    def _query_timeout(self) -> Optional[float]:
+        return EMBEDDING_TIMEOUT_SECONDS if self.lexical_enabled else None
+
+    def _embedding_failed(self, error: Exception):
+        if not self.lexical_enabled:
+            raise error
+        logger.warning(f"Embedding unavailable, using lexical retrieval: {str(error)}")
+        self._embedding_retry_at = time.monotonic() + EMBEDDING_RETRY_AFTER_SECONDS
+        return None
+
+    def _fetch_entries(self, matches: List[tuple]) -> List[Dict[str, Any]]:
+        if not matches:
+            return []
+
+        placeholders = ",".join("?" * len(matches))
+        with self.storage.reader() as conn:
+            cursor = conn.execute(
+                f"SELECT id, category, content, metadata FROM knowledge_entries WHERE id IN ({placeholders})",
+                [entry_id for entry_id, _ in matches]
+            )
+            rows = {row[0]: row for row in cursor.fetchall()}
+
+        results = []
+        for entry_id, relevance in matches:
+            row = rows.get(entry_id)
+            if row is None:
+                continue
+            results.append({
+                "id": entry_id,
+                "category": row[1],
+                "content": row[2],
+                "metadata": json.loads(row[3]),
+                "relevance": relevance
+            })
+        return results
+
+    def add_change_listener(self, listener: Callable[[str], None]):
+        """Call listener(category) whenever entries in a category change"""
+        self._change_listeners.append(listener)
+
+    def remove_change_listener(self, listener: Callable[[str], None]):
+        if listener in self._change_listeners:
+            self._change_listeners.remove(listener)
+
+    def _notify_change(self, category: str):
+        self.category_versions[category] = self.category_versions.get(category, 0) + 1
+        for listener in self._change_listeners:
+            listener(category)
+
+    def save_collected_data(self, user_id: str, field_name: str, value: str, agent_id: str,
+                            origin: Optional[Dict[str, Any]] = None):
+        """Store a field value; `origin` ({"session_id", "turn"}) makes a queued write idempotent per turn"""
+        if self.job_queue is not None:
+            key = None
+            if origin is not None:
+                # Per turn, not per value: changing a field back to an earlier value must still be written.
+                key = content_hash(
+                    f"collected\0{user_id}\0{agent_id}\0{field_name}\0{value}\0{origin['session_id']}\0{origin['turn']}"
+                )
+            self.job_queue.enqueue("collected_data", {
+                "user_id": user_id, "field_name": field_name, "value": value, "agent_id": agent_id
+            }, idempotency_key=key)
+            return
+        self.write_collected_data([(user_id, field_name, value, agent_id)])
+
+    def write_collected_data(self, rows: List[tuple]):
+        """Insert (user_id, field_name, value, agent_id) rows in one transaction"""
+        with self.storage.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO collected_data (user_id, field_name, value, agent_id) VALUES (?, ?, ?, ?)",
+                rows
+            )
+
+    def record_event(self, event: str, user_id: Optional[str] = None, session_id: Optional[str] = None,
+                     agent_id: Optional[str] = None, data: Optional[Dict[str, Any]] = None):
+        row = (event, user_id, session_id, agent_id, json.dumps(data or {}), time.time())
+        if self.job_queue is not None:
+            self.job_queue.enqueue("analytics", {"row": row})
+            return
+        self.write_events([row])
+
+    def write_events(self, rows: List[tuple]):
+        with self.storage.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO analytics_events (event, user_id, session_id, agent_id, data, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def attach_job_queue(self, job_queue: JobQueue):
+        """Route collected-data writes and analytics events through `job_queue`"""
+        job_queue.register_handler("collected_data", lambda payloads: self.write_collected_data([
+            (p["user_id"], p["field_name"], p["value"], p["agent_id"]) for p in payloads
+        ]))
+        job_queue.register_handler("analytics", lambda payloads: self.write_events(
+            [tuple(p["row"]) for p in payloads]
+        ))
+        self.job_queue = job_queue
 
     def get_collected_data(self, user_id: str, agent_id: str) -> Dict[str, str]:
-        cursor = self.conn.execute(
-            "SELECT field_name, value FROM collected_data WHERE user_id = ? AND agent_id = ?",
-            (user_id, agent_id)
-        )
-        return {row[0]: row[1] for row in cursor.fetchall()}
+        with self.storage.reader() as conn:
+            cursor = conn.execute(
+                "SELECT field_name, value FROM collected_data WHERE user_id = ? AND agent_id = ? ORDER BY id",
+                (user_id, agent_id)
+            )
+            return {row[0]: row[1] for row in cursor.fetchall()}  # latest value wins
+
+    def _generate_embedding(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        embedding = self._cached_embedding(text)
+        if embedding is None:
+            if self._batches(timeout):
+                embedding = self.embedding_batcher.embed(text, timeout)
+            else:
+                embedding = self.llm.embed([text], EMBEDDING_MODEL, timeout=timeout, retries=self._retries(timeout))[0]
+            self._cache_embedding(text, embedding)
+        return embedding
+
+    def _generate_embeddings(self, texts: List[str], batch_size: int = 512) -> List[List[float]]:
+        """Embed many texts, serving what we can from the cache and batching the rest"""
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        missing = []
+        for position, text in enumerate(texts):
+            cached = self.embedding_cache.get(EMBEDDING_MODEL, text) if self.embedding_cache is not None else None
+            if cached is None:
+                missing.append(position)
+            else:
+                embeddings[position] = cached
+        if self.embedding_cache is not None:
+            CACHE_REQUESTS.inc(len(texts) - len(missing), cache="embedding", result="hit")
+            CACHE_REQUESTS.inc(len(missing), cache="embedding", result="miss")
+
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            vectors = self.llm.embed([texts[position] for position in batch], EMBEDDING_MODEL)
+            for position, vector in zip(batch, vectors):
+                embeddings[position] = vector
+            if self.embedding_cache is not None:
+                self.embedding_cache.put_many(
+                    EMBEDDING_MODEL, [(texts[position], embeddings[position]) for position in batch]
+                )
+        return embeddings
+
+    async def _agenerate_embedding(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        embedding = await asyncio.to_thread(self._cached_embedding, text)
+        if embedding is None:
+            if self._batches(timeout):
+                embedding = await self.embedding_batcher.aembed(text, timeout)
+            else:
+                embedding = (await self.llm.aembed([text], EMBEDDING_MODEL, timeout=timeout,
+                                                   retries=self._retries(timeout)))[0]
+            await asyncio.to_thread(self._cache_embedding, text, embedding)
+        return embedding
+
+    def _cached_embedding(self, text: str) -> Optional[List[float]]:
+        if self.embedding_cache is None:
+            return None
+        cached = self.embedding_cache.get(EMBEDDING_MODEL, text)
+        CACHE_REQUESTS.inc(cache="embedding", result="miss" if cached is None else "hit")
+        return cached
+
+    def _cache_embedding(self, text: str, embedding: List[float]):
+        if self.embedding_cache is not None:
+            self.embedding_cache.put(EMBEDDING_MODEL, text, embedding)
+
+    def _batches(self, timeout: Optional[float]) -> bool:
+        """A query with a deadline falls back to lexical search rather than retrying"""
+        return timeout is not None and self.embedding_batcher is not None
+
+    @staticmethod
+    def _retries(timeout: Optional[float]) -> Optional[int]:
+        return 0 if timeout else None
+
+    def _ensure_index(self):
+        """Load every stored embedding into the in-memory index once"""
+        if self._index_loaded:
+            return
+        with self._index_lock:
+            if self._index_loaded:
+                return
+            # Read first: anything committed while loading shows up as a newer version.
+            self._data_version = self.storage.data_version()
+            self._index_new_rows(sync_ann=False)
+            if self.retrieval_engine == "ivf":
+                self.ann = IVFIndex(
+                    self.index,
+                    path=f"{self.db_path}.ivf.npz",
+                    nlist=self.ivf_nlist,
+                    nprobe=IVF_NPROBE,
+                    min_train_size=IVF_MIN_TRAIN_SIZE
+                )
+                self.ann.sync()
+            self._index_loaded = True
+
+    def _index_new_rows(self, sync_ann: bool = True):
+        """Add rows with ids past the index's high-water mark (caller holds _index_lock).
+
+        Stored (possibly quantized) vectors are indexed, so results don't
+        depend on whether a row was written here or loaded.
+        """
+        rows = self._fetch_embeddings_after(self._indexed_id)
+        if rows:
+            self.index.add(
+                [row[0] for row in rows],
+                [row[1] for row in rows],
+                [decode_embedding(row[2]) for row in rows]
+            )
+            self._indexed_id = rows[-1][0]
+        if sync_ann and self.ann is not None:
+            self.ann.sync()
+
+    def _refresh_index(self):
+        """Catch the index up with commits from other connections and processes.
+
+        Costs one PRAGMA when nothing changed. Otherwise new rows are
+        loaded incrementally, and rows deleted elsewhere are found by
+        comparing counts and dropped from the index.
+        """
+        version = self.storage.data_version()
+        if version == self._data_version:
+            return
+        with self._index_lock:
+            version = self.storage.data_version()
+            if version == self._data_version:
+                return
+            self._index_new_rows()
+            live = self.index.live_ids()
+            with self.storage.reader() as conn:
+                count = conn.execute(
+                    "SELECT COUNT(*) FROM knowledge_entries WHERE embedding IS NOT NULL"
+                ).fetchone()[0]
+                if count != len(live):
+                    stored = {row[0] for row in conn.execute(
+                        "SELECT id FROM knowledge_entries WHERE embedding IS NOT NULL"
+                    )}
+                    self.index.remove([entry_id for entry_id in live if entry_id not in stored])
+            self._data_version = version
 
-    def _generate_embedding(self, text: str) -> List[float]:
-        response = client.embeddings.create(input=text,
-        model=EMBEDDING_MODEL)
-        return response.data[0].embedding
+    def _fetch_embeddings_after(self, last_id: int) -> List[tuple]:
+        with self.storage.reader() as conn:
+            return conn.execute(
+                "SELECT id, category, embedding FROM knowledge_entries WHERE id > ? AND embedding IS NOT NULL ORDER BY id",
+                (last_id,)
+            ).fetchall()
 
-    def _calculate_similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
-        dot_product = sum(a * b for a, b in zip(embedding1, embedding2))
-        magnitude1 = sum(a * a for a in embedding1) ** 0.5
-        magnitude2 = sum(b * b for b in embedding2) ** 0.5
-        return dot_product / (magnitude1 * magnitude2)
+    def migrate_embeddings(self, storage_format: str = EMBEDDING_STORAGE_FORMAT, batch_size: int = 500) -> int:
+        """Rewrite stored embeddings into storage_format, returning the number of rows changed"""
+        migrated = 0
+        last_id = 0
+        while True:
+            with self.storage.reader() as conn:
+                rows = conn.execute(
+                    "SELECT id, embedding FROM knowledge_entries WHERE id > ? AND embedding IS NOT NULL ORDER BY id LIMIT ?",
+                    (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            updates = [
+                (encode_embedding(decode_embedding(embedding), storage_format), entry_id)
+                for entry_id, embedding in rows
+                if storage_format_of(embedding) != storage_format
+            ]
+            if updates:
+                with self._index_lock, self.storage.transaction() as conn:
+                    conn.executemany("UPDATE knowledge_entries SET embedding = ? WHERE id = ?", updates)
+                migrated += len(updates)
+                logger.info(f"Migrated {migrated} embeddings to {storage_format}")
+        return migrated
 
     def close(self):
-        self.conn.close()
\ No newline at end of file
+        if self.embedding_batcher is not None:
+            self.embedding_batcher.close()
+        if self.ann is not None:
+            self.ann.save()
+        if self.embedding_cache is not None:
+            self.embedding_cache.close()
+        self.storage.close()
\ No newline at end of file
@@ -0,0 +1,459 @@
+"""Provider layer for chat completions and embeddings.
+
+Agent and KnowledgeBase talk to an LLMProvider instead of constructing
+OpenAI clients at import time. The base class owns the call policy
+(retries with jittered exponential backoff and optional hedging); each
+provider only implements the transport:
+
+- OpenAIProvider: the OpenAI SDK over one shared, pooled HTTP client per
+  process, created on first use.
+- FakeProvider: deterministic local output with configurable latency, so
+  the whole pipeline runs offline in tests and benchmarks.
+
+LLM_PROVIDER selects which one get_provider() returns.
+"""
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+import logging
+from core.metrics import LLM_REQUEST_SECONDS, LLM_RETRIES, LLM_HEDGES, timed, record_tokens
+from config.settings import (
+    MODEL_NAME, MAX_TOKENS, TEMPERATURE, EMBEDDING_MODEL, LLM_PROVIDER, LLM_TIMEOUT_SECONDS,
+    LLM_CONNECT_TIMEOUT_SECONDS, LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE_CONNECTIONS, LLM_MAX_RETRIES,
+    LLM_BACKOFF_SECONDS, LLM_BACKOFF_MAX_SECONDS, LLM_HEDGE_AFTER_SECONDS, FAKE_LLM_LATENCY_SECONDS,
+    FAKE_LLM_TOKEN_DELAY_SECONDS, FAKE_EMBEDDING_LATENCY_SECONDS, FAKE_EMBEDDING_DIMENSIONS
+)
+
+logger = logging.getLogger(__name__)
+
+Messages = List[Dict[str, str]]
+
+class LLMProvider(ABC):
+    """Chat and embedding calls with retries and optional hedging.
+
+    A call that fails with one of `retryable` is retried up to
+    `max_retries` times, sleeping backoff * 2**attempt scaled by a random
+    factor in [0.5, 1) so that clients don't retry in lockstep. With
+    `hedge_after` > 0, a non-streaming call still running after that many
+    seconds gets an identical second request and the first answer wins,
+    which trims tail latency for the price of some duplicate requests.
+    """
+
+    retryable: tuple = (TimeoutError, ConnectionError)
+
+    def __init__(self,
+                 max_retries: int = LLM_MAX_RETRIES,
+                 backoff: float = LLM_BACKOFF_SECONDS,
+                 backoff_max: float = LLM_BACKOFF_MAX_SECONDS,
+                 hedge_after: float = LLM_HEDGE_AFTER_SECONDS):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.stats: Dict[str, int] = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0}
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def chat(self, messages: Messages, model: str = MODEL_NAME, max_tokens: int = MAX_TOKENS,
+             temperature: float = TEMPERATURE, timeout: Optional[float] = None) -> str:
+        with timed(LLM_REQUEST_SECONDS, "llm_chat", operation="chat"):
+            return self._call(lambda: self._chat(messages, model, max_tokens, temperature, timeout))
+
+    async def achat(self, messages: Messages, model: str = MODEL_NAME, max_tokens: int = MAX_TOKENS,
+                    temperature: float = TEMPERATURE, timeout: Optional[float] = None) -> str:
+        with timed(LLM_REQUEST_SECONDS, "llm_chat", operation="chat"):
+            return await self._acall(lambda: self._achat(messages, model, max_tokens, temperature, timeout))
+
+    def stream_chat(self, messages: Messages, model: str = MODEL_NAME, max_tokens: int = MAX_TOKENS,
+                    temperature: float = TEMPERATURE, timeout: Optional[float] = None) -> Iterator[str]:
+        """Yield content deltas; only opening the stream is retried, and it is never hedged"""
+        self.stats["calls"] += 1
+        with timed(LLM_REQUEST_SECONDS, "llm_stream_open", operation="stream_open"):
+            return self._retry(lambda: self._stream_chat(messages, model, max_tokens, temperature, timeout),
+                               self.max_retries)
+
+    def embed(self, texts: List[str], model: str = EMBEDDING_MODEL, timeout: Optional[float] = None,
+              retries: Optional[int] = None) -> List[List[float]]:
+        with timed(LLM_REQUEST_SECONDS, "llm_embed", operation="embed"):
+            return self._call(lambda: self._embed(texts, model, timeout), retries)
+
+    async def aembed(self, texts: List[str], model: str = EMBEDDING_MODEL, timeout: Optional[float] = None,
+                     retries: Optional[int] = None) -> List[List[float]]:
+        with timed(LLM_REQUEST_SECONDS, "llm_embed", operation="embed"):
+            return await self._acall(lambda: self._aembed(texts, model, timeout), retries)
+
+    def close(self):
+        with self._pool_lock:
+            if self._hedge_pool is not None:
+                self._hedge_pool.shutdown(wait=False)
+                self._hedge_pool = None
+
+    @abstractmethod
+    def _chat(self, messages: Messages, model: str, max_tokens: int, temperature: float,
+              timeout: Optional[float]) -> str:
+        pass
+
+    @abstractmethod
+    async def _achat(self, messages: Messages, model: str, max_tokens: int, temperature: float,
+                     timeout: Optional[float]) -> str:
+        pass
+
+    @abstractmethod
+    def _stream_chat(self, messages: Messages, model: str, max_tokens: int, temperature: float,
+                     timeout: Optional[float]) -> Iterator[str]:
+        pass
+
+    @abstractmethod
+    def _embed(self, texts: List[str], model: str, timeout: Optional[float]) -> List[List[float]]:
+        pass
+
+    @abstractmethod
+    async def _aembed(self, texts: List[str], model: str, timeout: Optional[float]) -> List[List[float]]:
+        pass
+
+    def _call(self, request: Callable[[], Any], retries: Optional[int] = None) -> Any:
+        self.stats["calls"] += 1
+        hedged = (lambda: self._hedged(request)) if self.hedge_after > 0 else request
+        return self._retry(hedged, self.max_retries if retries is None else retries)
+
+    def _retry(self, request: Callable[[], Any], retries: int) -> Any:
+        attempt = 0
+        while True:
+            try:
+                return request()
+            except self.retryable as e:
+                if attempt >= retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"LLM call failed ({type(e).__name__}), retrying in {delay:.2f}s")
+                self.stats["retries"] += 1
+                LLM_RETRIES.inc()
+                time.sleep(delay)
+                attempt += 1
+
+    def _hedged(self, request: Callable[[], Any]) -> Any:
+        pool = self._get_hedge_pool()
+        first = pool.submit(request)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        self.stats["hedges"] += 1
+        LLM_HEDGES.inc()
+        second = pool.submit(request)
+        done, pending = wait([first, second], return_when=FIRST_COMPLETED)
+        winner = done.pop()
+        if winner.exception() is not None and pending:
+            winner = pending.pop()  # one failure is not final while the other is in flight
+        if winner is second:
+            self.stats["hedge_wins"] += 1
+        return winner.result()
+
+    async def _acall(self, request: Callable[[], Any], retries: Optional[int] = None) -> Any:
+        self.stats["calls"] += 1
+        retries = self.max_retries if retries is None else retries
+        attempt = 0
+        while True:
+            try:
+                if self.hedge_after > 0:
+                    return await self._ahedged(request)
+                return await request()
+            except self.retryable as e:
+                if attempt >= retries:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"LLM call failed ({type(e).__name__}), retrying in {delay:.2f}s")
+                self.stats["retries"] += 1
+                LLM_RETRIES.inc()
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _ahedged(self, request: Callable[[], Any]) -> Any:
+        first = asyncio.ensure_future(request())
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        self.stats["hedges"] += 1
+        LLM_HEDGES.inc()
+        second = asyncio.ensure_future(request())
+        done, pending = await asyncio.wait({first, second}, return_when=asyncio.FIRST_COMPLETED)
+        winner = done.pop()
+        if winner.exception() is not None and pending:
+            winner = pending.pop()
+            await asyncio.wait({winner})
+        for task in pending:
+            if task is not winner:
+                task.cancel()
+        if winner is second:
+            self.stats["hedge_wins"] += 1
+        return winner.result()
+
+    def _backoff_delay(self, attempt: int) -> float:
+        return min(self.backoff_max, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def _get_hedge_pool(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-hedge")
+            return self._hedge_pool
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI SDK transport over one pooled HTTP client per process.
+
+    Clients are built on first use, so importing the app needs no API
+    key. The SDK's own retries are disabled in favour of the policy above.
+    """
+
+    def __init__(self,
+                 api_key: Optional[str] = None,
+                 base_url: Optional[str] = None,
+                 timeout: float = LLM_TIMEOUT_SECONDS,
+                 connect_timeout: float = LLM_CONNECT_TIMEOUT_SECONDS,
+                 max_connections: int = LLM_MAX_CONNECTIONS,
+                 max_keepalive_connections: int = LLM_MAX_KEEPALIVE_CONNECTIONS,
+                 **policy):
+        super().__init__(**policy)
+        import openai
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.retryable = (
+            openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError
+        )
+        self._client = None
+        self._async_client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import openai
+                    self._client = openai.OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        max_retries=0,
+                        http_client=openai.DefaultHttpxClient(**self._http_options())
+                    )
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            with self._client_lock:
+                if self._async_client is None:
+                    import openai
+                    self._async_client = openai.AsyncOpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        max_retries=0,
+                        http_client=openai.DefaultAsyncHttpxClient(**self._http_options())
+                    )
+        return self._async_client
+
+    def close(self):
+        super().close()
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def _http_options(self) -> Dict[str, Any]:
+        import openai
+        # Build these from the SDK's own HTTP library, whichever it ships with.
+        Limits = type(openai.DEFAULT_CONNECTION_LIMITS)
+        return {
+            "timeout": openai.Timeout(self.timeout, connect=self.connect_timeout),
+            "limits": Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections
+            )
+        }
+
+    @staticmethod
+    def _options(timeout: Optional[float]) -> Dict[str, Any]:
+        return {"timeout": timeout} if timeout is not None else {}
+
+    @staticmethod
+    def _record_usage(model: str, usage):
+        if usage is not None:
+            record_tokens(model, usage.prompt_tokens or 0, getattr(usage, "completion_tokens", 0) or 0)
+
+    def _chat(self, messages, model, max_tokens, temperature, timeout):
+        response = self.client.chat.completions.create(
+            model=model, messages=messages, max_tokens=max_tokens, temperature=temperature,
+            **self._options(timeout)
+        )
+        self._record_usage(model, response.usage)
+        return response.choices[0].message.content
+
+    async def _achat(self, messages, model, max_tokens, temperature, timeout):
+        response = await self.async_client.chat.completions.create(
+            model=model, messages=messages, max_tokens=max_tokens, temperature=temperature,
+            **self._options(timeout)
+        )
+        self._record_usage(model, response.usage)
+        return response.choices[0].message.content
+
+    def _stream_chat(self, messages, model, max_tokens, temperature, timeout):
+        stream = self.client.chat.completions.create(
+            model=model, messages=messages, max_tokens=max_tokens, temperature=temperature,
+            stream=True, stream_options={"include_usage": True}, **self._options(timeout)
+        )
+
+        def deltas():
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if getattr(chunk, "usage", None) is not None:  # final chunk, no choices
+                    self._record_usage(model, chunk.usage)
+        return deltas()
+
+    def _embed(self, texts, model, timeout):
+        response = self.client.embeddings.create(input=texts, model=model, **self._options(timeout))
+        self._record_usage(model, response.usage)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    async def _aembed(self, texts, model, timeout):
+        response = await self.async_client.embeddings.create(input=texts, model=model, **self._options(timeout))
+        self._record_usage(model, response.usage)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+def fake_embedding(text: str, dimensions: int) -> List[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    rng = random.Random(seed)
+    return [rng.gauss(0.0, 1.0) for _ in range(dimensions)]
+
+def fake_completion(prompt: str) -> str:
+    try:
+        data = json.loads(prompt)
+        user_message = data.get("user_message", prompt)
+        state = data.get("context", {}).get("current_state", "initial")
+    except (ValueError, AttributeError):
+        user_message, state = prompt, "initial"
+    return json.dumps({
+        "response": f"Thanks for your message: {user_message}",
+        "actions": [],
+        "required_information": [],
+        "next_state": state,
+        "confidence": 0.9
+    })
+
+class FakeProvider(LLMProvider):
+    """Deterministic offline backend: same input, same output, no network.
+
+    `latency` and `embedding_latency` are per-call delays, `token_delay`
+    paces streamed chunks, and `jitter` adds an exponentially distributed
+    extra delay with that mean (from a seeded generator) to give the
+    latency distribution a tail, e.g. to exercise hedging. A call that
+    would outlast its timeout raises TimeoutError when the timeout expires.
+    """
+
+    def __init__(self,
+                 latency: float = FAKE_LLM_LATENCY_SECONDS,
+                 token_delay: float = FAKE_LLM_TOKEN_DELAY_SECONDS,
+                 embedding_latency: float = FAKE_EMBEDDING_LATENCY_SECONDS,
+                 dimensions: int = FAKE_EMBEDDING_DIMENSIONS,
+                 jitter: float = 0.0,
+                 seed: int = 0,
+                 **policy):
+        super().__init__(**policy)
+        self.latency = latency
+        self.token_delay = token_delay
+        self.embedding_latency = embedding_latency
+        self.dimensions = dimensions
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def _delay(self, base: float, timeout: Optional[float]) -> Tuple[float, bool]:
+        """How long this call takes, and whether it overruns the caller's timeout"""
+        delay = base
+        if self.jitter > 0:
+            with self._rng_lock:
+                delay += self._rng.expovariate(1.0 / self.jitter)
+        if timeout is not None and delay > timeout:
+            return timeout, True
+        return delay, False
+
+    def _sleep(self, base: float, timeout: Optional[float]):
+        delay, timed_out = self._delay(base, timeout)
+        time.sleep(delay)
+        if timed_out:
+            raise TimeoutError(f"Fake provider call exceeded {timeout}s")
+
+    async def _asleep(self, base: float, timeout: Optional[float]):
+        delay, timed_out = self._delay(base, timeout)
+        await asyncio.sleep(delay)
+        if timed_out:
+            raise TimeoutError(f"Fake provider call exceeded {timeout}s")
+
+    @staticmethod
+    def _complete(messages: Messages, model: str) -> str:
+        # Same rough 4-characters-per-token estimate as the fake HTTP server.
+        content = fake_completion(messages[-1]["content"])
+        record_tokens(model, sum(len(message["content"]) for message in messages) // 4, len(content) // 4)
+        return content
+
+    def _chat(self, messages, model, max_tokens, temperature, timeout):
+        self._sleep(self.latency, timeout)
+        return self._complete(messages, model)
+
+    async def _achat(self, messages, model, max_tokens, temperature, timeout):
+        await self._asleep(self.latency, timeout)
+        return self._complete(messages, model)
+
+    def _stream_chat(self, messages, model, max_tokens, temperature, timeout):
+        content = self._complete(messages, model)
+        self._sleep(self.latency, timeout)
+
+        def chunks():
+            for start in range(0, len(content), 4):
+                yield content[start:start + 4]
+                if self.token_delay:
+                    time.sleep(self.token_delay)
+        return chunks()
+
+    def _embed(self, texts, model, timeout):
+        self._sleep(self.embedding_latency, timeout)
+        record_tokens(model, sum(len(text) for text in texts) // 4, 0)
+        return [fake_embedding(text, self.dimensions) for text in texts]
+
+    async def _aembed(self, texts, model, timeout):
+        await self._asleep(self.embedding_latency, timeout)
+        record_tokens(model, sum(len(text) for text in texts) // 4, 0)
+        return [fake_embedding(text, self.dimensions) for text in texts]
+
+_provider: Optional[LLMProvider] = None
+_provider_lock = threading.Lock()
+
+def create_provider(kind: str = LLM_PROVIDER, **options) -> LLMProvider:
+    if kind == "openai":
+        return OpenAIProvider(**options)
+    if kind == "fake":
+        return FakeProvider(**options)
+    raise ValueError(f"Unknown LLM provider: {kind}")
+
+def get_provider() -> LLMProvider:
+    """The process-wide provider, shared so that its connection pool is too"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = create_provider()
+    return _provider
+
+def set_provider(provider: LLMProvider):
+    global _provider
+    with _provider_lock:
+        _provider = provider
@@ -0,0 +1,249 @@
+"""In-process metrics and per-request traces, exposed in Prometheus text format.
+
+Counters and histograms are process-wide and cheap to update from hot
+paths: one lock and a dict update per observation. The API serves them
+as text on GET /metrics. A trace collects the stage timings and token
+usage of a single request and ends up in the response's X-Trace-Id and
+Server-Timing headers, so one slow request can be explained without a
+profiler.
+"""
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+import bisect
+import logging
+import re
+import threading
+import time
+import uuid
+from config.settings import METRICS_ENABLED, SLOW_REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+_INF = 'le="+Inf"'
+_TRACE_ID = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), enabled: bool = True):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, list] = {}  # key -> [per-bucket counts, sum, count]
+
+    def observe(self, value: float, **labels):
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if position < len(self.buckets):
+                entry[0][position] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return entry[2] if entry else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(entry[0]), entry[1], entry[2])) for key, entry in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, _INF)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames, enabled=self.enabled))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, enabled=self.enabled, buckets=buckets))
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry(METRICS_ENABLED)
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_seconds", "Time to handle an API request", ["endpoint", "status"]
+)
+MESSAGE_SECONDS = REGISTRY.histogram(
+    "agent_message_seconds", "Time to process one conversation message end to end", ["agent_type"]
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "agent_stage_seconds", "Time spent in each step of the message pipeline", ["agent_type", "stage"]
+)
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "llm_request_seconds", "Latency of chat and embedding calls, retries included", ["operation"]
+)
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "Tokens reported by the model provider", ["model", "kind"])
+LLM_RETRIES = REGISTRY.counter("llm_retries_total", "LLM calls retried after a transient error")
+LLM_HEDGES = REGISTRY.counter("llm_hedged_requests_total", "Duplicate LLM requests sent to cut tail latency")
+CACHE_REQUESTS = REGISTRY.counter("cache_requests_total", "Cache lookups by cache and result", ["cache", "result"])
+EMBEDDING_BATCH_SIZE = REGISTRY.histogram(
+    "embedding_batch_size", "Texts per batched query-embedding call", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+EMBEDDING_COALESCED = REGISTRY.counter(
+    "embedding_coalesced_total", "Query embeddings served by an identical request already in flight"
+)
+PARSE_RESULTS = REGISTRY.counter(
+    "response_parse_total", "Model outputs by parse result (parsed, repaired, failed)", ["result"]
+)
+
+@dataclass
+class Trace:
+    trace_id: str
+    started: float = field(default_factory=time.perf_counter)
+    stages: List[Tuple[str, float]] = field(default_factory=list)
+    tokens: int = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def totals(self) -> Dict[str, float]:
+        """Seconds per stage name, summed over repeats"""
+        totals: Dict[str, float] = {}
+        for name, seconds in self.stages:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.totals().items())
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+def start_trace(trace_id: Optional[str] = None) -> Token:
+    """Begin a trace, keeping a caller-supplied id only if it is a plain token"""
+    if not trace_id or not _TRACE_ID.match(trace_id):
+        trace_id = uuid.uuid4().hex
+    return _current_trace.set(Trace(trace_id))
+
+def end_trace(token: Token):
+    _current_trace.reset(token)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+@contextmanager
+def timed(histogram: Histogram, trace_name: Optional[str] = None, **labels) -> Iterator[None]:
+    """Observe the block's duration, and add it to the current trace as `trace_name`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed, **labels)
+        trace = _current_trace.get()
+        if trace is not None and trace_name:
+            trace.stages.append((trace_name, elapsed))
+
+def stage(agent_type: str, name: str):
+    return timed(STAGE_SECONDS, name, agent_type=agent_type, stage=name)
+
+def record_tokens(model: str, prompt_tokens: int, completion_tokens: int):
+    LLM_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, model=model, kind="completion")
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.tokens += prompt_tokens + completion_tokens
+
+def observe_request(trace: Trace, endpoint: str, status: int):
+    elapsed = trace.elapsed
+    HTTP_REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, status=status)
+    if SLOW_REQUEST_SECONDS and elapsed >= SLOW_REQUEST_SECONDS:
+        logger.info(f"Slow request {endpoint} [trace {trace.trace_id}] {elapsed * 1000:.0f}ms, "
+                    f"{trace.tokens} tokens: {trace.server_timing()}")
@@ -1,69 +1,216 @@
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
 import json
-from dataclasses import dataclass
+import string
+from dataclasses import dataclass, field
 from core.context import ConversationContext
+from core.tokens import get_token_counter
+from config.settings import PROMPT_TOKEN_BUDGET
 
 @dataclass
 class PromptTemplate:
+    """A str.format template, parsed once.
+
+    render() skips validation and, for plain {name} fields, formatting:
+    it only joins the pre-split literal text with the values.
+    """
     template: str
-    required_variables: List[str]
-    
+    required_variables: List[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        self._parts: Optional[List[Tuple[str, Optional[str]]]] = []
+        self.fields = set()
+        for literal, name, spec, conversion in string.Formatter().parse(self.template):
+            if name is not None:
+                self.fields.add(name)
+                if spec or conversion or not name.isidentifier():
+                    self._parts = None  # needs the full formatter
+            if self._parts is not None:
+                self._parts.append((literal, name))
+
     def format(self, **kwargs) -> str:
         missing = [var for var in self.required_variables if var not in kwargs]
         if missing:
             raise ValueError(f"Missing required variables: {missing}")
-        return self.template.format(**kwargs)
+        return self.render(kwargs)
+
+    def render(self, values: Dict[str, Any]) -> str:
+        if self._parts is None:
+            return self.template.format(**values)
+        return "".join(literal if name is None else literal + str(values[name]) for literal, name in self._parts)
+
+# Values available to state prompts
+STATE_VARIABLES = frozenset({"collected_info", "missing_info", "current_state"})
+
+def _compact(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+RESPONSE_FORMAT = {
+    "response": "string - your response to the user",
+    "actions": "array of action objects with name and parameters",
+    "required_information": "array of required information fields",
+    "next_state": "string - the next conversation state",
+    "confidence": "float - confidence score for the response"
+}
+
+# For agents that declare their states, next_state must be one the context lists
+STATE_MACHINE_RESPONSE_FORMAT = dict(
+    RESPONSE_FORMAT, next_state="string - one of context.allowed_next_states"
+)
 
 class PromptEngine:
-    def __init__(self):
+    """Assembles the JSON prompt for each turn within a per-agent token budget.
+
+    The system prompt and response_format block are rendered once per
+    agent_type. Per turn, whatever budget the fixed parts leave over is
+    spent on knowledge (best relevance first, up to `knowledge_share` of
+    it), then on the most recent history turns, then on any remaining
+    knowledge. When the context carries a running summary, it is sent
+    along with every message it does not cover yet, newest first within
+    the budget.
+    """
+
+    def __init__(self, token_budget: int = PROMPT_TOKEN_BUDGET, knowledge_share: float = 0.6,
+                 history_turns: int = 5):
         self.system_prompts = {}
-        self.state_prompts = {}
+        self.state_prompts: Dict[Tuple[str, str], PromptTemplate] = {}  # (agent_type, state) -> template
+        self.state_transitions: Dict[Tuple[str, str], str] = {}  # (agent_type, state) -> rendered part
+        self.token_budgets: Dict[str, int] = {}
+        self.default_token_budget = token_budget
+        self.knowledge_share = knowledge_share
+        self.history_turns = history_turns
+        self.count_tokens = get_token_counter()
+        self._static_parts: Dict[str, Tuple[str, str, int]] = {}
 
     def register_system_prompt(self, agent_type: str, prompt: str):
         self.system_prompts[agent_type] = prompt
+        self._static_parts.pop(agent_type, None)
 
     def register_state_prompt(self, agent_type: str, state: str, prompt: PromptTemplate):
-        if agent_type not in self.state_prompts:
-            self.state_prompts[agent_type] = {}
-        self.state_prompts[agent_type][state] = prompt
+        # Checked here once, so that rendering each turn needs no validation.
+        unknown = (prompt.fields | set(prompt.required_variables)) - STATE_VARIABLES
+        if unknown:
+            raise ValueError(f"State prompt '{state}' uses unknown variables: {sorted(unknown)}")
+        self.state_prompts[(agent_type, state)] = prompt
+
+    def register_state_transitions(self, agent_type: str, state: str, next_states: List[str]):
+        """States the model may name as next_state while in `state`"""
+        self.state_transitions[(agent_type, state)] = ',"allowed_next_states":' + _compact(list(next_states))
+        self._static_parts.pop(agent_type, None)
+
+    def register_token_budget(self, agent_type: str, budget: int):
+        self.token_budgets[agent_type] = budget
 
     def build_prompt(self, 
                     agent_type: str, 
                     message: str, 
                     context: ConversationContext, 
                     relevant_knowledge: List[Dict[str, Any]]) -> str:
-        system_prompt = self.system_prompts.get(agent_type, "")
-        state_prompt = self.state_prompts.get(agent_type, {}).get(context.current_state)
-
-        # Build the dynamic prompt structure
-        prompt_structure = {
-            "system": system_prompt,
-            "context": {
-                "current_state": context.current_state,
-                "collected_information": context.collected_info,
-                "missing_information": context.get_missing_info(),
-                "conversation_history": context.conversation_history[-5:]  
-            },
-            "knowledge": relevant_knowledge,
-            "user_message": message,
-            "response_format": {
-                "response": "string - your response to the user",
-                "actions": "array of action objects with name and parameters",
-                "required_information": "array of required information fields",
-                "next_state": "string - the next conversation state",
-                "confidence": "float - confidence score for the response"
-            }
-        }
+        head, tail, static_tokens = self._get_static_parts(agent_type)
+        state_prompt = self.state_prompts.get((agent_type, context.current_state))
+        missing_info = context.get_missing_info()
 
+        state_part = ""
         if state_prompt:
-            try:
-                state_specific_content = state_prompt.format(
-                    collected_info=json.dumps(context.collected_info),
-                    missing_info=json.dumps(context.get_missing_info()),
-                    current_state=context.current_state
-                )
-                prompt_structure["state_specific"] = state_specific_content
-            except ValueError as e:
-                prompt_structure["state_specific"] = str(e)
-
-        return json.dumps(prompt_structure, indent=2)
\ No newline at end of file
+            values = {}
+            if "collected_info" in state_prompt.fields:
+                values["collected_info"] = json.dumps(context.collected_info)
+            if "missing_info" in state_prompt.fields:
+                values["missing_info"] = json.dumps(missing_info)
+            if "current_state" in state_prompt.fields:
+                values["current_state"] = context.current_state
+            state_part = ',"state_specific":' + _compact(state_prompt.render(values))
+
+        summary_part = ',"conversation_summary":' + _compact(context.summary) if context.summary else ""
+        context_head = (
+            ',"context":{"current_state":' + _compact(context.current_state)
+            + self.state_transitions.get((agent_type, context.current_state), "")
+            + ',"collected_information":' + _compact(context.collected_info)
+            + ',"missing_information":' + _compact(missing_info)
+            + summary_part
+            + ',"conversation_history":['
+        )
+        message_part = '],"user_message":' + _compact(message)  # closes the knowledge list
+
+        budget = self.token_budgets.get(agent_type, self.default_token_budget)
+        remaining = budget - static_tokens - sum(
+            self.count_tokens(part) for part in (context_head, message_part, state_part)
+        )
+
+        history_turns = self.history_turns
+        if context.summary:
+            # Nothing may fall between the summary and the verbatim history.
+            history_turns = max(history_turns, context.message_count - context.summarized_count)
+
+        knowledge = [self._render_knowledge(item) for item in relevant_knowledge]
+        history = [
+            _compact({"role": turn["role"], "content": turn["content"]})
+            for turn in reversed(context.conversation_history.recent(history_turns))
+        ]
+
+        kept_knowledge, used = self._pack(knowledge, int(remaining * self.knowledge_share))
+        remaining -= used
+        kept_history, used = self._pack(history, remaining)
+        remaining -= used
+        extra_knowledge, _ = self._pack(knowledge[len(kept_knowledge):], remaining)
+        kept_knowledge += extra_knowledge
+        if not kept_knowledge and relevant_knowledge:
+            # Even the best match is too long: keep a truncated slice of it.
+            truncated = self._render_knowledge(relevant_knowledge[0], max_tokens=remaining)
+            if truncated:
+                kept_knowledge = [truncated]
+
+        return (
+            head
+            + context_head + ",".join(reversed(kept_history))
+            + ']},"knowledge":[' + ",".join(kept_knowledge)
+            + message_part
+            + state_part
+            + tail
+        )
+
+    def _get_static_parts(self, agent_type: str) -> Tuple[str, str, int]:
+        """Pre-rendered prompt prefix/suffix and their token count, cached per agent_type"""
+        parts = self._static_parts.get(agent_type)
+        if parts is None:
+            head = '{"system":' + _compact(self.system_prompts.get(agent_type, ""))
+            response_format = RESPONSE_FORMAT
+            if any(key[0] == agent_type for key in self.state_transitions):
+                response_format = STATE_MACHINE_RESPONSE_FORMAT
+            tail = ',"response_format":' + _compact(response_format) + '}'
+            parts = (head, tail, self.count_tokens(head) + self.count_tokens(tail))
+            self._static_parts[agent_type] = parts
+        return parts
+
+    def _render_knowledge(self, item: Dict[str, Any], max_tokens: Optional[int] = None) -> str:
+        entry = {
+            "category": item.get("category"),
+            "content": item.get("content", ""),
+            "metadata": item.get("metadata"),
+            "relevance": round(item.get("relevance", 0.0), 3)
+        }
+        if max_tokens is None:
+            return _compact(entry)
+
+        overhead = self.count_tokens(_compact(dict(entry, content="")))
+        if max_tokens - overhead < 32:
+            return ""
+        # Character cut from the token estimate, then trim until it really fits.
+        limit = (max_tokens - overhead) * 4
+        while limit > 0:
+            entry["content"] = entry["content"][:limit]
+            rendered = _compact(entry)
+            if self.count_tokens(rendered) <= max_tokens:
+                return rendered
+            limit = int(limit * 0.8)
+        return ""
+
+    def _pack(self, items: List[str], budget: int) -> Tuple[List[str], int]:
+        """Keep items in order while they fit; stop at the first one that doesn't"""
+        kept, used = [], 0
+        for item in items:
+            tokens = self.count_tokens(item) + 1  # separator
+            if used + tokens > budget:
+                break
+            kept.append(item)
+            used += tokens
+        return kept, used
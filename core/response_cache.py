@@ -0,0 +1,110 @@
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import copy
+import hashlib
+import json
+import threading
+import time
+import numpy as np
+from core.vector_index import VectorIndex
+
+CacheKey = Tuple[str, str, str, str]
+
+def knowledge_fingerprint(relevant_knowledge: List[Dict[str, Any]], version: int = 0) -> str:
+    """Identify the knowledge a response was grounded on"""
+    ids = ",".join(str(item.get("id")) for item in relevant_knowledge)
+    return hashlib.sha1(f"{version}:{ids}".encode("utf-8")).hexdigest()
+
+def echoed_fields(response: Dict[str, Any], collected_info: Dict[str, Any]) -> Dict[str, Any]:
+    """The collected fields whose values a response repeats back"""
+    text = json.dumps(response, ensure_ascii=False, default=str).lower()
+    return {
+        field: value for field, value in collected_info.items()
+        if value not in (None, "") and str(value).lower() in text
+    }
+
+class ResponseCache:
+    """Reuses parsed model responses for near-identical messages.
+
+    Entries are bucketed by (agent_type, current_state, category,
+    knowledge fingerprint). An entry also remembers the collected fields
+    its reply echoes (a name, an email) and only matches conversations
+    holding the same values, so a reply that addresses one user by name
+    is never served to another while generic answers stay shared. Within
+    a bucket a lookup hits when the message embedding's cosine similarity
+    to a cached one reaches `threshold`. Only responses
+    without actions are cached, since replaying an action (say, save_lead
+    with another user's details) would be wrong.
+    """
+
+    def __init__(self,
+                 threshold: float = 0.95,
+                 max_buckets: int = 10000,
+                 max_entries_per_bucket: int = 32,
+                 ttl_seconds: float = 3600):
+        self.threshold = threshold
+        self.max_buckets = max_buckets
+        self.max_entries_per_bucket = max_entries_per_bucket
+        self.ttl_seconds = ttl_seconds
+        self._buckets: "OrderedDict[CacheKey, List[tuple]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    def lookup(self, agent_type: str, state: str, category: str, fingerprint: str,
+               embedding, collected_info: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        key = (agent_type, state, category, fingerprint)
+        now = time.time()
+        with self._lock:
+            entries = self._buckets.get(key)
+            if entries:
+                entries[:] = [entry for entry in entries if now - entry[2] <= self.ttl_seconds]
+            candidates = [
+                entry for entry in entries or []
+                if all((collected_info or {}).get(field) == value for field, value in entry[3].items())
+            ]
+            if not candidates:
+                self.stats["misses"] += 1
+                return None
+
+            vectors = np.stack([entry[0] for entry in candidates])
+            scores = vectors @ VectorIndex.normalize(embedding)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.stats["misses"] += 1
+                return None
+
+            self._buckets.move_to_end(key)
+            self.stats["hits"] += 1
+            return copy.deepcopy(candidates[best][1])
+
+    def store(self, agent_type: str, state: str, category: str, fingerprint: str,
+              embedding, response: Dict[str, Any], collected_info: Optional[Dict[str, Any]] = None):
+        if response.get("actions"):
+            return
+        key = (agent_type, state, category, fingerprint)
+        entry = (VectorIndex.normalize(embedding), copy.deepcopy(response), time.time(),
+                 echoed_fields(response, collected_info or {}))
+        with self._lock:
+            entries = self._buckets.setdefault(key, [])
+            entries.append(entry)
+            if len(entries) > self.max_entries_per_bucket:
+                del entries[0]
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+            self.stats["stores"] += 1
+
+    def invalidate_category(self, category: str):
+        with self._lock:
+            stale = [key for key in self._buckets if category in key[2].split(",")]
+            for key in stale:
+                del self._buckets[key]
+            self.stats["invalidations"] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
@@ -1,6 +1,22 @@
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, List, Optional, Tuple
+import copy
 import json
+import logging
+import re
 from abc import ABC, abstractmethod
+from core.metrics import PARSE_RESULTS
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib decoder is used instead
+    orjson = None
+
+# Both backends raise ValueError subclasses on malformed input.
+_loads = orjson.loads if orjson is not None else json.loads
+
+REQUIRED = object()
 
 class ResponseParseError(Exception):
     pass
@@ -10,33 +26,202 @@ class ResponseParser(ABC):
     def parse(self, response: str) -> Dict[str, Any]:
         pass
 
+class ResponseSchema:
+    """Field checks for a parsed reply, compiled once into a flat tuple.
+
+    `fields` maps a name to (expected type(s), default). A REQUIRED
+    default means the field must be present and a None default lets it be
+    absent; otherwise a missing field is filled in when the caller asks
+    for defaults. When it does, an optional field given as null counts as
+    missing too.
+    """
+
+    def __init__(self, fields: Dict[str, Tuple[Any, Any]]):
+        self.fields = fields
+        self._checks = tuple((name, types, default) for name, (types, default) in fields.items())
+
+    def validate(self, parsed: Any, fill_defaults: bool = True) -> List[str]:
+        """Check `parsed` in place and return the names of defaulted fields"""
+        if not isinstance(parsed, dict):
+            raise ResponseParseError(f"Expected a JSON object, got {type(parsed)}")
+        defaulted = []
+        for name, types, default in self._checks:
+            if fill_defaults and default is not REQUIRED and name in parsed and parsed[name] is None:
+                del parsed[name]  # models often write null for "nothing to say"
+            if name not in parsed:
+                if default is REQUIRED or not fill_defaults:
+                    raise ResponseParseError(f"Missing required field: {name}")
+                if default is None:
+                    continue
+                parsed[name] = copy.copy(default)
+                defaulted.append(name)
+            elif not isinstance(parsed[name], types):
+                raise ResponseParseError(
+                    f"Invalid type for {name}. Expected {types}, got {type(parsed[name])}"
+                )
+        return defaulted
+
+RESPONSE_SCHEMA = ResponseSchema({
+    "response": (str, REQUIRED),
+    "actions": (list, []),
+    "required_information": (list, []),
+    "next_state": (str, None),  # absent: the conversation stays in its current state
+    "confidence": ((int, float), 0.0)
+})
+
+_STRUCTURAL = re.compile(r'[{}\[\],"]')
+_STRING_END = re.compile(r'["\\]')
+_PARTIAL_ESCAPE = re.compile(r'\\(u[0-9a-fA-F]{0,3})?$')
+_HEX4 = re.compile(r'[0-9a-fA-F]{4}')
+_MEMBER_KEY = re.compile(r'\s*"([^"\\]*)"\s*:\s*"')
+_CLOSERS = {"{": "}", "[": "]"}
+
+def _scan(text: str, start: int):
+    """Walk the JSON value opening at text[start], jumping between structural characters.
+
+    Returns (end, stack, in_string, cuts, dangling_commas): `end` is one
+    past the matching close brace or None if the text runs out first, in
+    which case `stack` holds the still-open closers. `cuts` records every
+    member-separating comma with the closers open at that point, which is
+    where a truncated document can be cut back to.
+    """
+    stack = []
+    cuts = []
+    dangling = []
+    last_comma = None
+    pos = start
+    length = len(text)
+    while pos < length:
+        match = _STRUCTURAL.search(text, pos)
+        if match is None:
+            break
+        pos = match.start()
+        char = text[pos]
+        if char == '"':
+            last_comma = None
+            while True:
+                end = _STRING_END.search(text, pos + 1)
+                if end is None:
+                    return None, stack, True, cuts, dangling
+                pos = end.start()
+                if text[pos] == '"':
+                    break
+                pos += 1  # skip the escaped character
+                if pos >= length:
+                    return None, stack, True, cuts, dangling
+        elif char in "{[":
+            last_comma = None
+            stack.append(_CLOSERS[char])
+        elif char in "}]":
+            if last_comma is not None and not text[last_comma + 1:pos].strip():
+                dangling.append(last_comma)
+            last_comma = None
+            if not stack or stack.pop() != char:
+                return None, [], False, [], []
+            if not stack:
+                return pos + 1, stack, False, cuts, dangling
+        else:
+            last_comma = pos
+            cuts.append((pos, tuple(stack)))
+        pos += 1
+    return None, stack, False, cuts, dangling
+
+def _close(fragment: str, closers) -> str:
+    return fragment.rstrip() + "".join(reversed(closers))
+
+def extract_json_object(text: str,
+                        text_fields: Tuple[str, ...] = ("response",),
+                        max_starts: int = 3,
+                        max_cuts: int = 8,
+                        loads: Callable[[str], Any] = _loads) -> Optional[Any]:
+    """Decode the first JSON object embedded in `text`, repairing it if needed.
+
+    Handles surrounding prose or code fences, trailing commas, and output
+    truncated mid-document. Truncation is only ever repaired at the top
+    level: a cut-off string value of one of `text_fields` is closed,
+    otherwise members are dropped back to the last complete one, so a
+    half-written action or state name is discarded rather than used.
+    Returns None when nothing decodable is found.
+    """
+    start = text.find("{")
+    attempts = 0
+    while start != -1 and attempts < max_starts:
+        attempts += 1
+        end, stack, in_string, cuts, dangling = _scan(text, start)
+        candidates = []
+        if end is not None:
+            candidate = text[start:end]
+            for comma in reversed(dangling):
+                candidate = candidate[:comma - start] + candidate[comma - start + 1:]
+            candidates.append(candidate)
+        elif stack:
+            top_level = [cut for cut in cuts if len(cut[1]) == 1]
+            if len(stack) == 1:
+                fragment = text[start:]
+                member = _MEMBER_KEY.match(text, top_level[-1][0] + 1 if top_level else start + 1)
+                if not in_string:
+                    candidates.append(_close(fragment, stack))
+                elif member is not None and member.group(1) in text_fields:
+                    candidates.append(_close(_PARTIAL_ESCAPE.sub("", fragment) + '"', stack))
+            for comma, closers in reversed(top_level[-max_cuts:]):
+                candidates.append(_close(text[start:comma], closers))
+
+        for candidate in candidates:
+            try:
+                parsed = loads(candidate)
+            except ValueError:
+                continue
+            if isinstance(parsed, dict):
+                return parsed
+        start = text.find("{", start + 1)
+    return None
+
 class JSONResponseParser(ResponseParser):
+    """Parses the model's JSON reply, repairing it rather than failing the turn.
+
+    Well-formed output costs a single loads() call (orjson when installed).
+    Anything else goes through extract_json_object, and optional fields
+    missing from the result get their schema defaults; only a reply with no
+    usable "response" still raises ResponseParseError. With repair=False
+    the parser is strict, as before.
+    """
+
+    def __init__(self,
+                 schema: ResponseSchema = RESPONSE_SCHEMA,
+                 repair: bool = True,
+                 loads: Callable[[str], Any] = _loads):
+        self.schema = schema
+        self.repair = repair
+        self.loads = loads
+        self.stats: Dict[str, int] = {"parsed": 0, "repaired": 0, "failed": 0}
+
     def parse(self, response: str) -> Dict[str, Any]:
         try:
-            parsed = json.loads(response)
-            self._validate_response_structure(parsed)
-            return parsed
-        except json.JSONDecodeError as e:
-            raise ResponseParseError(f"Invalid JSON response: {str(e)}")
-        except KeyError as e:
-            raise ResponseParseError(f"Missing required field: {str(e)}")
-
-    def _validate_response_structure(self, parsed: Dict[str, Any]):
-        required_fields = {
-            "response": str,
-            "actions": list,
-            "required_information": list,
-            "next_state": str,
-            "confidence": (int, float)
-        }
-
-        for field, expected_type in required_fields.items():
-            if field not in parsed:
-                raise ResponseParseError(f"Missing required field: {field}")
-            if not isinstance(parsed[field], expected_type):
-                raise ResponseParseError(
-                    f"Invalid type for {field}. Expected {expected_type}, got {type(parsed[field])}"
-                )
+            parsed = self.loads(response)
+            repaired = False
+        except ValueError as e:
+            parsed = extract_json_object(response, loads=self.loads) if self.repair else None
+            if parsed is None:
+                self._count("failed")
+                raise ResponseParseError(f"Invalid JSON response: {str(e)}")
+            repaired = True
+
+        try:
+            defaulted = self.schema.validate(parsed, fill_defaults=self.repair)
+        except ResponseParseError:
+            self._count("failed")
+            raise
+
+        if repaired or defaulted:
+            self._count("repaired")
+            logger.info(f"Repaired model response (defaulted fields: {defaulted})")
+        else:
+            self._count("parsed")
+        return parsed
+
+    def _count(self, result: str):
+        self.stats[result] += 1
+        PARSE_RESULTS.inc(result=result)
 
 class StructuredResponseParser(ResponseParser):
     def parse(self, response: str) -> Dict[str, Any]:
@@ -51,4 +236,94 @@ class StructuredResponseParser(ResponseParser):
             elif current_section and line.strip():
                 parsed[current_section].append(line.strip())
 
-        return self._process_sections(parsed)
\ No newline at end of file
+        return self._process_sections(parsed)
+
+class IncrementalResponseExtractor:
+    """Pulls the top-level "response" string out of a JSON document as it streams in.
+
+    feed() returns whatever new characters of that string value became
+    available in the chunk, so callers can forward them before the rest of
+    the object has arrived.
+    """
+
+    _ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self, field: str = "response"):
+        self.field = field
+        self.buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._string_chars = []
+        self._last_string = None
+        self._awaiting_value = False
+        self._streaming = False
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        self.buffer += chunk
+        emitted = []
+        while self._pos < len(self.buffer) and not self.done:
+            char = self.buffer[self._pos]
+
+            if self._in_string:
+                if char == '\\':
+                    decoded, consumed = self._decode_escape(self._pos)
+                    if consumed == 0:
+                        break  # escape sequence split across chunks
+                    self._string_chars.append(decoded)
+                    if self._streaming:
+                        emitted.append(decoded)
+                    self._pos += consumed
+                    continue
+                if char == '"':
+                    self._in_string = False
+                    if self._streaming:
+                        self.done = True
+                    self._last_string = "".join(self._string_chars)
+                else:
+                    self._string_chars.append(char)
+                    if self._streaming:
+                        emitted.append(char)
+            elif char == '"':
+                self._in_string = True
+                self._string_chars = []
+                self._streaming = self._awaiting_value
+                self._awaiting_value = False
+            elif char in '{[':
+                self._depth += 1
+                self._awaiting_value = False
+            elif char in '}]':
+                self._depth -= 1
+            elif char == ':':
+                self._awaiting_value = self._depth == 1 and self._last_string == self.field
+                self._last_string = None
+            elif not char.isspace():
+                self._awaiting_value = False
+                self._last_string = None
+            self._pos += 1
+        return "".join(emitted)
+
+    def _decode_escape(self, pos: int):
+        if pos + 1 >= len(self.buffer):
+            return "", 0
+        code = self.buffer[pos + 1]
+        if code != 'u':
+            return self._ESCAPES.get(code, code), 2
+        if pos + 6 > len(self.buffer):
+            return "", 0
+        if not _HEX4.fullmatch(self.buffer, pos + 2, pos + 6):
+            # Malformed escape from the model: mark it and carry on with what follows.
+            return "\ufffd", 2
+        codepoint = int(self.buffer[pos + 2:pos + 6], 16)
+        if 0xD800 <= codepoint < 0xDC00:
+            # High surrogate: wait for its low half so we never emit half a character.
+            if pos + 12 > len(self.buffer):
+                return "", 0
+            if self.buffer[pos + 6:pos + 8] == '\\u' and _HEX4.fullmatch(self.buffer, pos + 8, pos + 12):
+                low = int(self.buffer[pos + 8:pos + 12], 16)
+                if 0xDC00 <= low < 0xE000:
+                    return chr(0x10000 + ((codepoint - 0xD800) << 10) + (low - 0xDC00)), 12
+        if 0xD800 <= codepoint < 0xE000:
+            return "\ufffd", 6  # unpaired surrogate
+        return chr(codepoint), 6
@@ -0,0 +1,236 @@
+from typing import List, Optional
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import json
+import sqlite3
+import threading
+import time
+import logging
+from core.context import ConversationContext, Message
+
+logger = logging.getLogger(__name__)
+
+class SessionStore(ABC):
+    """Where live ConversationContexts are kept between requests.
+
+    Sessions idle for longer than idle_ttl_seconds (judged by
+    ConversationContext.last_interaction) are treated as gone.
+    """
+
+    def __init__(self, idle_ttl_seconds: float = 3600, evict_every: int = 500):
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.evict_every = evict_every
+        self._saves = 0
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[ConversationContext]:
+        pass
+
+    @abstractmethod
+    def save(self, context: ConversationContext):
+        pass
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        pass
+
+    @abstractmethod
+    def evict_idle(self) -> int:
+        pass
+
+    @abstractmethod
+    def save_summary(self, session_id: str, summary: str, covered: int):
+        """Store a running summary of a session's first `covered` messages, unless it already has a newer one"""
+        pass
+
+    def get_archived_messages(self, session_id: str, start: int = 0, end: Optional[int] = None) -> List[Message]:
+        """Messages that left the session's window, by position in the conversation"""
+        return []
+
+    def _is_idle(self, last_interaction: float, now: float) -> bool:
+        return now - last_interaction > self.idle_ttl_seconds
+
+    def _after_save(self):
+        """Sweep idle sessions every evict_every saves so nobody has to schedule it"""
+        self._saves += 1
+        if self._saves % self.evict_every == 0:
+            self.evict_idle()
+
+class InMemorySessionStore(SessionStore):
+    """Process-local LRU store bounded by both size and idle time"""
+
+    def __init__(self, max_sessions: int = 10000, idle_ttl_seconds: float = 3600):
+        super().__init__(idle_ttl_seconds)
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, ConversationContext]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> Optional[ConversationContext]:
+        with self._lock:
+            context = self._sessions.get(session_id)
+            if context is None:
+                return None
+            if self._is_idle(context.last_interaction.timestamp(), time.time()):
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return context
+
+    def save(self, context: ConversationContext):
+        # Nothing durable to spill to; dropping evicted turns keeps memory flat.
+        context.conversation_history.drain_evicted()
+        with self._lock:
+            self._sessions[context.session_id] = context
+            self._sessions.move_to_end(context.session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._after_save()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def save_summary(self, session_id: str, summary: str, covered: int):
+        with self._lock:
+            context = self._sessions.get(session_id)
+            if context is not None and covered > context.summarized_count:
+                context.summary, context.summarized_count = summary, covered
+
+    def evict_idle(self) -> int:
+        now = time.time()
+        with self._lock:
+            idle = [
+                session_id for session_id, context in self._sessions.items()
+                if self._is_idle(context.last_interaction.timestamp(), now)
+            ]
+            for session_id in idle:
+                del self._sessions[session_id]
+        return len(idle)
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions shared by every worker process through one WAL-mode SQLite file"""
+
+    def __init__(self, db_path: str = 'sessions.db', idle_ttl_seconds: float = 3600):
+        super().__init__(idle_ttl_seconds)
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self.conn
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                agent_id TEXT NOT NULL,
+                data TEXT NOT NULL,
+                last_interaction REAL NOT NULL
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_interaction ON sessions(last_interaction)")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS conversation_archive (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                timestamp REAL NOT NULL
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_conversation_archive_session ON conversation_archive(session_id)")
+        conn.commit()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str) -> Optional[ConversationContext]:
+        row = self.conn.execute(
+            "SELECT data, last_interaction FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None or self._is_idle(row[1], time.time()):
+            return None
+        return ConversationContext.from_dict(json.loads(row[0]))
+
+    def save(self, context: ConversationContext):
+        evicted = context.conversation_history.drain_evicted()
+        if evicted:
+            self.conn.executemany(
+                "INSERT INTO conversation_archive (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+                [(context.session_id, message.role, message.content, message.timestamp) for message in evicted]
+            )
+        # A summary the summarizer stored while this request ran is kept.
+        self.conn.execute(
+            """
+            INSERT INTO sessions (session_id, user_id, agent_id, data, last_interaction) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET
+                user_id = excluded.user_id,
+                agent_id = excluded.agent_id,
+                data = CASE
+                    WHEN json_extract(sessions.data, '$.summarized_count') > json_extract(excluded.data, '$.summarized_count')
+                    THEN json_set(excluded.data,
+                                  '$.summary', json_extract(sessions.data, '$.summary'),
+                                  '$.summarized_count', json_extract(sessions.data, '$.summarized_count'))
+                    ELSE excluded.data
+                END,
+                last_interaction = excluded.last_interaction
+            """,
+            (
+                context.session_id,
+                context.user_id,
+                context.agent_id,
+                json.dumps(context.to_dict(), separators=(",", ":"), default=str),
+                context.last_interaction.timestamp()
+            )
+        )
+        self.conn.commit()
+        self._after_save()
+
+    def delete(self, session_id: str):
+        self.conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        self.conn.commit()
+
+    def save_summary(self, session_id: str, summary: str, covered: int):
+        self.conn.execute(
+            """
+            UPDATE sessions SET data = json_set(data, '$.summary', ?, '$.summarized_count', ?)
+            WHERE session_id = ? AND COALESCE(json_extract(data, '$.summarized_count'), 0) < ?
+            """,
+            (summary, covered, session_id, covered)
+        )
+        self.conn.commit()
+
+    def get_archived_messages(self, session_id: str, start: int = 0, end: Optional[int] = None) -> List[Message]:
+        cursor = self.conn.execute(
+            "SELECT role, content, timestamp FROM conversation_archive WHERE session_id = ? ORDER BY id LIMIT ? OFFSET ?",
+            (session_id, -1 if end is None else max(end - start, 0), start)
+        )
+        return [Message(*row) for row in cursor.fetchall()]
+
+    def evict_idle(self) -> int:
+        evicted = self.conn.execute(
+            "DELETE FROM sessions WHERE last_interaction < ?", (time.time() - self.idle_ttl_seconds,)
+        ).rowcount
+        self.conn.commit()
+        if evicted:
+            logger.info(f"Evicted {evicted} idle sessions")
+        return evicted
+
+def create_session_store(kind: str, **options) -> SessionStore:
+    if kind == "memory":
+        return InMemorySessionStore(
+            max_sessions=options.get("max_sessions", 10000),
+            idle_ttl_seconds=options.get("idle_ttl_seconds", 3600)
+        )
+    if kind == "sqlite":
+        return SQLiteSessionStore(
+            db_path=options.get("db_path", "sessions.db"),
+            idle_ttl_seconds=options.get("idle_ttl_seconds", 3600)
+        )
+    raise ValueError(f"Unknown session store: {kind}")
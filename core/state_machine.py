@@ -0,0 +1,143 @@
+from typing import Any, Dict, FrozenSet, List, Optional, Pattern
+from dataclasses import dataclass, field
+import re
+import logging
+from core.context import ConversationContext
+from core.prompt_engine import PromptTemplate
+
+logger = logging.getLogger(__name__)
+
+class StateMachineError(Exception):
+    pass
+
+@dataclass
+class State:
+    """One conversation state, compiled from its declaration.
+
+    - prompt: state-specific instructions for the model.
+    - transitions: states the model may move to from here, this one
+      included; None allows any state.
+    - knowledge_categories: where retrieval looks while in this state;
+      None uses the agent's categories.
+    - required_info / extract / on_complete: fields this state collects,
+      regexes that pull them out of user messages (group 1 if present,
+      else the whole match), and where to go once all are collected.
+    - response / actions: a fixed reply (templated with collected fields)
+      and actions run when a local transition enters this state, which
+      then needs no model call.
+    """
+    name: str
+    prompt: Optional[PromptTemplate] = None
+    transitions: Optional[FrozenSet[str]] = None
+    knowledge_categories: Optional[List[str]] = None
+    required_info: List[str] = field(default_factory=list)
+    extract: Dict[str, Pattern] = field(default_factory=dict)
+    on_complete: Optional[str] = None
+    response: Optional[PromptTemplate] = None
+    actions: List[Dict[str, Any]] = field(default_factory=list)
+
+class StateMachine:
+    """Conversation states and legal transitions for one agent type.
+
+    Built once from a declaration such as agents/definitions/*.json
+    "states"; per turn everything is a dict lookup. A context whose state
+    is not declared (e.g. from an older definition) is treated as being
+    in the initial state.
+    """
+
+    def __init__(self, states: Dict[str, State], initial: str = "initial"):
+        if initial not in states:
+            raise StateMachineError(f"Initial state '{initial}' is not declared")
+        for state in states.values():
+            targets = set(state.transitions or ()) | ({state.on_complete} if state.on_complete else set())
+            unknown = targets - set(states)
+            if unknown:
+                raise StateMachineError(f"State '{state.name}' refers to undeclared states: {sorted(unknown)}")
+            if state.on_complete and state.transitions is not None:
+                state.transitions = state.transitions | {state.on_complete}
+        self.states = states
+        self.initial = initial
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Dict[str, Any]], initial: str = "initial") -> "StateMachine":
+        states = {}
+        for name, spec in data.items():
+            spec = {"prompt": spec} if isinstance(spec, str) else dict(spec)
+            try:
+                transitions = spec.pop("transitions", None)
+                extract = spec.pop("extract", {})
+                prompt = spec.pop("prompt", None)
+                if isinstance(prompt, dict):
+                    prompt = PromptTemplate(prompt["template"], prompt.get("required_variables", []))
+                elif prompt is not None:
+                    prompt = PromptTemplate(prompt)
+                response = spec.pop("response", None)
+                states[name] = State(
+                    name=name,
+                    prompt=prompt,
+                    transitions=frozenset(transitions) | {name} if transitions is not None else None,
+                    extract={key: re.compile(pattern) for key, pattern in extract.items()},
+                    response=PromptTemplate(response) if response is not None else None,
+                    **spec
+                )
+            except (TypeError, KeyError, re.error) as e:
+                raise StateMachineError(f"Invalid state '{name}': {str(e)}")
+        return cls(states, initial)
+
+    def get(self, name: str) -> State:
+        return self.states.get(name) or self.states[self.initial]
+
+    def accept(self, current: str, proposed: Optional[str]) -> str:
+        """The state to move to when the model proposes `proposed`; illegal moves stay put"""
+        if current not in self.states:
+            current = self.initial  # e.g. a session saved under an older definition
+        if not proposed or proposed == current:
+            return current
+        allowed = self.states[current].transitions
+        if proposed in self.states and (allowed is None or proposed in allowed):
+            return proposed
+        logger.warning(f"Rejected transition {current} -> {proposed}")
+        return current
+
+    def extract(self, context: ConversationContext, message: str) -> Dict[str, str]:
+        """Fields the current state collects that this message supplies"""
+        found = {}
+        for key, pattern in self.get(context.current_state).extract.items():
+            if key in context.collected_info:
+                continue
+            match = pattern.search(message)
+            if match:
+                found[key] = (match.group(1) if pattern.groups else match.group(0)).strip()
+        return found
+
+    def completed(self, context: ConversationContext) -> Optional[str]:
+        """The on_complete state, once everything the current state requires is collected"""
+        state = self.get(context.current_state)
+        if state.on_complete and state.required_info and all(
+                key in context.collected_info for key in state.required_info):
+            return state.on_complete
+        return None
+
+    def local_response(self, context: ConversationContext, next_state: str) -> Optional[Dict[str, Any]]:
+        """A complete turn for entering `next_state`, if it declares a fixed reply"""
+        state = self.states[next_state]
+        if state.response is None:
+            return None
+        values = {key: value for key, value in context.collected_info.items() if isinstance(key, str)}
+        try:
+            text = state.response.render(values)
+            actions = [
+                {"name": action["name"],
+                 "parameters": {param: context.collected_info[key]
+                                for param, key in action.get("parameters", {}).items()}}
+                for action in state.actions
+            ]
+        except (KeyError, IndexError, ValueError):
+            return None  # a field it needs is missing: let the model answer
+        return {
+            "response": text,
+            "actions": actions,
+            "required_information": list(state.required_info),
+            "next_state": next_state,
+            "confidence": 1.0
+        }
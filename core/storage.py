@@ -0,0 +1,141 @@
+from typing import Iterator, List, Optional
+from contextlib import contextmanager
+import queue
+import sqlite3
+import threading
+import logging
+from config.settings import (
+    SQLITE_READERS, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KIB, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+class SQLiteStorage:
+    """A pool of reader connections and one writer over a WAL-mode database.
+
+    In WAL mode readers never block the writer or each other, so queries
+    run in parallel from any number of threads (up to `readers` at once)
+    while every write is serialized through the single writer connection
+    inside transaction(). Statements are prepared once per connection and
+    reused from sqlite3's statement cache, so callers should keep SQL text
+    constant and pass values as parameters.
+    """
+
+    def __init__(self,
+                 db_path: str,
+                 readers: int = SQLITE_READERS,
+                 mmap_size: int = SQLITE_MMAP_SIZE,
+                 cache_size_kib: int = SQLITE_CACHE_SIZE_KIB,
+                 synchronous: str = SQLITE_SYNCHRONOUS,
+                 busy_timeout: float = SQLITE_BUSY_TIMEOUT_SECONDS,
+                 cached_statements: int = 256):
+        self.db_path = db_path
+        self.readers = readers
+        self.mmap_size = mmap_size
+        self.cache_size_kib = cache_size_kib
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        # An in-memory database is private to its connection, so everything
+        # has to go through the writer.
+        self.shared = db_path == ":memory:" or readers <= 0
+        self._write_lock = threading.RLock()
+        self._depth = 0
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._opened: List[sqlite3.Connection] = []
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(readers, 1))
+        self._watch: Optional[sqlite3.Connection] = None
+        self._watch_lock = threading.Lock()
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections move between threads, but only ever one thread at a time.
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        with self._pool_lock:
+            self._opened.append(conn)
+        return conn
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read connection; it sees the last committed state"""
+        if self.shared:
+            with self._write_lock:
+                yield self._writer
+            return
+
+        with self._slots:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._pool.put(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Hold the writer for a transaction, committed on exit or rolled back on error.
+
+        Nested calls on the same thread join the outer transaction.
+        """
+        with self._write_lock:
+            self._depth += 1
+            try:
+                yield self._writer
+                if self._depth == 1:
+                    self._writer.commit()
+            except BaseException:
+                if self._depth == 1:
+                    self._writer.rollback()
+                raise
+            finally:
+                self._depth -= 1
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Hold the writer outside a transaction, for DDL scripts and VACUUM"""
+        with self._write_lock:
+            yield self._writer
+
+    def data_version(self) -> int:
+        """A number that changes whenever any connection, in any process, commits.
+
+        Read from a connection that never writes, so this process's own
+        commits count too. Cheap enough to check before every query.
+        """
+        if self.shared:
+            return 0  # nobody else can open a private database
+        with self._watch_lock:
+            if self._watch is None:
+                self._watch = self._connect()
+            return self._watch.execute("PRAGMA data_version").fetchone()[0]
+
+    def vacuum(self):
+        with self._write_lock:
+            self._writer.execute("VACUUM")
+
+    def optimize(self):
+        with self._write_lock:
+            self._writer.execute("PRAGMA optimize")
+
+    def close(self):
+        with self._write_lock, self._pool_lock:
+            for conn in self._opened:
+                conn.close()
+            self._opened.clear()
+            self._pool = queue.LifoQueue()
+            self._watch = None
@@ -0,0 +1,152 @@
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import logging
+from core.context import ConversationContext, Message
+from core.llm import LLMProvider, get_provider
+from core.session_store import SessionStore
+from core.tokens import get_token_counter
+from config.settings import (
+    MODEL_NAME, SUMMARY_EVERY_MESSAGES, SUMMARY_KEEP_RECENT, SUMMARY_MAX_TOKENS, SUMMARY_WORKERS
+)
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Rewrite the current summary so that it also covers the new messages. Keep every fact the "
+    "user shared (name, contact details, needs, budget, timing), decisions made and open "
+    "questions; drop greetings and small talk. Reply with the summary text only, at most "
+    "{max_words} words."
+)
+
+class ConversationSummarizer:
+    """Folds older messages into a running summary, off the request path.
+
+    Once at least `every` messages older than the last `keep_recent` are
+    not yet covered, schedule() hands them with the current summary to a
+    background worker, which asks the model for an updated summary.
+    Messages that already left the history window are read back from the
+    session store's archive. The result is saved with the session in
+    `sessions`; without a store it is kept here until apply() merges it
+    into the context at the start of that session's next turn. At most
+    one update per session is in flight; a failed one is retried at the
+    next turn.
+    """
+
+    def __init__(self,
+                 llm: Optional[LLMProvider] = None,
+                 every: int = SUMMARY_EVERY_MESSAGES,
+                 keep_recent: int = SUMMARY_KEEP_RECENT,
+                 max_tokens: int = SUMMARY_MAX_TOKENS,
+                 workers: int = SUMMARY_WORKERS,
+                 max_results: int = 10000,
+                 sessions: Optional[SessionStore] = None):
+        self.llm = llm or get_provider()
+        self.sessions = sessions
+        self.every = every
+        self.keep_recent = keep_recent
+        self.max_tokens = max_tokens
+        self.max_results = max_results
+        self.count_tokens = get_token_counter()
+        self.stats: Dict[str, int] = {"scheduled": 0, "applied": 0, "failed": 0}
+        self._results: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()  # session_id -> (summary, covered)
+        self._running: set = set()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="summarizer")
+
+    def apply(self, context: ConversationContext):
+        """Merge a finished summary for this session into the context"""
+        with self._lock:
+            result = self._results.pop(context.session_id, None)
+        if result is not None and result[1] > context.summarized_count:
+            context.summary, context.summarized_count = result
+            self.stats["applied"] += 1
+
+    def schedule(self, context: ConversationContext) -> bool:
+        """Start a background summary update if enough messages have aged out of the recent window"""
+        history = context.conversation_history
+        end = context.message_count - self.keep_recent
+        with self._lock:
+            if self._closed or context.session_id in self._running:
+                return False
+            # A result that arrived after this turn's apply() is built upon, not redone.
+            pending = self._results.get(context.session_id)
+            if pending is not None and pending[1] > context.summarized_count:
+                summary, covered = pending
+            else:
+                summary, covered = context.summary, context.summarized_count
+            if end - covered < self.every:
+                return False
+            self._running.add(context.session_id)
+        # Evicted messages not yet drained by a save are still at hand; older ones are archived.
+        held = list(history.evicted) + list(history)
+        held_from = history.archived_count - len(history.evicted)
+        messages = held[max(covered - held_from, 0):max(end - held_from, 0)]
+        archived = (covered, min(held_from, end))
+        try:
+            self._pool.submit(self._update, context.session_id, summary, archived, messages, end)
+        except RuntimeError as e:  # closed since the check above
+            with self._lock:
+                self._running.discard(context.session_id)
+            logger.warning(f"Summarizing session {context.session_id} not scheduled: {str(e)}")
+            return False
+        self.stats["scheduled"] += 1
+        return True
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        self._pool.shutdown(wait=False)
+
+    def summarize(self, summary: str, messages: List[Message]) -> str:
+        transcript = "\n".join(f"{message.role}: {message.content}" for message in messages)
+        prompt = (f"Current summary:\n{summary or '(none yet)'}\n\nNew messages:\n{transcript}\n\n"
+                  "Updated summary:")
+        text = self.llm.chat(
+            [{"role": "system", "content": SUMMARY_INSTRUCTIONS.format(max_words=self.max_tokens * 3 // 4)},
+             {"role": "user", "content": prompt}],
+            MODEL_NAME, self.max_tokens, 0.0
+        )
+        return self._clip(text.strip())
+
+    def _clip(self, text: str) -> str:
+        # Models overshoot word limits; the prompt budget relies on this bound.
+        limit = self.max_tokens * 4
+        while text and self.count_tokens(text) > self.max_tokens:
+            limit = int(limit * 0.8)
+            text = text[:limit]
+        return text
+
+    def _update(self, session_id: str, summary: str, archived: Tuple[int, int], messages: List[Message],
+                covered: int):
+        try:
+            if archived[0] < archived[1]:
+                messages = self._archived(session_id, *archived) + messages
+            updated = self.summarize(summary, messages)
+            if self.sessions is not None:
+                self.sessions.save_summary(session_id, updated, covered)
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.warning(f"Summarizing session {session_id} failed: {str(e)}")
+            with self._lock:
+                self._running.discard(session_id)
+            return
+
+        with self._lock:
+            self._running.discard(session_id)
+            if self.sessions is not None:
+                return
+            self._results[session_id] = (updated, covered)
+            self._results.move_to_end(session_id)
+            while len(self._results) > self.max_results:  # sessions that never came back
+                self._results.popitem(last=False)
+
+    def _archived(self, session_id: str, start: int, end: int) -> List[Message]:
+        messages = self.sessions.get_archived_messages(session_id, start, end) if self.sessions is not None else []
+        if len(messages) < end - start:
+            logger.warning(f"Session {session_id}: {end - start - len(messages)} archived messages "
+                           "unavailable for its summary")
+        return messages
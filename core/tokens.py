@@ -0,0 +1,36 @@
+from typing import Callable, Dict
+import logging
+from config.settings import MODEL_NAME
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+except ImportError:  # optional; fall back to a character heuristic
+    tiktoken = None
+
+_counters: Dict[str, Callable[[str], int]] = {}
+
+def _approximate(text: str) -> int:
+    # ~4 characters per token for English prose and JSON punctuation.
+    return (len(text) + 3) // 4
+
+def get_token_counter(model: str = MODEL_NAME) -> Callable[[str], int]:
+    counter = _counters.get(model)
+    if counter is not None:
+        return counter
+
+    counter = _approximate
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        counter = lambda text: len(encoding.encode(text, disallowed_special=()))
+    else:
+        logger.info("tiktoken not installed; estimating prompt tokens from character counts")
+    _counters[model] = counter
+    return counter
+
+def count_tokens(text: str, model: str = MODEL_NAME) -> int:
+    return get_token_counter(model)(text)
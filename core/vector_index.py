@@ -0,0 +1,172 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+import threading
+import numpy as np
+
+class VectorIndex:
+    """In-memory cosine similarity index over pre-normalized float32 embeddings.
+
+    Rows live in one contiguous matrix; each category keeps an array of the
+    matrix positions that belong to it so a filtered query only touches its
+    own rows. Removed rows are tombstoned rather than compacted so positions
+    stay stable for the IVF buckets built on top; a reload compacts them.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self._lock = threading.RLock()
+        self._initial_capacity = initial_capacity
+        self._matrix: Optional[np.ndarray] = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._size = 0
+        self._category_rows: Dict[str, np.ndarray] = {}
+        self._category_codes: Dict[str, int] = {}
+        self._codes = np.empty(0, dtype=np.int32)
+        self._alive = np.empty(0, dtype=bool)
+        self._positions: Dict[int, int] = {}
+        self._removed = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return None if self._matrix is None else self._matrix.shape[1]
+
+    @staticmethod
+    def normalize(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def add(self, ids: Sequence[int], categories: Sequence[str], embeddings) -> None:
+        """Append a batch of rows; embeddings need not be normalized"""
+        if len(ids) == 0:
+            return
+        vectors = self.normalize(np.atleast_2d(embeddings))
+        with self._lock:
+            self._reserve(self._size + len(ids), vectors.shape[1])
+            start, end = self._size, self._size + len(ids)
+            self._matrix[start:end] = vectors
+            self._ids[start:end] = ids
+            self._alive[start:end] = True
+            self._positions.update((int(entry_id), start + offset) for offset, entry_id in enumerate(ids))
+
+            positions: Dict[str, List[int]] = {}
+            for offset, category in enumerate(categories):
+                positions.setdefault(category, []).append(start + offset)
+                code = self._category_codes.setdefault(category, len(self._category_codes))
+                self._codes[start + offset] = code
+            for category, rows in positions.items():
+                existing = self._category_rows.get(category, np.empty(0, dtype=np.int64))
+                self._category_rows[category] = np.concatenate(
+                    [existing, np.asarray(rows, dtype=np.int64)]
+                )
+            self._size = end
+
+    def remove(self, ids: Sequence[int]) -> int:
+        """Tombstone rows by id; returns how many were present"""
+        with self._lock:
+            removed = 0
+            for entry_id in ids:
+                position = self._positions.pop(int(entry_id), None)
+                if position is not None:
+                    self._alive[position] = False
+                    removed += 1
+            self._removed += removed
+            return removed
+
+    def search(self,
+               query_embedding,
+               category: Optional[str] = None,
+               threshold: float = -1.0,
+               top_k: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Return (row id, cosine similarity) pairs above threshold, best first"""
+        with self._lock:
+            if self._size == 0:
+                return []
+            query = self.normalize(query_embedding)
+            if category is None:
+                positions = None
+                scores = self._matrix[:self._size] @ query
+            else:
+                positions = self._category_rows.get(category)
+                if positions is None:
+                    return []
+                if len(positions) * 4 > self._size:
+                    # Large categories: one contiguous product beats a gather.
+                    scores = (self._matrix[:self._size] @ query)[positions]
+                else:
+                    scores = self._matrix[positions] @ query
+            return self._select(scores, positions, threshold, top_k)
+
+    def search_positions(self,
+                         query_embedding,
+                         positions: np.ndarray,
+                         category: Optional[str] = None,
+                         threshold: float = -1.0,
+                         top_k: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Like search, but only scores the given candidate positions"""
+        with self._lock:
+            if category is not None:
+                code = self._category_codes.get(category)
+                if code is None:
+                    return []
+                positions = positions[self._codes[positions] == code]
+            if len(positions) == 0:
+                return []
+            scores = self._matrix[positions] @ self.normalize(query_embedding)
+            return self._select(scores, positions, threshold, top_k)
+
+    def vectors(self, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        with self._lock:
+            if positions is None:
+                return self._matrix[:self._size]
+            return self._matrix[positions]
+
+    def live_ids(self) -> List[int]:
+        """Ids of rows that have not been removed"""
+        with self._lock:
+            return list(self._positions)
+
+    def ids(self) -> np.ndarray:
+        with self._lock:
+            return self._ids[:self._size]
+
+    def _select(self, scores: np.ndarray, positions: Optional[np.ndarray],
+                threshold: float, top_k: Optional[int]) -> List[Tuple[int, float]]:
+        keep = scores >= threshold
+        if self._removed:
+            keep &= self._alive[:self._size] if positions is None else self._alive[positions]
+        candidates = np.flatnonzero(keep)
+        if top_k is not None and top_k < len(candidates):
+            best = np.argpartition(-scores[candidates], top_k - 1)[:top_k]
+            candidates = np.sort(candidates[best])
+        # Stable sort keeps insertion order among ties, like sorted() did.
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        rows = candidates if positions is None else positions[candidates]
+        return [(int(self._ids[row]), float(scores[c])) for row, c in zip(rows, candidates)]
+
+    def _reserve(self, size: int, dimension: int):
+        if self._matrix is None:
+            capacity = max(self._initial_capacity, size)
+            self._matrix = np.empty((capacity, dimension), dtype=np.float32)
+            self._ids = np.empty(capacity, dtype=np.int64)
+            self._codes = np.empty(capacity, dtype=np.int32)
+            self._alive = np.zeros(capacity, dtype=bool)
+            return
+        if dimension != self._matrix.shape[1]:
+            raise ValueError(
+                f"Embedding dimension mismatch: index has {self._matrix.shape[1]}, got {dimension}"
+            )
+        if size <= self._matrix.shape[0]:
+            return
+        capacity = max(size, self._matrix.shape[0] * 2)
+        matrix = np.empty((capacity, dimension), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.empty(capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        codes = np.empty(capacity, dtype=np.int32)
+        codes[:self._size] = self._codes[:self._size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._matrix, self._ids, self._codes, self._alive = matrix, ids, codes, alive
@@ -1,7 +1,13 @@
 from flask import Flask
 from flask_cors import CORS
 from api.routes import setup_routes
-from config.settings import HOST, PORT
+from agents.registry import AgentRegistry
+from core.session_store import create_session_store
+from core.job_queue import create_job_queue
+from config.settings import (
+    HOST, PORT, SESSION_STORE, SESSION_DB_PATH, SESSION_IDLE_TTL_SECONDS, SESSION_MAX_ENTRIES,
+    JOB_QUEUE_ENABLED
+)
 import logging
 
 # Configure logging
@@ -11,7 +17,18 @@ logger = logging.getLogger(__name__)
 def create_app():
     app = Flask(__name__)
     CORS(app)
-    setup_routes(app)
+
+    agents = AgentRegistry()
+    if JOB_QUEUE_ENABLED:
+        agents.attach_job_queue(create_job_queue())
+    sessions = create_session_store(
+        SESSION_STORE,
+        db_path=SESSION_DB_PATH,
+        idle_ttl_seconds=SESSION_IDLE_TTL_SECONDS,
+        max_sessions=SESSION_MAX_ENTRIES
+    )
+    agents.attach_session_store(sessions)
+    setup_routes(app, agents, sessions)
     
     return app
 
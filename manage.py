@@ -0,0 +1,139 @@
+import argparse
+import logging
+from config.settings import EMBEDDING_STORAGE_FORMAT, IVF_NLIST
+from core.embedding_codec import FORMATS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def migrate_embeddings(args):
+    from core.knowledge_base import KnowledgeBase
+
+    knowledge = KnowledgeBase(args.db)
+    try:
+        migrated = knowledge.migrate_embeddings(args.format, batch_size=args.batch_size)
+        logger.info(f"Migrated {migrated} embeddings to {args.format}")
+        if args.vacuum:
+            knowledge.storage.vacuum()
+            logger.info("Database vacuumed")
+    finally:
+        knowledge.close()
+
+def _load_ivf(args):
+    from core.knowledge_base import KnowledgeBase
+
+    # Passed in rather than set afterwards: loading may already train the index.
+    knowledge = KnowledgeBase(args.db, retrieval_engine="ivf", ivf_nlist=args.nlist)
+    knowledge._ensure_index()
+    return knowledge
+
+def ann_train(args):
+    knowledge = _load_ivf(args)
+    try:
+        knowledge.ann.train()
+    finally:
+        knowledge.close()
+
+def ann_report(args):
+    from core.ann_index import recall_at_k
+
+    knowledge = _load_ivf(args)
+    try:
+        ann = knowledge.ann
+        if not ann.is_trained or (args.nlist and len(ann.centroids) != min(args.nlist, len(ann.index))):
+            ann.train()
+        nprobes = [int(n) for n in args.nprobe.split(",")] if args.nprobe else None
+        for row in recall_at_k(knowledge.ann, k=args.k, num_queries=args.queries, nprobes=nprobes):
+            print(
+                f"nprobe={row['nprobe']:<4} recall@{args.k}={row['recall_at_k']:.3f} "
+                f"ann={row['ann_ms']:.2f}ms exact={row['exact_ms']:.2f}ms"
+            )
+    finally:
+        knowledge.close()
+
+def ingest(args):
+    from core.knowledge_base import KnowledgeBase
+    from core.ingestion import iter_jsonl
+
+    def report(stats):
+        logger.info(
+            f"{stats['received']} read, {stats['inserted']} inserted, {stats['skipped']} skipped "
+            f"({stats['rate']:.0f} entries/s)"
+        )
+
+    knowledge = KnowledgeBase(args.db)
+    try:
+        with open(args.path, encoding="utf-8") as handle:
+            entries = iter_jsonl(handle, source=args.path)
+            if args.category:
+                entries = ({**entry, "category": entry.get("category") or args.category} for entry in entries)
+            stats = knowledge.add_knowledge_batch(entries, chunk_size=args.chunk_size, progress=report)
+        logger.info(f"Done in {stats['seconds']:.1f}s")
+    finally:
+        knowledge.close()
+
+def ingest_documents(args):
+    from core.knowledge_base import KnowledgeBase
+    from core.ingestion import DocumentIngestor, iter_jsonl
+
+    def report(stats):
+        logger.info(
+            f"{stats['documents']} documents, {stats['chunks']} chunks: {stats['embedded']} embedded, "
+            f"{stats['unchanged']} unchanged, {stats['deleted']} deleted"
+        )
+
+    knowledge = KnowledgeBase(args.db)
+    try:
+        ingestor = DocumentIngestor(
+            knowledge, chunk_size=args.chunk_size, overlap=args.overlap, batch_size=args.batch_size
+        )
+        with open(args.path, encoding="utf-8") as handle:
+            stats = ingestor.ingest(iter_jsonl(handle, source=args.path), progress=report)
+        logger.info(f"Done in {stats['seconds']:.1f}s")
+    finally:
+        knowledge.close()
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="AI agent maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate-embeddings", help="Rewrite stored embeddings into a binary format")
+    migrate.add_argument("--db", default="knowledge.db")
+    migrate.add_argument("--format", default=EMBEDDING_STORAGE_FORMAT, choices=sorted(FORMATS))
+    migrate.add_argument("--batch-size", type=int, default=500)
+    migrate.add_argument("--vacuum", action="store_true", help="Reclaim freed space after migrating")
+    migrate.set_defaults(handler=migrate_embeddings)
+
+    load = commands.add_parser("ingest", help="Bulk load knowledge entries from a JSON Lines file")
+    load.add_argument("path", help="File with one {category, content, metadata} object per line")
+    load.add_argument("--db", default="knowledge.db")
+    load.add_argument("--category", help="Category for lines that don't set one")
+    load.add_argument("--chunk-size", type=int, default=256)
+    load.set_defaults(handler=ingest)
+
+    docs = commands.add_parser("ingest-documents", help="Chunk and (re-)index whole documents from a JSON Lines file")
+    docs.add_argument("path", help="File with one {document_id, category, content, metadata} object per line")
+    docs.add_argument("--db", default="knowledge.db")
+    docs.add_argument("--chunk-size", type=int, default=1000, help="Maximum characters per chunk")
+    docs.add_argument("--overlap", type=int, default=150, help="Characters shared by consecutive chunks")
+    docs.add_argument("--batch-size", type=int, default=256, help="New chunks per embeddings call")
+    docs.set_defaults(handler=ingest_documents)
+
+    train = commands.add_parser("ann-train", help="(Re)train the IVF index stored next to the database")
+    train.add_argument("--db", default="knowledge.db")
+    train.add_argument("--nlist", type=int, default=IVF_NLIST, help="Lists to train; 0 picks ~4*sqrt(rows)")
+    train.set_defaults(handler=ann_train)
+
+    report = commands.add_parser("ann-report", help="Measure IVF recall@k against the exact scan")
+    report.add_argument("--db", default="knowledge.db")
+    report.add_argument("--nlist", type=int, default=IVF_NLIST, help="Retrain with this many lists if the index differs")
+    report.add_argument("--k", type=int, default=10)
+    report.add_argument("--queries", type=int, default=200)
+    report.add_argument("--nprobe", help="Comma-separated nprobe values to compare, e.g. 1,4,16")
+    report.set_defaults(handler=ann_report)
+
+    return parser
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    args.handler(args)
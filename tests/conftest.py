@@ -0,0 +1,16 @@
+import pytest
+from core.knowledge_base import KnowledgeBase
+from core.llm import FakeProvider, set_provider
+
+@pytest.fixture
+def llm():
+    provider = FakeProvider(latency=0, token_delay=0, embedding_latency=0, dimensions=64)
+    set_provider(provider)
+    yield provider
+    set_provider(None)
+
+@pytest.fixture
+def knowledge(tmp_path, llm):
+    kb = KnowledgeBase(str(tmp_path / "knowledge.db"), llm=llm)
+    yield kb
+    kb.close()
@@ -0,0 +1,20 @@
+import pytest
+from core.action_registry import ActionRegistry, ActionValidationError
+
+def save_lead(name, email):
+    return f"{name} <{email}>"
+
+def test_execute_validates_parameters():
+    registry = ActionRegistry()
+    registry.register("save_lead", save_lead)
+    assert registry.execute("save_lead", name="Bob", email="bob@example.com") == "Bob <bob@example.com>"
+    with pytest.raises(ActionValidationError):
+        registry.execute("save_lead", name="Bob")
+    registry.shutdown()
+
+def test_execute_many_reports_invalid_calls():
+    registry = ActionRegistry()
+    registry.register("save_lead", save_lead)
+    results = registry.execute_many([("save_lead", {"name": "Bob"}), ("missing", {})])
+    assert [result["status"] for result in results] == ["invalid", "unknown"]
+    registry.shutdown()
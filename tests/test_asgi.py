@@ -0,0 +1,77 @@
+import pytest
+from agents.registry import AgentRegistry
+from core.metrics import MESSAGE_SECONDS
+from core.session_store import create_session_store
+from config.settings import AGENT_DEFINITIONS_DIR
+
+pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient
+from api.asgi import create_asgi_app
+
+@pytest.fixture
+def client(knowledge):
+    registry = AgentRegistry(knowledge, factories={}, definitions_dir=AGENT_DEFINITIONS_DIR)
+    with TestClient(create_asgi_app(registry, create_session_store("memory"))) as client:
+        yield client
+    registry.reload()
+
+def test_stream_message(client):
+    observed = MESSAGE_SECONDS.count(agent_type="sales")
+    session_id = client.post("/api/v1/conversation/start", json={"agent_type": "sales"}).json()["session_id"]
+    response = client.post("/api/v1/conversation/message/stream",
+                           json={"session_id": session_id, "message": "hello"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "event: delta" in response.text
+    assert response.text.rstrip().split("\n\n")[-1].startswith("event: done")
+    assert MESSAGE_SECONDS.count(agent_type="sales") == observed + 1
+
+def test_stream_message_unknown_session(client):
+    response = client.post("/api/v1/conversation/message/stream",
+                           json={"session_id": "missing", "message": "hello"})
+    assert response.status_code == 404
+
+def test_ingest_documents(client):
+    document = {"document_id": "pricing", "category": "sales", "content": "Plans start at $10 a month."}
+    response = client.post("/api/v1/knowledge/documents", json=document)
+    assert response.status_code == 200
+    assert response.json()["documents"] == 1
+
+    lines = "\n".join([
+        '{"document_id": "pricing", "category": "sales", "content": "Plans start at $10 a month."}',
+        '{"document_id": "support", "category": "sales", "content": "Support is open 9 to 5."}'
+    ])
+    response = client.post("/api/v1/knowledge/documents", content=lines,
+                           headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.json()["documents"] == 2
+    assert response.json()["unchanged"] == 1
+
+def test_ingest_documents_rejects_incomplete_document(client):
+    response = client.post("/api/v1/knowledge/documents", json={"content": "no id"})
+    assert response.status_code == 400
+
+def test_add_knowledge_batch_jsonl(client, knowledge):
+    lines = "\n".join([
+        '{"category": "sales", "content": "Plans start at $10 a month."}',
+        '{"category": "sales", "content": "Support is open 9 to 5."}',
+        '{"category": "sales", "content": "Plans start at $10 a month."}'
+    ])
+    chunks = (lines[start:start + 16].encode() for start in range(0, len(lines), 16))  # split mid-line
+    response = client.post("/api/v1/knowledge/batch?chunk_size=2", content=chunks,
+                           headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.json()["received"] == 3
+    assert response.json()["inserted"] == 2
+
+    response = client.post("/api/v1/knowledge/batch",
+                           json={"entries": [{"category": "sales", "content": "Demos run on Fridays."}]})
+    assert response.status_code == 200
+    assert response.json()["inserted"] == 1
+
+def test_add_knowledge_batch_rejects_bad_input(client):
+    response = client.post("/api/v1/knowledge/batch", content='{"category": "sales"}\nnot json',
+                           headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 400
+    response = client.post("/api/v1/knowledge/batch", json={"entries": [{"category": "sales"}]})
+    assert response.status_code == 400
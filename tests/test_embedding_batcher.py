@@ -0,0 +1,57 @@
+import pytest
+from core.embedding_batcher import EmbeddingBatcher
+from core.llm import FakeProvider
+
+class RecordingProvider(FakeProvider):
+    """Records each batch sent to the embeddings API; fails every call when `error` is set"""
+
+    def __init__(self, error=None):
+        super().__init__(latency=0, token_delay=0, embedding_latency=0, dimensions=8)
+        self.error = error
+        self.batches = []
+
+    def _embed(self, texts, model, timeout):
+        self.batches.append(list(texts))
+        if self.error is not None:
+            raise self.error
+        return super()._embed(texts, model, timeout)
+
+def _batcher(llm, **options):
+    options.setdefault("window_ms", 200)  # long enough for every submit below to join
+    return EmbeddingBatcher(llm, **options)
+
+def test_identical_texts_share_one_request():
+    llm = RecordingProvider()
+    batcher = _batcher(llm)
+    futures = [batcher.submit(text) for text in ("pricing", "support", "pricing", "pricing")]
+    vectors = [future.result(5) for future in futures]
+    batcher.close()
+
+    assert llm.batches == [["pricing", "support"]]
+    assert vectors[0] == vectors[2] == vectors[3] == llm.embed(["pricing"])[0]
+    assert vectors[1] == llm.embed(["support"])[0]
+    assert batcher.stats["coalesced"] == 2
+
+def test_batches_are_split_at_max_batch_size():
+    llm = RecordingProvider()
+    batcher = _batcher(llm, max_batch_size=2)
+    texts = [f"text {number}" for number in range(5)]
+    futures = [batcher.submit(text) for text in texts]
+    vectors = [future.result(5) for future in futures]
+    batcher.close()
+
+    assert sorted(len(batch) for batch in llm.batches) == [1, 2, 2]
+    assert sorted(text for batch in llm.batches for text in batch) == texts
+    assert vectors == llm.embed(texts)
+
+def test_failed_batch_raises_to_every_waiting_caller():
+    error = TimeoutError("embeddings timed out")
+    llm = RecordingProvider(error=error)
+    batcher = _batcher(llm)
+    futures = [batcher.submit(text) for text in ("pricing", "support", "pricing")]
+    for future in futures:
+        with pytest.raises(TimeoutError) as raised:
+            future.result(5)
+        assert raised.value is error
+    batcher.close()
+    assert len(llm.batches) == 1
@@ -0,0 +1,29 @@
+import time
+from core.embedding_cache import EmbeddingCache, cache_key
+from core.storage import SQLiteStorage
+
+def _last_used(storage, model, text):
+    with storage.reader() as conn:
+        return conn.execute(
+            "SELECT last_used FROM embedding_cache WHERE key = ?", (cache_key(model, text),)
+        ).fetchone()[0]
+
+def test_disk_hits_batch_their_last_use(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "knowledge.db"))
+    cache = EmbeddingCache(storage, memory_size=0, touch_batch=2)
+    cache.put("model", "hello", [0.5, 0.25])
+    written = _last_used(storage, "model", "hello")
+    time.sleep(0.01)
+
+    assert cache.get("model", "Hello ") == [0.5, 0.25]
+    assert cache.stats["disk_hits"] == 1
+    assert _last_used(storage, "model", "hello") == written  # noted, not written
+
+    cache.put("model", "other", [1.0, 0.0])
+    assert _last_used(storage, "model", "hello") > written
+
+    cache.close()
+    storage.close()
+
+def test_knowledge_base_shares_its_storage(knowledge):
+    assert knowledge.embedding_cache.storage is knowledge.storage
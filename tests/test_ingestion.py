@@ -0,0 +1,46 @@
+from core.ingestion import DocumentIngestor, chunk_text
+from core.knowledge_base import content_hash
+
+PRICING = "Plans start at $10 a month."
+SUPPORT = "Support is open 9 to 5 on weekdays."
+DEMOS = "Demos run every Friday afternoon."
+
+def _document(*paragraphs):
+    return {"document_id": "handbook", "category": "sales", "content": "\n\n".join(paragraphs)}
+
+def test_editing_one_paragraph_re_embeds_only_its_chunk(knowledge):
+    ingestor = DocumentIngestor(knowledge)
+    stats = ingestor.ingest([_document(PRICING, SUPPORT, DEMOS)])
+    assert (stats["chunks"], stats["embedded"]) == (3, 3)
+
+    edited = "Plans now start at $12 a month."
+    stats = ingestor.ingest([_document(edited, SUPPORT, DEMOS)])
+    assert stats["embedded"] == 1
+    assert stats["unchanged"] == 2
+    assert stats["deleted"] == 1
+
+    chunks = knowledge.get_document_chunks("handbook")
+    assert [chunk["content_hash"] for chunk in chunks] == [content_hash(text) for text in (edited, SUPPORT, DEMOS)]
+    contents = [entry["content"] for entry in knowledge.query_knowledge(PRICING, "sales", top_k=10)]
+    assert PRICING not in contents
+
+def test_reordered_paragraphs_are_renumbered_not_re_embedded(knowledge):
+    ingestor = DocumentIngestor(knowledge)
+    ingestor.ingest([_document(PRICING, SUPPORT)])
+    stats = ingestor.ingest([_document(SUPPORT, PRICING)])
+    assert (stats["embedded"], stats["unchanged"], stats["deleted"]) == (0, 2, 0)
+    chunks = knowledge.get_document_chunks("handbook")
+    assert [chunk["content_hash"] for chunk in chunks] == [content_hash(SUPPORT), content_hash(PRICING)]
+
+def test_long_paragraph_chunks_overlap():
+    sentences = [f"Sentence number {number} is here." for number in range(12)]
+    chunks = chunk_text(" ".join(sentences), chunk_size=120, overlap=40)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 120 for chunk in chunks)
+    for previous, current in zip(chunks, chunks[1:]):
+        carried = previous.split(". ")[-1]
+        assert current.startswith(carried.rstrip("."))
+    assert " ".join(sentences).endswith(chunks[-1])
+
+def test_paragraphs_are_chunk_boundaries():
+    assert chunk_text(f"{PRICING}\n\n{SUPPORT}", chunk_size=1000) == [PRICING, SUPPORT]
@@ -0,0 +1,69 @@
+import threading
+import time
+from agents.registry import AgentRegistry
+from core.context import ConversationContext
+from core.job_queue import JobQueue
+from config.settings import AGENT_DEFINITIONS_DIR
+
+def test_same_action_in_two_sessions_is_not_deduplicated(tmp_path, knowledge):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    registry = AgentRegistry(knowledge, factories={}, definitions_dir=AGENT_DEFINITIONS_DIR)
+    registry.attach_job_queue(queue)
+    agent = registry.get("sales")
+    agent.action_registry.defer_all = True
+    reply = {"actions": [{"name": "schedule_demo", "parameters": {"date": "2026-11-02", "time": "10:00"}}]}
+
+    first = ConversationContext("alice", "session-a", "agent")
+    second = ConversationContext("bob", "session-b", "agent")
+    agent._handle_actions(reply, first)
+    agent._handle_actions(reply, second)
+    agent._handle_actions(reply, first)  # the same turn replayed
+    first.add_message("user", "and again next week")
+    agent._handle_actions(reply, first)
+
+    assert queue.stats["enqueued"] == 3
+    assert queue.stats["duplicates"] == 1
+    registry.reload()
+    queue.close()
+
+def test_short_lived_threads_share_connections(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    threads = [threading.Thread(target=queue.enqueue, args=("noop", {"n": n})) for n in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert queue.counts() == {"pending": 50}
+    assert len(queue.storage._opened) <= 1 + queue.storage.readers
+    queue.close()
+
+def test_expired_lease_is_retried_while_running(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"), workers=1, poll_interval=0.02, lease_seconds=0.2)
+    handled = []
+    queue.register_handler("noop", handled.extend)
+    queue.enqueue("noop", {"n": 1})
+    assert len(queue._claim()) == 1  # claimed by a worker that then dies
+
+    queue.start()
+    deadline = time.monotonic() + 5
+    while not handled and time.monotonic() < deadline:
+        time.sleep(0.02)
+    queue.drain()
+
+    assert handled == [{"n": 1}]
+    assert queue.counts() == {"done": 1}
+    queue.close()
+
+def test_collected_field_can_change_back(tmp_path, knowledge):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    knowledge.attach_job_queue(queue)
+    for turn, value in enumerate(["a@example.com", "b@example.com", "a@example.com"]):
+        knowledge.save_collected_data("user", "email", value, "sales", {"session_id": "s", "turn": turn})
+    knowledge.save_collected_data("user", "email", "a@example.com", "sales", {"session_id": "s", "turn": 2})
+
+    assert queue.stats["enqueued"] == 3
+    assert queue.stats["duplicates"] == 1
+    queue.run_once()
+    assert knowledge.get_collected_data("user", "sales") == {"email": "a@example.com"}
+    queue.close()
@@ -0,0 +1,35 @@
+from core.knowledge_base import KnowledgeBase
+from config.settings import EMBEDDING_TIMEOUT_SECONDS
+
+def _ids(results):
+    return [entry_id for entry_id, _ in results]
+
+def test_vector_search_sees_rows_written_by_another_instance(tmp_path, llm, knowledge):
+    knowledge.add_knowledge("sales", "Plans start at $10 a month.")
+    query = knowledge.embed_query("Support is open 9 to 5.")
+    assert len(knowledge.vector_search(query, threshold=-1.0)) == 1  # index loaded
+
+    other = KnowledgeBase(str(tmp_path / "knowledge.db"), llm=llm)
+    try:
+        entry_id = other.add_knowledge("sales", "Support is open 9 to 5.")
+        assert _ids(knowledge.vector_search(query, threshold=0.99)) == [entry_id]
+
+        other.apply_chunk_changes([], [], [entry_id])
+        assert _ids(knowledge.vector_search(query, threshold=0.99)) == []
+    finally:
+        other.close()
+
+def test_query_deadline_applies_only_with_a_lexical_fallback(monkeypatch, llm, knowledge):
+    calls = []
+    embed = llm.embed
+
+    def recording_embed(texts, model, timeout=None, retries=None):
+        calls.append((timeout, retries))
+        return embed(texts, model, timeout=timeout, retries=retries)
+
+    monkeypatch.setattr(llm, "embed", recording_embed)
+    knowledge.lexical_enabled = True
+    knowledge.embed_query("what does it cost?")
+    knowledge.lexical_enabled = False
+    knowledge.embed_query("when is support open?")
+    assert calls == [(EMBEDDING_TIMEOUT_SECONDS, 0), (None, None)]
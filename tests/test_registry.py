@@ -0,0 +1,38 @@
+import os
+import shutil
+from agents.registry import AgentRegistry
+from core.context import ConversationContext
+from config.settings import AGENT_DEFINITIONS_DIR
+
+def _registry(tmp_path, knowledge):
+    shutil.copy(os.path.join(AGENT_DEFINITIONS_DIR, "sales.json"), tmp_path / "sales.json")
+    return AgentRegistry(knowledge, factories={}, definitions_dir=str(tmp_path), reload_interval=0)
+
+def _touch(path):
+    mtime = os.path.getmtime(path) + 10
+    os.utime(path, (mtime, mtime))
+
+def test_replaced_agent_is_closed_after_its_last_lease(tmp_path, knowledge):
+    registry = _registry(tmp_path, knowledge)
+    closed = []
+
+    with registry.lease("sales") as old:
+        old.close = lambda: closed.append(old)
+        _touch(tmp_path / "sales.json")
+        assert registry.get("sales") is not old
+        assert closed == []
+        response = old.process_message("hello", ConversationContext("user", "session", "sales"))
+        assert response["response"]
+
+    assert closed == [old]
+    registry.reload()
+
+def test_unleased_agent_is_closed_when_replaced(tmp_path, knowledge):
+    registry = _registry(tmp_path, knowledge)
+    old = registry.get("sales")
+    closed = []
+    old.close = lambda: closed.append(old)
+    _touch(tmp_path / "sales.json")
+    registry.get("sales")
+    assert closed == [old]
+    registry.reload()
@@ -0,0 +1,73 @@
+import json
+import pytest
+from core.action_registry import ActionRegistry
+from core.agent import Agent
+from core.context import ConversationContext
+from core.llm import FakeProvider
+from core.prompt_engine import PromptEngine
+from core.response_cache import ResponseCache
+
+class ScriptedProvider(FakeProvider):
+    """Answers every chat with `reply`, formatted with the user's collected info"""
+
+    def __init__(self, reply: str):
+        super().__init__(latency=0, token_delay=0, embedding_latency=0, dimensions=64)
+        self.reply = reply
+        self.chats = 0
+
+    def _chat(self, messages, model, max_tokens, temperature, timeout):
+        self.chats += 1
+        collected = json.loads(messages[-1]["content"])["context"]["collected_information"]
+        return json.dumps({
+            "response": self.reply.format(**collected),
+            "actions": [],
+            "required_information": [],
+            "next_state": "initial",
+            "confidence": 0.9
+        })
+
+def make_agent(knowledge, reply):
+    provider = ScriptedProvider(reply)
+    prompt_engine = PromptEngine()
+    prompt_engine.register_system_prompt("sales", "You are a sales agent.")
+    agent = Agent(knowledge, ActionRegistry(), prompt_engine, "sales",
+                  response_cache=ResponseCache(), llm=provider)
+    return agent, provider
+
+def conversation(user_id, name):
+    context = ConversationContext(user_id, f"session-{user_id}", "sales")
+    context.update_collected_info("name", name)
+    return context
+
+@pytest.fixture
+def knowledge(knowledge):
+    knowledge.add_knowledge("sales", "Plans start at $10 a month.")
+    return knowledge
+
+def test_generic_reply_is_shared_across_users(knowledge):
+    agent, provider = make_agent(knowledge, "Plans start at $10 a month.")
+    agent.process_message("what does it cost?", conversation("alice", "Alice"))
+    agent.process_message("what does it cost?", conversation("bob", "Bob"))
+    assert provider.chats == 1
+    agent.close()
+
+def test_reply_naming_the_user_is_not_served_to_another(knowledge):
+    agent, provider = make_agent(knowledge, "Hi {name}, plans start at $10.")
+    agent.process_message("what does it cost?", conversation("alice", "Alice"))
+    reply = agent.process_message("what does it cost?", conversation("bob", "Bob"))
+    assert provider.chats == 2
+    assert reply["response"] == "Hi Bob, plans start at $10."
+
+    again = agent.process_message("what does it cost?", conversation("carol", "Alice"))
+    assert provider.chats == 2
+    assert again["response"] == "Hi Alice, plans start at $10."
+    agent.close()
+
+def test_add_knowledge_invalidates_cached_replies(knowledge):
+    agent, provider = make_agent(knowledge, "Plans start at $10 a month.")
+    agent.process_message("what does it cost?", conversation("alice", "Alice"))
+    knowledge.add_knowledge("sales", "Plans now start at $12 a month.")
+    agent.process_message("what does it cost?", conversation("bob", "Bob"))
+    assert provider.chats == 2
+    assert agent.response_cache.stats["invalidations"] >= 1
+    agent.close()
@@ -0,0 +1,80 @@
+import json
+import os
+import pytest
+from core.response_parser import (
+    JSONResponseParser, ResponseParseError, IncrementalResponseExtractor, extract_json_object
+)
+
+def test_null_next_state_is_treated_as_absent():
+    parsed = JSONResponseParser().parse(json.dumps({
+        "response": "Hello", "actions": None, "next_state": None, "confidence": 0.8
+    }))
+    assert "next_state" not in parsed
+    assert parsed["actions"] == []
+    assert parsed["response"] == "Hello"
+
+def test_null_is_still_rejected_when_strict():
+    with pytest.raises(ResponseParseError):
+        JSONResponseParser(repair=False).parse('{"response": "Hello", "next_state": null}')
+
+def test_null_response_still_fails():
+    with pytest.raises(ResponseParseError):
+        JSONResponseParser().parse('{"response": null}')
+
+def _stream(document: str, size: int) -> str:
+    extractor = IncrementalResponseExtractor()
+    return "".join(extractor.feed(document[start:start + size]) for start in range(0, len(document), size))
+
+@pytest.mark.parametrize("size", [1, 3, 1000])
+def test_malformed_unicode_escape_does_not_abort_the_stream(size):
+    document = '{"response": "bad \\uZZZZ then \\u00e9 and \\ud83d\\ude00 end", "actions": []}'
+    assert _stream(document, size) == "bad \ufffdZZZZ then \u00e9 and \U0001f600 end"
+
+def test_unpaired_surrogate_is_replaced():
+    document = '{"response": "lone \\ud83d here"}'
+    assert _stream(document, 1000) == "lone \ufffd here"
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "parser_corpus.jsonl")
+
+def _corpus():
+    with open(CORPUS, encoding="utf-8") as corpus:
+        return {case["name"]: case["raw"] for case in map(json.loads, corpus)}
+
+RESPONSE = "Our premium plan is $49/month and includes priority support. Could I get your email to send details?"
+ACTIONS = [{"type": "save_lead", "data": {"name": "Dana", "company": "Acme"}}]
+COMPLETE = {"response": RESPONSE, "actions": ACTIONS, "required_information": ["email", "budget"],
+            "next_state": "qualification", "confidence": 0.86}
+
+@pytest.mark.parametrize("name", [
+    "json_fence", "bare_fence", "leading_prose", "trailing_prose", "prose_with_braces", "two_objects",
+    "trailing_comma_object", "trailing_comma_array", "missing_final_brace"
+])
+def test_extract_recovers_the_whole_object(name):
+    assert extract_json_object(_corpus()[name]) == COMPLETE
+
+@pytest.mark.parametrize("name, expected", [
+    # a truncated response string is closed
+    ("mid_response", {"response": "Our premium plan is $49/month and includes pri"}),
+    ("fenced_mid_response", {"response": RESPONSE[:RESPONSE.index(" Co") + 3]}),
+    ("split_unicode_escape", {"response": "Caf"}),
+    # anything else cut off is dropped back to the last complete member
+    ("after_response", {"response": RESPONSE}),
+    ("mid_action", {"response": RESPONSE}),
+    ("mid_required_information", {"response": RESPONSE, "actions": ACTIONS}),
+    ("mid_next_state", {"response": RESPONSE, "actions": ACTIONS, "required_information": ["email", "budget"]}),
+    ("before_confidence", {key: value for key, value in COMPLETE.items() if key != "confidence"}),
+])
+def test_extract_cuts_truncated_output_back(name, expected):
+    assert extract_json_object(_corpus()[name]) == expected
+
+@pytest.mark.parametrize("name", ["plain_text", "truncated_before_response", "single_quotes", "empty"])
+def test_extract_gives_up_on_unrecoverable_output(name):
+    assert extract_json_object(_corpus()[name]) is None
+
+def test_parse_drops_a_truncated_state_but_keeps_the_reply():
+    raw = _corpus()["mid_next_state"]
+    parsed = JSONResponseParser().parse(raw)
+    assert parsed["response"] == RESPONSE
+    assert parsed["actions"] == ACTIONS
+    assert "next_state" not in parsed  # the agent keeps its current state
+    assert parsed["confidence"] == 0.0
@@ -0,0 +1,93 @@
+import asyncio
+import json
+import os
+import threading
+import pytest
+from agents.loader import AgentDefinition
+from core.context import ConversationContext
+from core.llm import FakeProvider
+from config.settings import AGENT_DEFINITIONS_DIR
+
+class ProposingProvider(FakeProvider):
+    """Moves to the first allowed state other than the current one when asked for a demo"""
+
+    def __init__(self, **options):
+        super().__init__(latency=0, token_delay=0, embedding_latency=0, dimensions=64, **options)
+        self.prompts = []
+
+    def _complete(self, messages, model):
+        prompt = json.loads(messages[-1]["content"])
+        self.prompts.append(prompt)
+        context = prompt["context"]
+        next_state = context["current_state"]
+        if "demo" in prompt["user_message"]:
+            next_state = next(state for state in context["allowed_next_states"] if state != next_state)
+        return json.dumps({"response": "ok", "actions": [], "required_information": [],
+                           "next_state": next_state, "confidence": 0.9})
+
+@pytest.fixture
+def sales(knowledge):
+    agent = AgentDefinition.load(os.path.join(AGENT_DEFINITIONS_DIR, "sales.json")).build(knowledge)
+    agent.llm = ProposingProvider()
+    yield agent
+    agent.close()
+
+def test_sales_flow_reaches_qualified(sales):
+    context = ConversationContext("user", "session", "agent")
+
+    sales.process_message("Hi, I'd like a demo of the product", context)
+    assert sales.llm.prompts[-1]["context"]["allowed_next_states"] == ["initial", "qualifying"]
+    assert context.current_state == "qualifying"
+    assert context.required_info == ["name", "email"]
+
+    sales.process_message("Sure, my name is Bob", context)
+    assert context.collected_info == {"name": "Bob"}
+    assert sales.llm.prompts[-1]["context"]["missing_information"] == ["email"]
+    assert context.current_state == "qualifying"
+
+    calls = len(sales.llm.prompts)
+    response = sales.process_message("It's bob@example.com", context)
+    assert len(sales.llm.prompts) == calls  # answered locally
+    assert context.current_state == "qualified"
+    assert response["response"].startswith("Thanks Bob!")
+    assert response["actions"] == [
+        {"name": "save_lead", "parameters": {"name": "Bob", "email": "bob@example.com"}}
+    ]
+
+def test_undeclared_transition_is_rejected(sales):
+    context = ConversationContext("user", "session", "agent", current_state="qualified")
+    sales._update_context("hello", {"response": "ok", "next_state": "initial"}, context)
+    assert context.current_state == "qualified"
+    sales._update_context("hello", {"response": "ok", "next_state": "no_such_state"}, context)
+    assert context.current_state == "qualified"
+
+def test_prompt_lists_allowed_states(sales):
+    context = ConversationContext("user", "session", "agent", current_state="qualified")
+    prompt = json.loads(sales.prompt_engine.build_prompt("sales", "hi", context, []))
+    assert prompt["context"]["allowed_next_states"] == ["demo_scheduled", "qualified"]
+    assert "allowed_next_states" in prompt["response_format"]["next_state"]
+
+def test_async_flow_writes_off_the_event_loop(sales, monkeypatch):
+    loop_threads, write_threads = [], []
+    save = sales.knowledge.save_collected_data
+
+    def recording_save(*args, **kwargs):
+        write_threads.append(threading.get_ident())
+        return save(*args, **kwargs)
+
+    monkeypatch.setattr(sales.knowledge, "save_collected_data", recording_save)
+    context = ConversationContext("user", "session", "agent", current_state="qualifying")
+
+    async def converse():
+        loop_threads.append(threading.get_ident())
+        await sales.aprocess_message("Sure, my name is Bob", context)
+        return await sales.aprocess_message("It's bob@example.com", context)
+
+    response = asyncio.run(converse())
+    assert context.current_state == "qualified"
+    assert response["response"].startswith("Thanks Bob!")
+    assert len(write_threads) == 2 and loop_threads[0] not in write_threads
+
+@pytest.mark.parametrize("proposed", [None, "", "retired_state", "no_such_state"])
+def test_undeclared_current_state_falls_back_to_initial(sales, proposed):
+    assert sales.state_machine.accept("retired_state", proposed) == sales.state_machine.initial
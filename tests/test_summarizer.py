@@ -0,0 +1,53 @@
+import os
+from agents.loader import AgentDefinition
+from core.context import ConversationContext
+from core.session_store import SQLiteSessionStore
+from core.summarizer import ConversationSummarizer
+from config.settings import AGENT_DEFINITIONS_DIR
+
+def _context(messages: int) -> ConversationContext:
+    context = ConversationContext("user", "session", "agent")
+    for number in range(messages):
+        context.add_message("user" if number % 2 == 0 else "assistant", f"message {number}")
+    return context
+
+def test_schedule_after_close_is_a_no_op(llm):
+    summarizer = ConversationSummarizer(llm, every=2, keep_recent=2)
+    summarizer.close()
+    context = _context(10)
+    assert summarizer.schedule(context) is False
+    assert summarizer._running == set()
+    assert summarizer.stats["scheduled"] == 0
+
+def test_failed_submit_releases_the_session(llm):
+    summarizer = ConversationSummarizer(llm, every=2, keep_recent=2)
+    summarizer._pool.shutdown()  # the pool goes away between the check and the submit
+    context = _context(10)
+    assert summarizer.schedule(context) is False
+    assert summarizer._running == set()
+
+def test_closed_agent_still_answers(knowledge):
+    agent = AgentDefinition.load(os.path.join(AGENT_DEFINITIONS_DIR, "sales.json")).build(knowledge)
+    agent.summarizer = ConversationSummarizer(agent.llm, every=2, keep_recent=2)
+    agent.close()
+
+    context = _context(10)
+    response = agent.process_message("hello", context)
+    assert response["response"]
+
+def test_archived_messages_are_summarized_and_saved_with_the_session(llm, tmp_path):
+    sessions = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    sessions.save(_context(30))  # ten messages leave the window for the archive
+    context = sessions.get("session")
+    assert context.conversation_history.archived_count == 10
+
+    summarizer = ConversationSummarizer(llm, every=2, keep_recent=2, sessions=sessions)
+    summarized = []
+    summarizer.summarize = lambda summary, messages: summarized.extend(messages) or "summary"
+    assert summarizer.schedule(context)
+    summarizer._pool.shutdown(wait=True)
+
+    assert [message.content for message in summarized] == [f"message {number}" for number in range(28)]
+    sessions.save(context)  # a request still holding the copy from before the summary
+    stored = sessions.get("session")
+    assert (stored.summary, stored.summarized_count) == ("summary", 28)
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from core.vector_index import VectorIndex
+
+def _cosine(a, b):
+    # The per-row scan KnowledgeBase.query_knowledge used before the index.
+    dot = sum(x * y for x, y in zip(a, b))
+    return dot / ((sum(x * x for x in a) ** 0.5) * (sum(y * y for y in b) ** 0.5))
+
+def _scan(rows, query, category, threshold):
+    results = [(entry_id, _cosine(query, vector)) for entry_id, row_category, vector in rows
+               if category is None or row_category == category]
+    results = [(entry_id, score) for entry_id, score in results if score >= threshold]
+    return sorted(results, key=lambda result: result[1], reverse=True)
+
+@pytest.fixture
+def rows():
+    rng = np.random.default_rng(7)
+    rows = [(entry_id, ["sales", "support", "billing"][entry_id % 3], list(rng.normal(size=16)))
+            for entry_id in range(1, 301)]
+    # Ties: the same direction at different magnitudes, in two categories.
+    rows += [(301, "sales", [1.0] * 16), (302, "support", [2.0] * 16), (303, "sales", [0.5] * 16)]
+    return rows
+
+def _index(rows):
+    index = VectorIndex(initial_capacity=8)
+    for start in range(0, len(rows), 50):  # several adds, so the matrix grows
+        batch = rows[start:start + 50]
+        index.add([row[0] for row in batch], [row[1] for row in batch], [row[2] for row in batch])
+    return index
+
+def _assert_same(actual, expected):
+    assert [entry_id for entry_id, _ in actual] == [entry_id for entry_id, _ in expected]
+    assert [score for _, score in actual] == pytest.approx([score for _, score in expected], abs=1e-5)
+
+@pytest.mark.parametrize("category", [None, "sales", "support", "missing"])
+@pytest.mark.parametrize("threshold", [-1.0, 0.0, 0.3, 0.99])
+def test_search_matches_the_baseline_scan(rows, category, threshold):
+    index = _index(rows)
+    rng = np.random.default_rng(11)
+    for query in [list(rng.normal(size=16)) for _ in range(5)] + [[1.0] * 16]:
+        _assert_same(index.search(query, category=category, threshold=threshold),
+                     _scan(rows, query, category, threshold))
+
+def test_ties_keep_insertion_order(rows):
+    results = _index(rows).search([3.0] * 16, threshold=0.99)
+    assert [entry_id for entry_id, _ in results] == [301, 302, 303]
+
+def test_removed_rows_are_not_returned(rows):
+    index = _index(rows)
+    removed = {entry_id for entry_id, _, _ in rows if entry_id % 7 == 0} | {302}
+    assert index.remove(sorted(removed)) == len(removed)
+    remaining = [row for row in rows if row[0] not in removed]
+    query = [1.0] * 16
+    for category in (None, "support"):
+        _assert_same(index.search(query, category=category), _scan(remaining, query, category, -1.0))
+    assert sorted(index.live_ids()) == [row[0] for row in remaining]
+
+def test_top_k_is_a_prefix_of_the_full_ranking(rows):
+    index = _index(rows)
+    query = list(np.random.default_rng(3).normal(size=16))
+    assert index.search(query, top_k=10) == index.search(query)[:10]
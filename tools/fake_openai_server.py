@@ -0,0 +1,140 @@
+"""Minimal OpenAI-compatible server for running the agent offline.
+
+Serves /v1/chat/completions (plain and streamed) and /v1/embeddings with
+deterministic output and configurable latency, over real HTTP. Point the
+app at it with:
+
+    python -m tools.fake_openai_server --port 8001
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=fake python main.py
+
+To skip HTTP entirely, run the app with LLM_PROVIDER=fake instead.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import base64
+import json
+import struct
+import time
+from core.llm import fake_completion, fake_embedding
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    first_token_delay = 0.2
+    token_delay = 0.01
+    embedding_delay = 0.05
+    dimensions = 1536
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.endswith("/chat/completions"):
+            self._chat(body)
+        elif self.path.endswith("/embeddings"):
+            self._embeddings(body)
+        else:
+            self._json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def log_message(self, format, *args):
+        pass
+
+    def _chat(self, body):
+        prompt = body["messages"][-1]["content"]
+        content = fake_completion(prompt)
+        model = body.get("model", "fake")
+        time.sleep(self.first_token_delay)
+
+        usage = {
+            "prompt_tokens": len(prompt) // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": (len(prompt) + len(content)) // 4
+        }
+
+        if not body.get("stream"):
+            time.sleep(self.token_delay * len(content) / 4)
+            self._json(200, {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for start in range(0, len(content), 4):
+            self._chunk(model, {"content": content[start:start + 4]}, None)
+            time.sleep(self.token_delay)
+        self._chunk(model, {}, "stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self._chunk(model, None, None, usage)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _chunk(self, model, delta, finish_reason, usage=None):
+        payload = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        if usage is not None:
+            payload["usage"] = usage
+        self._write_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _embeddings(self, body):
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        time.sleep(self.embedding_delay)
+        data = []
+        for index, text in enumerate(inputs):
+            vector = fake_embedding(str(text), self.dimensions)
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        tokens = sum(len(str(text)) // 4 for text in inputs)
+        self._json(200, {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "fake"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        })
+
+    def _json(self, status, payload):
+        encoded = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+def serve(host: str = "127.0.0.1", port: int = 8001, **latency) -> ThreadingHTTPServer:
+    handler = type("ConfiguredHandler", (FakeOpenAIHandler,), latency)
+    return ThreadingHTTPServer((host, port), handler)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--first-token-delay", type=float, default=FakeOpenAIHandler.first_token_delay)
+    parser.add_argument("--token-delay", type=float, default=FakeOpenAIHandler.token_delay)
+    parser.add_argument("--embedding-delay", type=float, default=FakeOpenAIHandler.embedding_delay)
+    parser.add_argument("--dimensions", type=int, default=FakeOpenAIHandler.dimensions)
+    args = parser.parse_args()
+
+    server = serve(
+        args.host,
+        args.port,
+        first_token_delay=args.first_token_delay,
+        token_delay=args.token_delay,
+        embedding_delay=args.embedding_delay,
+        dimensions=args.dimensions
+    )
+    print(f"Fake OpenAI server listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()